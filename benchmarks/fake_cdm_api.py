@@ -0,0 +1,287 @@
+"""
+A local stand-in for the CDM API that serves deterministic synthetic data, so the ingestion can be benchmarked
+without a network or a cluster.
+
+It serves `/companies`, `/exchange-rates` and `/transactions/sepa|swift` with the `after-timestamp` and `limit`
+paging of the real API. Transactions are spread evenly over `[start, start + days)` and every row is derived from
+its position only, so any page can be generated on its own and two runs with the same config see the same data.
+
+Usage:
+    python benchmarks/fake_cdm_api.py --port 8081 --transactions-per-day 100000 --page-latency 0.05
+"""
+
+import argparse
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+API_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+COUNTRIES = ["NL", "DE", "GB", "FR", "BE", "ES", "IT"]
+RATES = {"EUR": 1.0, "USD": 0.92, "GBP": 1.17, "CHF": 1.04, "JPY": 0.0062, "SEK": 0.088}
+DEFAULT_LIMIT = 5000
+
+
+@dataclass
+class FakeApiConfig:
+    """
+    The volume and behaviour of the fake API.
+
+    Attributes:
+        n_companies (int): The number of companies. Every company has one to three IBANs.
+        transactions_per_day (int): The number of transactions per day, per source.
+        days (int): The number of days with transactions.
+        start (datetime): The start of the first day, in UTC.
+        page_latency (float): The seconds every request sleeps before responding.
+        row_latency (float): The seconds every request additionally sleeps per row of the response.
+        max_in_flight (int): The number of requests served at once, further requests get a 429. 0 is unlimited.
+        duplicate_rate (float): The fraction of transactions that repeat the previous one as a whole.
+        seed (int): Varies the generated data.
+    """
+
+    n_companies: int = 1000
+    transactions_per_day: int = 10_000
+    days: int = 1
+    start: datetime = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    page_latency: float = 0.0
+    row_latency: float = 0.0
+    max_in_flight: int = 0
+    duplicate_rate: float = 0.0
+    seed: int = 0
+
+    @property
+    def n_transactions(self) -> int:
+        return self.transactions_per_day * self.days
+
+    @property
+    def step(self) -> timedelta:
+        return timedelta(days=1) / self.transactions_per_day
+
+    @property
+    def end(self) -> datetime:
+        return self.start + timedelta(days=self.days)
+
+
+def _mix(i: int, seed: int) -> int:
+    # A cheap integer hash, so the generated values look random but only depend on the position.
+    x = (i * 0x9E3779B1 + seed * 0x85EBCA6B) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x45D9F3B) & 0xFFFFFFFF
+    return x ^ (x >> 16)
+
+
+def iban(i: int, seed: int = 0) -> str:
+    country = COUNTRIES[i % len(COUNTRIES)]
+    return f"{country}{10 + i % 90}BANK{_mix(i, seed) % 10**10:010d}"
+
+
+def company_ibans(company: int, seed: int = 0) -> list[str]:
+    n_ibans = 1 + _mix(company, seed + 1) % 3
+    return [iban(company * 3 + k, seed) for k in range(n_ibans)]
+
+
+def companies(config: FakeApiConfig) -> list[dict]:
+    return [
+        {
+            "id": company,
+            "name": f"Company {company}",
+            "address": f"Street {company}\n1234 AB City",
+            "ibans": str(company_ibans(company, config.seed)),
+        }
+        for company in range(config.n_companies)
+    ]
+
+
+def exchange_rates() -> list[dict]:
+    usd = RATES["USD"]
+    return [{"currency": currency, "eur_rate": rate, "usd_rate": rate / usd} for currency, rate in RATES.items()]
+
+
+def transaction(i: int, source: str, config: FakeApiConfig) -> dict:
+    """
+    Generates the transaction at position `i` of a source.
+    """
+    content = i
+    if i > 0 and _mix(i, config.seed + 2) % 10_000 < config.duplicate_rate * 10_000:
+        content = i - 1
+    timestamp = (config.start + config.step * content).strftime(API_TS_FORMAT)
+    h = _mix(content, config.seed + 3)
+    payer = company_ibans(h % config.n_companies, config.seed)[0]
+    receiver = company_ibans((h >> 8) % config.n_companies, config.seed)[-1]
+    currencies = list(RATES) if source == "swift" else ["EUR"]
+    row = {
+        "id": f"{source}-{content}",
+        "amount": (h % 1_000_000) / 100,
+        "currency": currencies[(h >> 4) % len(currencies)],
+        "timestamp": timestamp,
+    }
+    if source == "swift":
+        row.update(sender=payer, beneficiary=receiver)
+    else:
+        row.update(payer=payer, receiver=receiver)
+    return row
+
+
+def first_after(after: datetime, config: FakeApiConfig) -> int:
+    """
+    Returns the position of the first transaction with a timestamp strictly after `after`.
+    """
+    if after < config.start:
+        return 0
+    first = int((after - config.start) / config.step) + 1
+    # Correct for the rounding of the step to whole microseconds.
+    while first > 0 and config.start + config.step * (first - 1) > after:
+        first -= 1
+    while first < config.n_transactions and config.start + config.step * first <= after:
+        first += 1
+    return first
+
+
+class FakeCdmApi:
+    """
+    Generates the responses of the fake API. The transactions of a source are encoded once, on first use or on
+    `warm`, so serving a page costs about as much as it does for the real API and does not skew client timings.
+
+    Args:
+        config (FakeApiConfig): The volume and behaviour of the API.
+    """
+
+    def __init__(self, config: FakeApiConfig):
+        self.config = config
+        self._encoded: dict[str, list[str]] = {}
+        self._lock = threading.Lock()
+
+    def warm(self, *sources: str):
+        for source in sources:
+            self.encoded_transactions(source)
+
+    def encoded_transactions(self, source: str) -> list[str]:
+        with self._lock:
+            if source not in self._encoded:
+                self._encoded[source] = [
+                    json.dumps(transaction(i, source, self.config)) for i in range(self.config.n_transactions)
+                ]
+            return self._encoded[source]
+
+    def transactions_page(self, source: str, after: datetime, limit: int) -> bytes:
+        """
+        Returns up to `limit` transactions with a timestamp strictly after `after`, as a JSON array.
+        """
+        first = first_after(after, self.config)
+        rows = self.encoded_transactions(source)[first : first + limit]
+        return f"[{','.join(rows)}]".encode()
+
+    def response(self, path: str, query: dict[str, str]) -> bytes | None:
+        if path == "/companies":
+            return json.dumps(companies(self.config)).encode()
+        if path == "/exchange-rates":
+            return json.dumps(exchange_rates()).encode()
+        if path in ("/transactions/sepa", "/transactions/swift"):
+            after = datetime.strptime(query.get("after-timestamp", "1970-01-01T00:00:00.000Z"), API_TS_FORMAT)
+            return self.transactions_page(
+                source=path.rsplit("/", 1)[-1],
+                after=after.replace(tzinfo=timezone.utc),
+                limit=int(query.get("limit", DEFAULT_LIMIT)),
+            )
+        return None
+
+
+def make_handler(api: FakeCdmApi) -> type[BaseHTTPRequestHandler]:
+    in_flight = threading.BoundedSemaphore(api.config.max_in_flight) if api.config.max_in_flight else None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if in_flight is not None and not in_flight.acquire(blocking=False):
+                self.send_response(429)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            try:
+                self.respond()
+            finally:
+                if in_flight is not None:
+                    in_flight.release()
+
+        def respond(self):
+            url = urlparse(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            payload = api.response(url.path, query)
+            latency = api.config.page_latency
+            if api.config.row_latency and "limit" in query:
+                latency += api.config.row_latency * int(query["limit"])
+            if latency:
+                time.sleep(latency)
+            if payload is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve(api: FakeCdmApi, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """
+    Serves the fake API in a background thread.
+
+    Yields:
+        str: The base URL of the API, e.g. `http://127.0.0.1:54321`.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--companies", type=int, default=FakeApiConfig.n_companies)
+    parser.add_argument("--transactions-per-day", type=int, default=FakeApiConfig.transactions_per_day)
+    parser.add_argument("--days", type=int, default=FakeApiConfig.days)
+    parser.add_argument("--page-latency", type=float, default=FakeApiConfig.page_latency)
+    parser.add_argument("--row-latency", type=float, default=FakeApiConfig.row_latency)
+    parser.add_argument("--max-in-flight", type=int, default=FakeApiConfig.max_in_flight)
+    parser.add_argument("--duplicate-rate", type=float, default=FakeApiConfig.duplicate_rate)
+    parser.add_argument("--seed", type=int, default=FakeApiConfig.seed)
+    args = parser.parse_args()
+
+    config = FakeApiConfig(
+        n_companies=args.companies,
+        transactions_per_day=args.transactions_per_day,
+        days=args.days,
+        page_latency=args.page_latency,
+        row_latency=args.row_latency,
+        max_in_flight=args.max_in_flight,
+        duplicate_rate=args.duplicate_rate,
+        seed=args.seed,
+    )
+    with serve(FakeCdmApi(config), host=args.host, port=args.port) as url:
+        print(f"Serving the fake CDM API on {url}, press Ctrl+C to stop.")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmarks how long the scheduler's DAG processor takes to parse every DAG file, and which heavy modules parsing
+imports on top of Airflow itself.
+
+Every file is parsed in a fresh interpreter, like the DAG processor does after a code change, with `DagBag`. The
+Airflow modules the DAG files build on are imported before the timer starts, so only the cost of the DAG file and
+its imports is measured.
+
+Usage:
+    python benchmarks/parse_dags.py --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+DAGS_FOLDER = Path(__file__).resolve().parents[1] / "dags"
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "pytz", "sqlalchemy", "pydantic", "requests")
+
+PARSE_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {dags_folder!r})
+import airflow
+from airflow.decorators import dag
+from airflow.models.dagbag import DagBag
+from airflow.operators.python import PythonOperator
+try:
+    from airflow.providers.postgres.operators.postgres import PostgresOperator
+except ImportError:
+    pass
+
+before = set(sys.modules)
+start = time.perf_counter()
+dagbag = DagBag(dag_folder={path!r}, include_examples=False, safe_mode=False)
+seconds = time.perf_counter() - start
+new = set(sys.modules) - before
+print(json.dumps({{
+    "seconds": seconds,
+    "dags": len(dagbag.dags),
+    "errors": {{key: str(value) for key, value in dagbag.import_errors.items()}},
+    "new_modules": len(new),
+    "heavy_modules": sorted(name for name in new if name.split(".")[0] in {heavy!r}),
+    "project_modules": sorted(name for name in new if name.startswith("airflow_assessment")),
+}}))
+"""
+
+
+def parse_dag_file(path: Path) -> dict:
+    """
+    Parses a DAG file in a fresh interpreter.
+
+    Returns:
+        dict: The parse time in seconds, the number of DAGs and import errors, the number of modules the parse
+            imported, and the heavy and project modules among them.
+    """
+    script = PARSE_SCRIPT.format(dags_folder=str(DAGS_FOLDER), path=str(path), heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="The number of parses per file, the median is reported.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    for path in sorted(DAGS_FOLDER.glob("*.py")):
+        runs = [parse_dag_file(path) for _ in range(args.repeat)]
+        result = {**runs[-1], "seconds": round(statistics.median(run["seconds"] for run in runs), 4)}
+        results[path.name] = result
+        heavy = ", ".join(sorted({module.split(".")[0] for module in result["heavy_modules"]})) or "-"
+        print(
+            f"{path.name:<28} {result['seconds'] * 1000:>8.1f} ms  {result['dags']} DAGs  "
+            f"{result['new_modules']:>4} modules  heavy: {heavy}"
+        )
+        for error in result["errors"].values():
+            print(f"  import error: {error}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
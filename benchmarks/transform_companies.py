@@ -0,0 +1,81 @@
+"""
+Benchmarks `transform_companies` against the previous `pd.eval` based parsing on synthetic companies.
+
+Usage:
+    python benchmarks/transform_companies.py --companies 1000000 --legacy-sample 20000
+
+The legacy path evaluates every list separately and takes minutes on a million companies, so it is timed on
+`--legacy-sample` companies and extrapolated.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "dags"))
+
+from airflow_assessment.transformations import transform_companies  # noqa: E402
+
+
+def legacy_transform_companies(companies: pd.DataFrame, iban_field_name: str = "ibans") -> pd.DataFrame:
+    companies[iban_field_name] = companies[iban_field_name].apply(pd.eval)  # type: ignore
+    companies = companies.explode(iban_field_name)
+    companies["country"] = companies[iban_field_name].str.slice(0, 2)
+    companies = companies.rename(columns={iban_field_name: "iban", "id": "company_id"})
+    return companies
+
+
+def synthetic_companies(n_companies: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generates companies with one to three IBANs each, formatted the way the CDM API returns them.
+    """
+    rng = np.random.default_rng(seed)
+    countries = np.array(["NL", "DE", "GB", "FR", "BE"])
+    n_ibans = rng.integers(1, 4, size=n_companies)
+    ibans = pd.Series(countries[rng.integers(0, len(countries), size=n_ibans.sum())]) + pd.Series(
+        rng.integers(10**17, 10**18, size=n_ibans.sum())
+    ).astype(str)
+    owners = np.repeat(np.arange(n_companies), n_ibans)
+    iban_lists = "['" + ibans.groupby(owners).agg("', '".join) + "']"
+    return pd.DataFrame(
+        {
+            "address": "Street 1",
+            "ibans": iban_lists.to_numpy(),
+            "id": np.arange(n_companies),
+            "name": "Company",
+        }
+    )
+
+
+def timed(function, companies: pd.DataFrame) -> tuple[float, pd.DataFrame]:
+    start = time.perf_counter()
+    result = function(companies.copy())
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=1_000_000)
+    parser.add_argument("--legacy-sample", type=int, default=20_000)
+    args = parser.parse_args()
+
+    companies = synthetic_companies(args.companies)
+    seconds, result = timed(transform_companies, companies)
+    print(f"vectorized: {args.companies} companies -> {len(result)} rows in {seconds:.2f}s")
+
+    sample = companies.head(args.legacy_sample)
+    legacy_seconds, legacy = timed(legacy_transform_companies, sample)
+    extrapolated = legacy_seconds * args.companies / len(sample)
+    print(f"legacy: {len(sample)} companies in {legacy_seconds:.2f}s, ~{extrapolated:.0f}s for {args.companies}")
+    print(f"speedup: ~{extrapolated / seconds:.0f}x")
+
+    vectorized = transform_companies(sample.copy())
+    assert vectorized.reset_index(drop=True).equals(legacy.reset_index(drop=True)[vectorized.columns]), "mismatch"
+
+
+if __name__ == "__main__":
+    main()
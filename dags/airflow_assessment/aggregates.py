@@ -0,0 +1,103 @@
+import logging
+from datetime import datetime
+
+from airflow_assessment.database import qualified_table_name
+from airflow_assessment.metrics import get_metrics
+from airflow_assessment.models.alchemy import (
+    AccountBalanceModel,
+    AccountCountryModel,
+    TransactionModel,
+)
+from airflow_assessment.utils import (
+    first_day_of_month,
+    first_day_of_next_month,
+    to_naive_utc,
+)
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+LOGGER = logging.getLogger(__name__)
+
+# Mutations per account in EUR, from the EUR amounts stored at ingest, see `enrichment.enrich_trades`. Every
+# transaction is an outgoing mutation for the payer and an incoming mutation for the receiver. Transactions without
+# an EUR amount, i.e. without a known rate, are left out, like in the `transaction_enriched` view.
+BALANCE_SQL = """
+INSERT INTO {balance} (account, month, source, balance)
+SELECT account, month, source, SUM(mutation)
+FROM (
+    SELECT t.payer AS account, date_trunc('month', t.timestamp) AS month, t.source, -t.eur_amount AS mutation
+    FROM {transaction} t
+    WHERE {condition} AND t.eur_amount IS NOT NULL
+    UNION ALL
+    SELECT t.receiver AS account, date_trunc('month', t.timestamp) AS month, t.source, t.eur_amount AS mutation
+    FROM {transaction} t
+    WHERE {condition} AND t.eur_amount IS NOT NULL
+) mutations
+GROUP BY account, month, source
+"""
+
+COUNTRY_SQL = """
+INSERT INTO {country} (account, month, source, interaction_country)
+SELECT t.payer, date_trunc('month', t.timestamp), t.source, SUBSTRING(t.receiver, 1, 2)
+FROM {transaction} t
+WHERE {condition} AND t.eur_amount IS NOT NULL
+UNION
+SELECT t.receiver, date_trunc('month', t.timestamp), t.source, SUBSTRING(t.payer, 1, 2)
+FROM {transaction} t
+WHERE {condition} AND t.eur_amount IS NOT NULL
+"""
+
+
+def refresh_aggregates(
+    engine: Engine,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    source: str | None = None,
+):
+    """
+    Recomputes the per account and month aggregates behind the `account_balance` and `interacted_countries` views.
+
+    Only the months overlapping `[start_date, end_date]` are recomputed, and only for the given source, so the cost
+    of a refresh scales with what an ingest run touched rather than with the whole transaction history. The old
+    aggregates are replaced in a single transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        start_date (datetime | None, optional): The start of the touched interval. Defaults to None, which
+            recomputes every month.
+        end_date (datetime | None, optional): The end of the touched interval. Defaults to None.
+        source (str | None, optional): The source of the touched transactions. Defaults to None, all sources.
+
+    Returns:
+        None
+    """
+    transaction_conditions, aggregate_conditions = ["TRUE"], ["TRUE"]
+    params = {}
+    if start_date is not None and end_date is not None:
+        transaction_conditions.append("t.timestamp >= :month_from AND t.timestamp < :month_to")
+        aggregate_conditions.append("month >= :month_from AND month < :month_to")
+        params["month_from"] = first_day_of_month(to_naive_utc(start_date))
+        params["month_to"] = first_day_of_next_month(to_naive_utc(end_date))
+    if source is not None:
+        transaction_conditions.append("t.source = :source")
+        aggregate_conditions.append("source = :source")
+        params["source"] = source
+    transaction_condition = " AND ".join(transaction_conditions)
+    aggregate_condition = " AND ".join(aggregate_conditions)
+
+    tables = {
+        "balance": qualified_table_name(AccountBalanceModel),
+        "country": qualified_table_name(AccountCountryModel),
+        "transaction": qualified_table_name(TransactionModel),
+    }
+    with get_metrics().timer("aggregates") as timing, engine.begin() as connection:
+        for aggregate in (tables["balance"], tables["country"]):
+            connection.execute(text(f"DELETE FROM {aggregate} WHERE {aggregate_condition}"), params)
+        balances = connection.execute(
+            text(BALANCE_SQL.format(condition=transaction_condition, **tables)), params
+        ).rowcount
+        countries = connection.execute(
+            text(COUNTRY_SQL.format(condition=transaction_condition, **tables)), params
+        ).rowcount
+        timing.rows = balances + countries
+    LOGGER.info(f"Refreshed aggregates for {params or 'all months'}: {balances} balances, {countries} countries.")
@@ -0,0 +1,101 @@
+import hashlib
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+@dataclass
+class ChangeSet:
+    """
+    Represents the difference between a freshly fetched dataset and the stored one.
+
+    Attributes:
+        inserted (pd.DataFrame): The rows whose key is not stored yet.
+        updated (pd.DataFrame): The rows whose key is stored, but with different values.
+        deleted (pd.DataFrame): The key columns of the stored rows that are no longer in the dataset.
+    """
+
+    inserted: pd.DataFrame
+    updated: pd.DataFrame
+    deleted: pd.DataFrame
+
+    @property
+    def is_empty(self) -> bool:
+        return self.inserted.empty and self.updated.empty and self.deleted.empty
+
+    def __str__(self) -> str:
+        return f"{len(self.inserted)} inserted, {len(self.updated)} updated, {len(self.deleted)} deleted"
+
+
+def _normalize(frame: pd.DataFrame, columns: list[str], dtypes: pd.Series) -> pd.DataFrame:
+    """
+    Aligns a frame on the given columns and dtypes and represents every missing value as None, so equal rows hash
+    equally regardless of whether they came from the API or from the database.
+    """
+    frame = frame[columns].astype(dtypes[columns].to_dict())
+    return frame.astype(object).where(frame.notna(), None)
+
+
+def fingerprint_rows(frame: pd.DataFrame, key_columns: list[str]) -> pd.Series:
+    """
+    Computes a 64-bit hash of every row, indexed by the key columns.
+
+    Args:
+        frame (pd.DataFrame): The rows to hash.
+        key_columns (list[str]): The columns that identify a row.
+
+    Returns:
+        pd.Series: The row hashes, indexed by key.
+    """
+    columns = sorted(frame.columns)
+    hashes = pd.util.hash_pandas_object(_normalize(frame, columns, frame.dtypes), index=False)
+    hashes.index = pd.MultiIndex.from_frame(frame[key_columns]) if len(key_columns) > 1 else frame[key_columns[0]]
+    return hashes
+
+
+def fingerprint_frame(frame: pd.DataFrame, key_columns: list[str]) -> str:
+    """
+    Computes a fingerprint of a whole dataset that does not depend on the order of its rows.
+
+    Args:
+        frame (pd.DataFrame): The dataset.
+        key_columns (list[str]): The columns that identify a row.
+
+    Returns:
+        str: The hex SHA-256 fingerprint.
+    """
+    hashes = fingerprint_rows(frame, key_columns=key_columns).sort_values()
+    digest = hashlib.sha256(",".join(sorted(frame.columns)).encode())
+    digest.update(hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def diff_frames(current: pd.DataFrame, stored: pd.DataFrame, key_columns: list[str]) -> ChangeSet:
+    """
+    Compares a freshly fetched dataset with the stored one by key and row hash.
+
+    Args:
+        current (pd.DataFrame): The freshly fetched dataset.
+        stored (pd.DataFrame): The stored dataset. Only the columns of `current` are compared.
+        key_columns (list[str]): The columns that identify a row.
+
+    Returns:
+        ChangeSet: The inserted, updated and deleted rows.
+    """
+    stored = stored[list(current.columns)].astype(current.dtypes.to_dict(), errors="ignore")
+    current_hashes = fingerprint_rows(current, key_columns=key_columns)
+    stored_hashes = fingerprint_rows(stored, key_columns=key_columns)
+
+    is_new = ~current_hashes.index.isin(stored_hashes.index)
+    is_known = ~is_new
+    is_changed = is_known.copy()
+    is_changed[is_known] = (
+        current_hashes[is_known].to_numpy() != stored_hashes.reindex(current_hashes.index[is_known]).to_numpy()
+    )
+    is_deleted = ~stored_hashes.index.isin(current_hashes.index)
+
+    return ChangeSet(
+        inserted=current.loc[is_new],
+        updated=current.loc[is_changed],
+        deleted=stored.loc[is_deleted, key_columns],
+    )
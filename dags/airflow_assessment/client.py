@@ -0,0 +1,363 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator
+from urllib.parse import urlparse
+
+import requests
+from airflow_assessment.concurrency import AimdController
+from airflow_assessment.constant import (
+    ADAPTIVE_PAGING,
+    CDM_BACKOFF_FACTOR,
+    CDM_BACKOFF_MAX,
+    CDM_CONNECT_TIMEOUT,
+    CDM_MAX_RETRIES,
+    CDM_POOL_SIZE,
+    CDM_READ_TIMEOUT,
+    RAW_CACHE_MODE,
+)
+from airflow_assessment.metrics import Histogram, get_metrics
+from airflow_assessment.raw_cache import RawCache, RawCacheMiss, RawCacheMode
+from requests.adapters import HTTPAdapter
+
+LOGGER = logging.getLogger(__name__)
+
+_CLIENT: "CdmApiClient | None" = None
+_CLIENT_PID: int | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+class CdmApiError(Exception):
+    """
+    Raised when a request to the CDM API fails, after retrying where that makes sense.
+    """
+
+
+class RequestStats:
+    """
+    Thread-safe counters for the requests made by a CdmApiClient.
+
+    The latencies are kept in a fixed-size Histogram, so the stats of a long-lived client take constant memory.
+    Take a `snapshot` at the start of a task and pass it to `summary` to get the stats of the task only.
+
+    Attributes:
+        requests (int): The number of HTTP requests sent, including retries.
+        retries (int): The number of retried requests.
+        failures (int): The number of requests that failed for good.
+        bytes_on_wire (int): The size of the response bodies as received over the wire, i.e. still compressed when
+            the API sent them with a Content-Encoding.
+        bytes_decoded (int): The size of the response bodies after decompression.
+        latency (Histogram): The latency in seconds of the successful requests.
+    """
+
+    COUNTERS = ("requests", "retries", "failures", "bytes_on_wire", "bytes_decoded")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.bytes_on_wire = 0
+        self.bytes_decoded = 0
+        self.latency = Histogram()
+
+    def record(self, latency: float, bytes_on_wire: int, bytes_decoded: int):
+        with self._lock:
+            self.requests += 1
+            self.bytes_on_wire += bytes_on_wire
+            self.bytes_decoded += bytes_decoded
+            self.latency.observe(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.requests += 1
+            self.retries += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+
+    def snapshot(self) -> "RequestStats":
+        """
+        Returns a copy of the current stats.
+        """
+        snapshot = RequestStats()
+        with self._lock:
+            for name in self.COUNTERS:
+                setattr(snapshot, name, getattr(self, name))
+            snapshot.latency = self.latency.copy()
+        return snapshot
+
+    def summary(self, since: "RequestStats | None" = None) -> dict[str, float]:
+        """
+        Summarizes the counters.
+
+        Args:
+            since (RequestStats | None, optional): An earlier snapshot, to only summarize the requests made after
+                it. Defaults to None.
+
+        Returns:
+            dict[str, float]: The counters plus the mean latency in seconds, and the upper bounds of the latency
+                buckets of the p50 and p95.
+        """
+        with self._lock:
+            summary = {name: getattr(self, name) - (getattr(since, name) if since else 0) for name in self.COUNTERS}
+            latency = self.latency.since(since.latency) if since else self.latency.copy()
+        if latency.count:
+            summary["latency_mean"] = latency.sum / latency.count
+            summary["latency_p50"] = latency.quantile(0.5)
+            summary["latency_p95"] = latency.quantile(0.95)
+        return summary
+
+
+class CdmApiClient:
+    """
+    HTTP client for the CDM API.
+
+    All requests go through one `requests.Session` with a connection pool, so connections are kept alive and
+    reused across pages and threads. Responses are requested gzip compressed. Timeouts, connection errors, 429 and
+    5xx responses are retried with jittered exponential backoff, or after the `Retry-After` of the response, other
+    error responses fail immediately.
+
+    With `adaptive`, every endpoint gets an AimdController that caps the requests in flight and learns from every
+    response, see `controller`.
+
+    Args:
+        pool_size (int, optional): The maximum number of pooled connections per host. Defaults to CDM_POOL_SIZE.
+        connect_timeout (float, optional): The connect timeout in seconds. Defaults to CDM_CONNECT_TIMEOUT.
+        read_timeout (float, optional): The read timeout in seconds. Defaults to CDM_READ_TIMEOUT.
+        max_retries (int, optional): The number of retries after the first attempt. Defaults to CDM_MAX_RETRIES.
+        backoff_factor (float, optional): The base of the backoff in seconds. Defaults to CDM_BACKOFF_FACTOR.
+        backoff_max (float, optional): The maximum backoff in seconds. Defaults to CDM_BACKOFF_MAX.
+        cache (RawCache | None, optional): The raw response cache. Defaults to None.
+        cache_mode (RawCacheMode, optional): How `get_json` uses the cache, see `RawCacheMode`. Defaults to "off".
+        adaptive (bool, optional): Whether to tune the concurrency and page size per endpoint. Defaults to
+            ADAPTIVE_PAGING.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = CDM_POOL_SIZE,
+        connect_timeout: float = CDM_CONNECT_TIMEOUT,
+        read_timeout: float = CDM_READ_TIMEOUT,
+        max_retries: int = CDM_MAX_RETRIES,
+        backoff_factor: float = CDM_BACKOFF_FACTOR,
+        backoff_max: float = CDM_BACKOFF_MAX,
+        cache: RawCache | None = None,
+        cache_mode: RawCacheMode = "off",
+        adaptive: bool = ADAPTIVE_PAGING,
+    ):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.stats = RequestStats()
+        self.cache = cache
+        self.cache_mode = cache_mode
+        self.adaptive = adaptive
+        self.controllers: dict[str, AimdController] = {}
+        self._controllers_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the time to sleep before the given retry attempt, using exponential backoff with full jitter.
+
+        Args:
+            attempt (int): The retry attempt, starting at 0.
+
+        Returns:
+            float: The backoff in seconds.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * 2**attempt))
+
+    def controller(self, url: str) -> AimdController:
+        """
+        Returns the AimdController of the endpoint of a URL, which is shared by all requests to that path.
+
+        Args:
+            url (str): The URL of the request.
+
+        Returns:
+            AimdController: The controller.
+        """
+        endpoint = urlparse(url).path
+        with self._controllers_lock:
+            if endpoint not in self.controllers:
+                self.controllers[endpoint] = AimdController(endpoint)
+            return self.controllers[endpoint]
+
+    def get(self, url: str, params: Any | None = None) -> requests.Response:
+        """
+        Sends a GET request, retrying timeouts, connection errors, 429 and 5xx responses.
+
+        Args:
+            url (str): The URL to request.
+            params (Any | None, optional): Additional parameters for the request. Defaults to None.
+
+        Returns:
+            requests.Response: The successful response.
+
+        Raises:
+            CdmApiError: When the request fails with a non-retryable status or runs out of retries.
+        """
+        metrics = get_metrics()
+        controller = self.controller(url) if self.adaptive else None
+        for attempt in range(self.max_retries + 1):
+            retry_after = 0.0
+            try:
+                with controller.slot() if controller is not None else nullcontext():
+                    start_time = time.perf_counter()
+                    res = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = CdmApiError(f"Failed to get json from url: {url=}, {e=}")
+            else:
+                if res.status_code == 200:
+                    content = res.content
+                    bytes_on_wire = response_bytes_on_wire(res)
+                    latency = time.perf_counter() - start_time
+                    self.stats.record(latency, bytes_on_wire, len(content))
+                    metrics.observe("http_request_seconds", latency)
+                    metrics.increment("http_bytes_on_wire", bytes_on_wire)
+                    if controller is not None:
+                        controller.on_success(latency, len(content))
+                    return res
+                error = CdmApiError(f"Failed to get json from url: {url=}, {res.status_code=}, {res.text=}")
+                if res.status_code != 429 and res.status_code < 500:
+                    self.stats.record_failure()
+                    metrics.increment("http_failures")
+                    raise error
+                retry_after = parse_retry_after(res.headers.get("Retry-After"))
+            if controller is not None:
+                controller.on_overload()
+
+            if attempt == self.max_retries:
+                self.stats.record_failure()
+                metrics.increment("http_failures")
+                raise error
+            self.stats.record_retry()
+            metrics.increment("http_retries")
+            backoff = max(self.backoff(attempt), min(retry_after, self.backoff_max))
+            LOGGER.warning(f"Retrying in {backoff:.2f}s ({attempt + 1}/{self.max_retries}): {error}")
+            time.sleep(backoff)
+        raise AssertionError("unreachable")
+
+    def get_bytes(self, url: str, params: Any | None = None) -> bytes:
+        """
+        Retrieves the raw response body of the specified URL, through the raw response cache when one is configured.
+
+        Args:
+            url (str): The URL to retrieve.
+            params (Any | None, optional): Additional parameters for the request. Defaults to None.
+
+        Returns:
+            bytes: The decompressed response body.
+
+        Raises:
+            RawCacheMiss: In replay mode, when the request is not cached.
+        """
+        use_cache = self.cache is not None and self.cache_mode != "off"
+        if use_cache and self.cache_mode in ("prefer", "replay"):
+            body = self.cache.get(url, params=params)
+            if body is not None:
+                return body
+            if self.cache_mode == "replay":
+                raise RawCacheMiss(f"No cached response for {url=}, {params=}")
+
+        body = self.get(url, params=params).content
+        if use_cache:
+            try:
+                self.cache.put(url, params, body)
+            except OSError as e:
+                LOGGER.warning(f"Failed to cache the response of {url=}, {params=}: {e}")
+        return body
+
+    def get_json(self, url: str, params: Any | None = None) -> list[dict]:
+        """
+        Retrieves JSON data from the specified URL.
+
+        Args:
+            url (str): The URL to retrieve JSON data from.
+            params (Any | None, optional): Additional parameters for the request. Defaults to None.
+
+        Returns:
+            list[dict]: The JSON data as a list of dictionaries.
+        """
+        return json.loads(self.get_bytes(url, params=params))
+
+
+def response_bytes_on_wire(response: requests.Response) -> int:
+    """
+    Returns the size of the body of a response as it was received over the wire, before its Content-Encoding, e.g.
+    gzip, was decoded. The Content-Length header is not used, as it is missing from chunked responses.
+
+    Args:
+        response (requests.Response): The response, with its content read.
+
+    Returns:
+        int: The number of bytes.
+    """
+    if hasattr(response.raw, "tell"):
+        return response.raw.tell()
+    return len(response.content)
+
+
+def parse_retry_after(value: str | None) -> float:
+    """
+    Returns the seconds of a `Retry-After` header, or 0 when it is missing or an HTTP date.
+    """
+    try:
+        return max(0.0, float(value)) if value is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+def get_cdm_client() -> CdmApiClient:
+    """
+    Returns the CdmApiClient of the current process, creating it on first use.
+
+    The client is recreated after a fork, so worker processes never share pooled sockets with their parent.
+
+    Returns:
+        CdmApiClient: The client.
+    """
+    global _CLIENT, _CLIENT_PID
+    with _CLIENT_LOCK:
+        if _CLIENT is None or _CLIENT_PID != os.getpid():
+            _CLIENT = CdmApiClient(cache=RawCache() if RAW_CACHE_MODE != "off" else None, cache_mode=RAW_CACHE_MODE)
+            _CLIENT_PID = os.getpid()
+        return _CLIENT
+
+
+@contextmanager
+def raw_cache_mode(mode: RawCacheMode, cache: RawCache | None = None) -> Iterator[CdmApiClient]:
+    """
+    Switches the client of the current process to another raw cache mode for the duration of the block, e.g.
+    "replay" to rebuild tables or the lake from cached responses without touching the API.
+
+    Args:
+        mode (RawCacheMode): The cache mode.
+        cache (RawCache | None, optional): The cache to use. Defaults to the cache of the client, or the default
+            RawCache when the client has none.
+
+    Yields:
+        CdmApiClient: The client.
+    """
+    client = get_cdm_client()
+    previous = client.cache, client.cache_mode
+    client.cache = cache or client.cache or RawCache()
+    client.cache_mode = mode
+    try:
+        yield client
+    finally:
+        client.cache, client.cache_mode = previous
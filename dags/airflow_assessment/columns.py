@@ -0,0 +1,102 @@
+from datetime import datetime
+from typing import Iterable
+
+import pandas as pd
+import pyarrow as pa
+from airflow_assessment.constant import API_TS_FORMAT
+
+# Low cardinality columns, stored as categoricals.
+CATEGORICAL_COLUMNS = ("currency", "country")
+TIMESTAMP_COLUMNS = ("timestamp",)
+
+
+def timestamps_to_series(values: list) -> pd.Series:
+    """
+    Converts a column of timestamps into a `datetime64[ns, UTC]` Series in one vectorized step.
+
+    Validated rows already hold parsed datetimes, which are converted by Arrow without parsing them again. Raw API
+    strings, e.g. from the "sampled" validation policy, are parsed once with the fixed API_TS_FORMAT.
+
+    Args:
+        values (list): The timestamps, as timezone aware datetimes or as API strings.
+
+    Returns:
+        pd.Series: The timestamps.
+    """
+    first = next((value for value in values if value is not None), None)
+    if isinstance(first, datetime):
+        return pa.array(values, type=pa.timestamp("ns", tz="UTC")).to_pandas()
+    return pd.Series(pd.to_datetime(values, format=API_TS_FORMAT, utc=True))
+
+
+class ColumnBuffer:
+    """
+    Accumulates pages of rows column by column, so a large interval is never held as a list of dicts and the
+    DataFrame is built from typed columns in a single step.
+
+    Timestamps are converted once by `timestamps_to_series`, the low cardinality `categorical` columns are stored
+    as categoricals and other text columns as Arrow backed strings, which take a fraction of the memory of Python
+    string objects.
+
+    Args:
+        categorical (Iterable[str], optional): The columns to store as categoricals. Defaults to CATEGORICAL_COLUMNS.
+        timestamps (Iterable[str], optional): The timestamp columns. Defaults to TIMESTAMP_COLUMNS.
+    """
+
+    def __init__(self, categorical: Iterable[str] = CATEGORICAL_COLUMNS, timestamps: Iterable[str] = TIMESTAMP_COLUMNS):
+        self.categorical = set(categorical)
+        self.timestamps = set(timestamps)
+        self.columns: dict[str, list] = {}
+        self.n_rows = 0
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def extend(self, rows: list[dict]):
+        """
+        Appends a page of rows. Columns that are missing from a page are filled with None.
+
+        Args:
+            rows (list[dict]): The rows.
+        """
+        if not rows:
+            return
+        for name in rows[0]:
+            self.columns.setdefault(name, [None] * self.n_rows)
+        for name, values in self.columns.items():
+            values.extend([row.get(name) for row in rows])
+        self.n_rows += len(rows)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Builds a DataFrame of the accumulated rows.
+
+        Returns:
+            pd.DataFrame: The rows, with typed timestamp and categorical columns.
+        """
+        data = {}
+        for name, values in self.columns.items():
+            if name in self.timestamps:
+                data[name] = timestamps_to_series(values)
+            elif name in self.categorical:
+                data[name] = pd.Categorical(values)
+            elif isinstance(next((value for value in values if value is not None), None), str):
+                data[name] = pd.array(values, dtype="string[pyarrow]")
+            else:
+                data[name] = values
+        return pd.DataFrame(data)
+
+
+def rows_to_frame(rows: list[dict]) -> pd.DataFrame:
+    """
+    Builds a DataFrame of a single page of rows with the typed columns of `ColumnBuffer`.
+
+    Args:
+        rows (list[dict]): The rows.
+
+    Returns:
+        pd.DataFrame: The rows.
+    """
+    buffer = ColumnBuffer()
+    buffer.extend(rows)
+    return buffer.to_frame()
@@ -0,0 +1,133 @@
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from airflow_assessment.constant import (
+    ADAPTIVE_DECREASE_FACTOR,
+    ADAPTIVE_MAX_CONCURRENCY,
+    ADAPTIVE_MAX_PAGE_BYTES,
+    ADAPTIVE_MAX_PAGE_SIZE,
+    ADAPTIVE_MIN_PAGE_SIZE,
+    ADAPTIVE_PAGE_SIZE_STEP,
+    ADAPTIVE_TARGET_LATENCY,
+    FETCH_MAX_WORKERS,
+    PAGE_SIZE,
+)
+from airflow_assessment.metrics import get_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EndpointLimits:
+    """
+    The bounds an AimdController tunes an endpoint within.
+
+    Attributes:
+        min_page_size (int): The smallest page `limit`.
+        max_page_size (int): The largest page `limit`.
+        initial_page_size (int): The page `limit` to start with.
+        page_size_step (int): The rows added to the page `limit` after a fast page.
+        initial_concurrency (int): The number of requests in flight to start with.
+        max_concurrency (int): The largest number of requests in flight.
+        target_latency (float): The latency in seconds above which a page counts as slow.
+        max_page_bytes (int): The response size in bytes above which a page counts as too large.
+        decrease_factor (float): The factor the page `limit` and the concurrency are multiplied with on a decrease.
+    """
+
+    min_page_size: int = ADAPTIVE_MIN_PAGE_SIZE
+    max_page_size: int = ADAPTIVE_MAX_PAGE_SIZE
+    initial_page_size: int = PAGE_SIZE
+    page_size_step: int = ADAPTIVE_PAGE_SIZE_STEP
+    initial_concurrency: int = FETCH_MAX_WORKERS
+    max_concurrency: int = ADAPTIVE_MAX_CONCURRENCY
+    target_latency: float = ADAPTIVE_TARGET_LATENCY
+    max_page_bytes: int = ADAPTIVE_MAX_PAGE_BYTES
+    decrease_factor: float = ADAPTIVE_DECREASE_FACTOR
+
+
+# The ceilings of specific endpoints, by path. SWIFT rows are larger, so its pages are capped lower.
+ENDPOINT_LIMITS = {
+    "/transactions/swift": EndpointLimits(max_page_size=10_000),
+}
+
+
+class AimdController:
+    """
+    Tunes the page `limit` and the number of requests in flight of an API endpoint with additive increase and
+    multiplicative decrease, like TCP congestion control.
+
+    Every page that is fast and small enough grows the page `limit` by a fixed step and the concurrency by one per
+    window of in-flight requests. A page over the target latency or the byte ceiling shrinks the page `limit`, and a
+    timeout, a 429 or a 5xx response shrinks both, so the controller settles just below what the API sustains.
+
+    Args:
+        endpoint (str): The path of the endpoint, e.g. "/transactions/sepa".
+        limits (EndpointLimits | None, optional): The bounds. Defaults to the ENDPOINT_LIMITS of the endpoint, or
+            the default EndpointLimits.
+    """
+
+    def __init__(self, endpoint: str, limits: EndpointLimits | None = None):
+        self.endpoint = endpoint
+        self.limits = limits = limits or ENDPOINT_LIMITS.get(endpoint, EndpointLimits())
+        self._page_size = float(min(max(limits.initial_page_size, limits.min_page_size), limits.max_page_size))
+        self._concurrency = float(min(max(limits.initial_concurrency, 1), limits.max_concurrency))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def page_size(self) -> int:
+        return int(self._page_size)
+
+    @property
+    def concurrency(self) -> int:
+        return int(self._concurrency)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Waits until fewer than `concurrency` requests are in flight and holds a slot for the duration of the block.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+
+    def on_success(self, latency: float, n_bytes: int):
+        """
+        Records a successful request.
+
+        Args:
+            latency (float): The latency of the request in seconds.
+            n_bytes (int): The size of the response body in bytes.
+        """
+        limits = self.limits
+        with self._condition:
+            if latency > limits.target_latency or n_bytes > limits.max_page_bytes:
+                self._page_size = max(limits.min_page_size, self._page_size * limits.decrease_factor)
+                get_metrics().increment("adaptive_decreases")
+            else:
+                self._page_size = min(limits.max_page_size, self._page_size + limits.page_size_step)
+                self._concurrency = min(limits.max_concurrency, self._concurrency + 1 / self._concurrency)
+            self._condition.notify_all()
+
+    def on_overload(self):
+        """
+        Records a timeout, a 429 or a 5xx response.
+        """
+        limits = self.limits
+        with self._condition:
+            self._page_size = max(limits.min_page_size, self._page_size * limits.decrease_factor)
+            self._concurrency = max(1.0, self._concurrency * limits.decrease_factor)
+        get_metrics().increment("adaptive_decreases")
+        LOGGER.info(f"Backing off {self.endpoint}: {self.page_size} rows per page, {self.concurrency} in flight.")
+
+    def summary(self) -> dict[str, int]:
+        return {"page_size": self.page_size, "concurrency": self.concurrency}
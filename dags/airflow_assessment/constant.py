@@ -1,3 +1,48 @@
 CDM_API_URL = "http://cdm-api.cdm.svc.cluster.local:81"
+API_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 POSTGRES_CON_ID = "postgres-details"
 AIRFLOW_SCHEMA_NAME = "airflow-assessment"
+COPY_CHUNK_SIZE = 100_000
+PAGE_SIZE = 5000
+FETCH_MAX_WORKERS = 4
+PIPELINE_QUEUE_SIZE = 4
+CDM_POOL_SIZE = 16
+CDM_CONNECT_TIMEOUT = 5.0
+CDM_READ_TIMEOUT = 60.0
+CDM_MAX_RETRIES = 5
+CDM_BACKOFF_FACTOR = 0.5
+CDM_BACKOFF_MAX = 30.0
+VALIDATION_POLICY = "full"
+VALIDATION_SAMPLE_RATE = 0.01
+CONNECTION_CACHE_TTL = 300.0
+DB_POOL_SIZE = 5
+DB_MAX_OVERFLOW = 10
+DB_STATEMENT_TIMEOUT_MS = 30 * 60 * 1000
+LOAD_MODE = "staging"
+LAKE_ENABLED = True
+LAKE_ROOT = "/opt/airflow/output/lake"
+LAKE_COMPRESSION = "zstd"
+LAKE_ROWS_PER_FILE = 1_000_000
+METRICS_PREFIX = "cdm_ingest"
+METRICS_TEXTFILE_DIR = "/opt/airflow/output/metrics"
+STATSD_HOST = None
+STATSD_PORT = 8125
+TRANSACTION_WINDOW_HOURS = 24
+INCREMENTAL_SCHEDULE = "*/15 * * * *"
+RAW_CACHE_MODE = "off"
+RAW_CACHE_ROOT = "/opt/airflow/output/raw"
+RAW_CACHE_COMPRESSLEVEL = 6
+ENRICHMENT_INDEX_TTL = 300.0
+BACKFILL_STATE_PATH = "/opt/airflow/output/backfill/state.json"
+BACKFILL_WORKERS = 4
+MIGRATION_LOCK_ID = 72_616_001
+# The source of the transactions that were loaded before the source was recorded.
+LEGACY_TRANSACTION_SOURCE = "legacy"
+ADAPTIVE_PAGING = True
+ADAPTIVE_MIN_PAGE_SIZE = 500
+ADAPTIVE_MAX_PAGE_SIZE = 20_000
+ADAPTIVE_PAGE_SIZE_STEP = 1000
+ADAPTIVE_MAX_CONCURRENCY = 8
+ADAPTIVE_TARGET_LATENCY = 2.0
+ADAPTIVE_MAX_PAGE_BYTES = 16 * 2**20
+ADAPTIVE_DECREASE_FACTOR = 0.5
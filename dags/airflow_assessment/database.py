@@ -1,30 +1,101 @@
+import io
+import json
 import logging
-from datetime import datetime
-from typing import Literal
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Literal
 
 import pandas as pd
 import sqlalchemy
 from airflow.models import Connection
-from airflow_assessment.constant import AIRFLOW_SCHEMA_NAME, POSTGRES_CON_ID
-from airflow_assessment.models.alchemy import TableTypes, prod_base
-from sqlalchemy import create_engine, delete, inspect
+from airflow_assessment.change_detection import (
+    ChangeSet,
+    diff_frames,
+    fingerprint_frame,
+)
+from airflow_assessment.constant import (
+    CONNECTION_CACHE_TTL,
+    COPY_CHUNK_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_SIZE,
+    DB_STATEMENT_TIMEOUT_MS,
+    LEGACY_TRANSACTION_SOURCE,
+    POSTGRES_CON_ID,
+)
+from airflow_assessment.metrics import get_metrics
+from airflow_assessment.models.alchemy import (
+    DatasetFingerprintModel,
+    QuarantineModel,
+    TableTypes,
+    TransactionModel,
+    WatermarkModel,
+    prod_base,
+)
+from airflow_assessment.utils import (
+    first_day_of_month,
+    first_day_of_next_month,
+    to_naive_utc,
+)
+from sqlalchemy import create_engine, delete, inspect, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.engine import URL, Engine
+from sqlalchemy.schema import CreateIndex
 
 LOGGER = logging.getLogger(__name__)
+COPY_NULL = "\\N"
 
+LoadMode = Literal["staging", "append"]
 
-def get_connection_with_airflow_conn_id(conn_id: str) -> Connection:
+# Per-process registry of resolved connections, keyed by conn_id, and of engines, keyed by conn_id and engine
+# options. Both hold the time of the connection lookup they are based on.
+_CONNECTIONS: dict[str, tuple[float, Connection]] = {}
+_ENGINES: dict[tuple, tuple[float, Engine]] = {}
+_REGISTRY_LOCK = threading.RLock()
+_REGISTRY_PID = os.getpid()
+
+
+def _reset_registry_after_fork():
+    """
+    Drops the registry inherited from a parent process, without closing the parent's pooled connections.
+    """
+    global _REGISTRY_PID
+    if _REGISTRY_PID != os.getpid():
+        for _, engine in _ENGINES.values():
+            engine.dispose(close=False)
+        _ENGINES.clear()
+        _CONNECTIONS.clear()
+        _REGISTRY_PID = os.getpid()
+
+
+def get_connection_with_airflow_conn_id(conn_id: str, ttl: float = CONNECTION_CACHE_TTL) -> Connection:
     """
     Retrieves the database credentials for a given connection ID.
 
+    The connection is cached per process for `ttl` seconds, so repeated lookups do not go back to the secrets
+    backend.
+
     Args:
         conn_id (str): The connection ID.
+        ttl (float, optional): The number of seconds to cache the connection. Defaults to CONNECTION_CACHE_TTL.
 
     Returns:
         Connection: The database connection details.
     """
-    conn_details = Connection.get_connection_from_secrets(conn_id=conn_id)
-    return conn_details
+    with _REGISTRY_LOCK:
+        _reset_registry_after_fork()
+        cached = _CONNECTIONS.get(conn_id)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        conn_details = Connection.get_connection_from_secrets(conn_id=conn_id)
+        _CONNECTIONS[conn_id] = (time.monotonic(), conn_details)
+        return conn_details
 
 
 def get_database_url_from_connection(conn_details: Connection) -> URL:
@@ -59,7 +130,7 @@ def create_table_if_not_exists(engine: Engine, model: TableTypes) -> None:
     Returns:
         None
     """
-    if not table_exists(engine=engine, table_name=model.__tablename__, schema=model.__table_args__["schema"]):
+    if not table_exists(engine=engine, table_name=model.__tablename__, schema=model.__table__.schema):
         logging.info(f"Creating table: {model.__tablename__}")
         model.__table__.create(engine)
     else:
@@ -107,25 +178,77 @@ def create_schema_if_not_exists_with_engine(engine: Engine, schema_name: str):
     Returns:
         None
     """
-    if schema_name not in inspect(engine).get_schema_names():
-        engine.execute(sqlalchemy.schema.CreateSchema(name=schema_name))
+    with engine.begin() as connection:
+        connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema_name}"')
 
 
-def get_engine_from_airflow_conn_id(conn_id: str) -> Engine:
+def get_engine_from_airflow_conn_id(
+    conn_id: str,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_pre_ping: bool = True,
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+    ttl: float = CONNECTION_CACHE_TTL,
+) -> Engine:
     """
     Retrieves a database engine from the given connection ID.
 
+    One engine, and with it one connection pool, is created per conn_id, engine options and process, and reused by
+    later calls. After `ttl` seconds the connection is looked up again, and when its URL changed, e.g. after a
+    credential rotation, the old engine is disposed and replaced.
+
     Args:
         conn_id (str): The connection ID.
-        schema (bool, optional): Whether to include the schema in the engine. Defaults to True.
+        pool_size (int, optional): The number of pooled connections. Defaults to DB_POOL_SIZE.
+        max_overflow (int, optional): The number of connections allowed on top of the pool. Defaults to
+            DB_MAX_OVERFLOW.
+        pool_pre_ping (bool, optional): Whether to test connections before handing them out. Defaults to True.
+        statement_timeout_ms (int, optional): The Postgres statement timeout in milliseconds.
+            Defaults to DB_STATEMENT_TIMEOUT_MS.
+        ttl (float, optional): The number of seconds before the connection is looked up again. Defaults to
+            CONNECTION_CACHE_TTL.
 
     Returns:
         Engine: The database engine.
     """
-    db_credentials = get_connection_with_airflow_conn_id(conn_id=conn_id)
-    db_url = get_database_url_from_connection(conn_details=db_credentials)
-    engine = create_engine(url=db_url)
-    return engine
+    key = (conn_id, pool_size, max_overflow, pool_pre_ping, statement_timeout_ms)
+    with _REGISTRY_LOCK:
+        _reset_registry_after_fork()
+        cached = _ENGINES.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        db_credentials = get_connection_with_airflow_conn_id(conn_id=conn_id, ttl=ttl)
+        db_url = get_database_url_from_connection(conn_details=db_credentials)
+        if cached is not None and cached[1].url == db_url:
+            _ENGINES[key] = (time.monotonic(), cached[1])
+            return cached[1]
+        if cached is not None:
+            LOGGER.info(f"The connection {conn_id} changed, replacing its engine.")
+            cached[1].dispose()
+        engine = create_engine(
+            url=db_url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=pool_pre_ping,
+            connect_args={"options": f"-c statement_timeout={statement_timeout_ms}"},
+        )
+        _ENGINES[key] = (time.monotonic(), engine)
+        LOGGER.info(f"Created engine for {conn_id=} with {pool_size=}, {max_overflow=}.")
+        return engine
+
+
+def dispose_engines():
+    """
+    Disposes all engines in the registry and forgets the cached connections.
+
+    Returns:
+        None
+    """
+    with _REGISTRY_LOCK:
+        for _, engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _CONNECTIONS.clear()
 
 
 def create_tables(engine: Engine):
@@ -141,40 +264,287 @@ def create_tables(engine: Engine):
     prod_base.metadata.create_all(engine)
 
 
-def prep_database():
+def prep_database(*args, **kwargs):
     """
-    Prepares the database by creating tables and schemas.
+    Prepares the database by applying the pending schema migrations, see `migrations.migrate`. When the schema is
+    up to date this is a single lookup.
 
     Returns:
         None
     """
-    create_schema_if_not_exists_from_conn_id(conn_id="postgres-details", schema_name=AIRFLOW_SCHEMA_NAME)
-    create_tables(engine=get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID))
+    from airflow_assessment.migrations import migrate
 
+    migrate(engine=get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID))
 
-def delete_rows_from_interval(
-    engine: sqlalchemy.engine.Engine, model, start_date: datetime, end_date: datetime, timestamp_col: str
-):
-    from sqlalchemy.sql import column
 
-    ts_col = column(timestamp_col)
-    delete_stmt = delete(model).where(ts_col.between(start_date, end_date))
+def create_partitioned_transaction_table(engine: Engine) -> list[str]:
+    """
+    Creates the transaction table as a partitioned table, with its indexes, if it does not exist yet, and adds the
+    columns of the model that an existing table is missing.
+
+    The table is range partitioned by month on `timestamp`, and every month is list partitioned by `source`, see
+    `ensure_transaction_partitions`. Postgres requires the partition columns in the primary key, and does not support
+    identity columns on partitioned tables before version 17, so `id` is filled from a sequence instead. The BRIN
+    index on `timestamp` and the btree indexes on `payer`, `receiver` and `currency` are declared on the model and
+    cascade to every partition.
 
-    stmt = str(delete_stmt.compile(engine))
+    Args:
+        engine (Engine): The database engine.
 
-    stmt = f"""
-    DELETE FROM "{model.__table_args__['schema']}".{model.__tablename__}
-    where {timestamp_col} between '{start_date}' and '{end_date}'
+    Returns:
+        list[str]: The columns added to an existing table.
     """
-    LOGGER.info(stmt)
+    with engine.begin() as connection:
+        return _create_partitioned_transaction_table(connection)
 
-    with engine.connect() as connection:
-        result = connection.execute(stmt)
-        LOGGER.info(f"{result.rowcount} rows deleted.")
+
+def _create_partitioned_transaction_table(connection) -> list[str]:
+    table = TransactionModel.__table__
+    target = qualified_table_name(TransactionModel)
+    sequence = quote_table_name(table_name=f"{table.name}_id_seq", schema=table.schema)
+    dialect = postgresql.dialect()
+    columns = [
+        (
+            f"\"id\" INTEGER NOT NULL DEFAULT nextval('{sequence}')"
+            if column.name == "id"
+            else f'"{column.name}" {column.type.compile(dialect=dialect)}'
+        )
+        for column in table.columns
+    ]
+    connection.execute(f"CREATE SEQUENCE IF NOT EXISTS {sequence} AS INTEGER CYCLE")
+    connection.execute(
+        f"CREATE TABLE IF NOT EXISTS {target} ({', '.join(columns)}, PRIMARY KEY (id, timestamp, source)) "
+        f"PARTITION BY RANGE (timestamp)"
+    )
+    existing = {column["name"] for column in inspect(connection).get_columns(table.name, schema=table.schema)}
+    added = [column for column in table.columns if column.name not in existing]
+    for column in added:
+        # Columns added to the partitioned table cascade to every partition.
+        connection.execute(
+            f'ALTER TABLE {target} ADD COLUMN IF NOT EXISTS "{column.name}" {column.type.compile(dialect=dialect)}'
+        )
+    for index in table.indexes:
+        connection.execute(CreateIndex(index, if_not_exists=True))
+    return [column.name for column in added]
+
+
+def transaction_partition_name(month: datetime, source: str | None = None) -> str:
+    """
+    Returns the name of the partition of the transaction table for a month, or for a source within a month.
+
+    Args:
+        month (datetime): Any timestamp within the month.
+        source (str | None, optional): The source. Defaults to None, which returns the month partition.
+
+    Returns:
+        str: The unquoted partition name, e.g. `transaction_y2022m01_sepa`.
+    """
+    month = first_day_of_month(to_naive_utc(month))
+    name = f"{TransactionModel.__tablename__}_y{month.year}m{month.month:02d}"
+    if source is None:
+        return name
+    if not re.fullmatch(r"[a-z0-9_]+", source):
+        raise ValueError(f"Invalid transaction source: {source=}")
+    return f"{name}_{source}"
+
+
+def transaction_partition_for_interval(start_date: datetime, end_date: datetime, source: str) -> str | None:
+    """
+    Returns the qualified source partition that exactly covers an interval, if there is one.
+
+    Args:
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The inclusive end of the interval.
+        source (str): The source.
+
+    Returns:
+        str | None: The qualified partition name if the interval spans exactly one whole month, otherwise None.
+    """
+    month = first_day_of_month(to_naive_utc(start_date))
+    month_end = first_day_of_next_month(month) - timedelta(microseconds=1)
+    if to_naive_utc(start_date) != month or to_naive_utc(end_date) != month_end:
+        return None
+    return quote_table_name(
+        table_name=transaction_partition_name(month, source=source), schema=TransactionModel.__table__.schema
+    )
+
+
+def transaction_table_kind(connection) -> str | None:
+    """
+    Returns the kind of the transaction table, from `pg_class.relkind`.
+
+    Args:
+        connection: A database connection.
+
+    Returns:
+        str | None: "p" for a partitioned table, "r" for a regular table, or None if it does not exist.
+    """
+    statement = text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)")
+    kind = connection.execute(statement, {"name": qualified_table_name(TransactionModel)}).scalar()
+    return str(kind) if kind is not None else None
+
+
+def ensure_transaction_partitions(engine: Engine, start_date: datetime, end_date: datetime, sources: list[str]):
+    """
+    Creates the month and source partitions of the transaction table that cover an interval, if they do not exist.
+
+    Concurrent loaders serialize on an advisory lock, so they never race on creating the same partition. A
+    transaction table that is not partitioned yet, i.e. one created before partitioning and not migrated, gets no
+    partitions, and the rows are loaded into it directly.
+
+    Args:
+        engine (Engine): The database engine.
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The end of the interval.
+        sources (list[str]): The sources to create partitions for.
+
+    Returns:
+        None
+    """
+    target = qualified_table_name(TransactionModel)
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": target})
+        if transaction_table_kind(connection) != "p":
+            LOGGER.warning(f"The table {target} is not partitioned, run prep_database to migrate it.")
+            return
+        _create_transaction_partitions(connection, start_date=start_date, end_date=end_date, sources=sources)
+
+
+def _create_transaction_partitions(connection, start_date: datetime, end_date: datetime, sources: list[str]):
+    schema = TransactionModel.__table__.schema
+    target = qualified_table_name(TransactionModel)
+    month = first_day_of_month(to_naive_utc(start_date))
+    while month <= to_naive_utc(end_date):
+        next_month = first_day_of_next_month(month)
+        month_partition = quote_table_name(table_name=transaction_partition_name(month), schema=schema)
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {month_partition} PARTITION OF {target} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}') PARTITION BY LIST (source)"
+        )
+        for source in sources:
+            source_partition = quote_table_name(
+                table_name=transaction_partition_name(month, source=source), schema=schema
+            )
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {source_partition} PARTITION OF {month_partition} "
+                f"FOR VALUES IN ('{source}')"
+            )
+        month = next_month
+
+
+def partition_transaction_table(engine: Engine) -> int:
+    """
+    Moves a transaction table created before partitioning into the partitioned layout, in a single transaction.
+
+    The table and its indexes are renamed, the partitioned table is created in its place, with the partitions that
+    cover the rows, and the rows are copied over with their ids. Rows without a source, which were loaded before
+    the source was recorded, go to the LEGACY_TRANSACTION_SOURCE partitions. The old table is dropped with the
+    views on it, which the `create_views` DAG recreates.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        int: The number of rows moved, 0 when the table does not exist or is partitioned already.
+    """
+    table = TransactionModel.__table__
+    schema = table.schema
+    target = qualified_table_name(TransactionModel)
+    legacy_name = f"{table.name}_unpartitioned"
+    legacy = quote_table_name(table_name=legacy_name, schema=schema)
+    sequence = quote_table_name(table_name=f"{table.name}_id_seq", schema=schema)
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": target})
+        if transaction_table_kind(connection) != "r":
+            return 0
+        indexes = connection.execute(
+            text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = to_regclass(:name)"
+            ),
+            {"name": target},
+        ).fetchall()
+        connection.execute(f'ALTER TABLE {target} RENAME TO "{legacy_name}"')
+        # Index names are unique per schema, so the indexes of the old table make way for those of the new one.
+        for (index,) in indexes:
+            connection.execute(
+                f'ALTER INDEX {quote_table_name(table_name=index, schema=schema)} RENAME TO "{index}_unpartitioned"'
+            )
+        # The identity sequence of the old table is dropped, the partitioned table fills `id` from its own sequence.
+        connection.execute(f'ALTER TABLE {legacy} ALTER COLUMN "id" DROP IDENTITY IF EXISTS')
+        connection.execute(f'ALTER TABLE {legacy} ADD COLUMN IF NOT EXISTS "source" VARCHAR')
+        _create_partitioned_transaction_table(connection)
+        # A serial sequence of the old table is reused, and must not be dropped with it.
+        connection.execute(f"ALTER SEQUENCE IF EXISTS {sequence} OWNED BY NONE")
+
+        existing = {column["name"] for column in inspect(connection).get_columns(legacy_name, schema=schema)}
+        columns = [column.name for column in table.columns if column.name in existing]
+        start_date, end_date = connection.execute(f'SELECT min("timestamp"), max("timestamp") FROM {legacy}').first()
+        if start_date is not None:
+            sources = connection.execute(
+                text(f"SELECT DISTINCT COALESCE(source, :legacy_source) FROM {legacy}"),
+                {"legacy_source": LEGACY_TRANSACTION_SOURCE},
+            ).fetchall()
+            _create_transaction_partitions(
+                connection, start_date=start_date, end_date=end_date, sources=[source for (source,) in sources]
+            )
+        column_list = ", ".join(f'"{name}"' for name in columns)
+        select = ", ".join(
+            'COALESCE("source", :legacy_source)' if name == "source" else f'"{name}"' for name in columns
+        )
+        moved = connection.execute(
+            text(f'INSERT INTO {target} ({column_list}) SELECT {select} FROM {legacy} WHERE "timestamp" IS NOT NULL'),
+            {"legacy_source": LEGACY_TRANSACTION_SOURCE},
+        ).rowcount
+        connection.execute(f"SELECT setval('{sequence}', COALESCE((SELECT max(id) FROM {target}), 0) + 1, false)")
+        connection.execute(f"DROP TABLE {legacy} CASCADE")
+    LOGGER.info(f"Moved {moved} rows of {target} into the partitioned layout, rerun create_views for its views.")
+    return moved
+
+
+def delete_rows_from_interval(
+    engine: Engine,
+    model: TableTypes,
+    start_date: datetime,
+    end_date: datetime,
+    timestamp_col: str,
+    source: str | None = None,
+) -> int:
+    """
+    Deletes the rows of an interval in a single transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The inclusive end of the interval.
+        timestamp_col (str): The column the interval applies to.
+        source (str | None, optional): Only delete the rows of this source. Defaults to None.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    target = qualified_table_name(model)
+    condition = f'"{timestamp_col}" BETWEEN :start_date AND :end_date'
+    if source is not None:
+        condition += " AND source = :source"
+    with engine.begin() as connection:
+        deleted = connection.execute(
+            text(f"DELETE FROM {target} WHERE {condition}"),
+            {"start_date": to_naive_utc(start_date), "end_date": to_naive_utc(end_date), "source": source},
+        ).rowcount
+    LOGGER.info(f"Deleted {deleted} rows from {target} for {start_date} - {end_date}.")
+    return deleted
 
 
 def write_to_database(
-    engine: Engine, model: TableTypes, data: pd.DataFrame, if_exists: Literal["replace", "append", "fail"] = "replace"
+    engine: Engine,
+    model: TableTypes,
+    data: pd.DataFrame,
+    if_exists: Literal["replace", "append", "fail"] = "replace",
+    method: Literal["insert", "copy"] = "insert",
+    chunk_size: int = COPY_CHUNK_SIZE,
+    n_connections: int = 1,
 ):
     """
     Writes the given DataFrame to the database using the given engine and table model.
@@ -184,20 +554,162 @@ def write_to_database(
         model (TableTypes): The table model.
         data (pd.DataFrame): The DataFrame to write to the database.
         if_exists (str, optional): The behaviour if the table already exists. Defaults to "replace".
+        method (str, optional): "insert" writes with `DataFrame.to_sql`, "copy" streams the rows with
+            `COPY FROM STDIN` into the existing table. Defaults to "insert".
+        chunk_size (int, optional): The number of rows per COPY chunk. Defaults to COPY_CHUNK_SIZE.
+        n_connections (int, optional): The number of connections used in parallel for COPY. Defaults to 1.
 
     Returns:
         None
     """
-    data.to_sql(
-        name=model.__tablename__,
-        con=engine,
-        if_exists=if_exists,
-        schema=model.__table_args__["schema"],
-        index=False,
-    )
+    if method == "copy":
+        if if_exists == "fail":
+            raise ValueError("if_exists='fail' is not supported with method='copy', the table must already exist.")
+        if if_exists == "replace":
+            truncate_table(engine=engine, model=model)
+        copy_to_database(engine=engine, model=model, data=data, chunk_size=chunk_size, n_connections=n_connections)
+        return
+
+    with get_metrics().timer("db_insert") as timing:
+        data.to_sql(
+            name=model.__tablename__,
+            con=engine,
+            if_exists=if_exists,
+            schema=model.__table__.schema,
+            index=False,
+        )
+        timing.rows = len(data)
     LOGGER.info(f"Written {len(data)} rows to database {model.__tablename__=}.")
 
 
+def qualified_table_name(model: TableTypes) -> str:
+    """
+    Returns the quoted, schema qualified name of the table of the given model.
+
+    Args:
+        model (TableTypes): The table model.
+
+    Returns:
+        str: The qualified table name, e.g. `"airflow-assessment"."transaction"`.
+    """
+    return quote_table_name(table_name=model.__tablename__, schema=model.__table__.schema)
+
+
+def quote_table_name(table_name: str, schema: str | None = None) -> str:
+    """
+    Quotes a table name, qualified with its schema if given.
+
+    Args:
+        table_name (str): The name of the table.
+        schema (str | None, optional): The schema of the table. Defaults to None.
+
+    Returns:
+        str: The quoted table name.
+    """
+    if schema is None:
+        return f'"{table_name}"'
+    return f'"{schema}"."{table_name}"'
+
+
+def frame_to_csv_buffer(data: pd.DataFrame) -> io.StringIO:
+    """
+    Serializes the given DataFrame into an in-memory CSV buffer that can be consumed by `COPY FROM STDIN`.
+
+    Args:
+        data (pd.DataFrame): The DataFrame to serialize.
+
+    Returns:
+        io.StringIO: The CSV buffer, positioned at the start.
+    """
+    buffer = io.StringIO()
+    data.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    return buffer
+
+
+def copy_frame(dbapi_connection, table_name: str, data: pd.DataFrame) -> None:
+    """
+    Copies the given DataFrame into a table over a raw psycopg2 connection. Does not commit.
+
+    Args:
+        dbapi_connection: The raw DBAPI connection.
+        table_name (str): The qualified name of the target table.
+        data (pd.DataFrame): The rows to copy. The column names must match the table columns.
+    """
+    columns = ", ".join(f'"{column}"' for column in data.columns)
+    statement = f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(statement, frame_to_csv_buffer(data))
+    finally:
+        cursor.close()
+
+
+def _copy_chunks(engine: Engine, table_name: str, chunks: list[pd.DataFrame]) -> int:
+    """
+    Copies the given chunks into a table over a single connection and commits once all chunks are written.
+    """
+    dbapi_connection = engine.raw_connection()
+    try:
+        for chunk in chunks:
+            copy_frame(dbapi_connection=dbapi_connection, table_name=table_name, data=chunk)
+        dbapi_connection.commit()
+    except Exception:
+        dbapi_connection.rollback()
+        raise
+    finally:
+        dbapi_connection.close()
+    return sum(len(chunk) for chunk in chunks)
+
+
+def copy_to_database(
+    engine: Engine,
+    model: TableTypes,
+    data: pd.DataFrame,
+    chunk_size: int = COPY_CHUNK_SIZE,
+    n_connections: int = 1,
+    table_name: str | None = None,
+) -> int:
+    """
+    Bulk loads the given DataFrame into the table of the given model with `COPY FROM STDIN`.
+
+    The frame is serialized in chunks of `chunk_size` rows, so only one chunk per connection is held as CSV in
+    memory at any time. With `n_connections > 1` the chunks are spread round-robin over that many connections
+    which copy in parallel, each in its own transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        data (pd.DataFrame): The DataFrame to write to the database.
+        chunk_size (int, optional): The number of rows per COPY chunk. Defaults to COPY_CHUNK_SIZE.
+        n_connections (int, optional): The number of connections to copy with in parallel. Defaults to 1.
+        table_name (str | None, optional): The qualified name of the table to copy into, e.g. a staging table.
+            Defaults to the table of the model.
+
+    Returns:
+        int: The number of rows written.
+    """
+    table_name = table_name or qualified_table_name(model)
+    chunks = [data.iloc[start : start + chunk_size] for start in range(0, len(data), chunk_size)]
+    n_connections = max(1, min(n_connections, len(chunks)))
+
+    start_time = time.perf_counter()
+    if n_connections == 1:
+        rows = _copy_chunks(engine=engine, table_name=table_name, chunks=chunks)
+    else:
+        groups = [chunks[i::n_connections] for i in range(n_connections)]
+        with ThreadPoolExecutor(max_workers=n_connections) as executor:
+            rows = sum(executor.map(lambda group: _copy_chunks(engine, table_name, group), groups))
+    elapsed = time.perf_counter() - start_time
+    get_metrics().add_stage("db_copy", elapsed, rows=rows)
+
+    LOGGER.info(
+        f"Copied {rows} rows into {table_name} in {elapsed:.2f}s "
+        f"({rows / max(elapsed, 1e-9):.0f} rows/s, {len(chunks)} chunks, {n_connections} connections)."
+    )
+    return rows
+
+
 def truncate_table(engine: Engine, model: TableTypes):
     """
     Truncates the given table in the database.
@@ -210,5 +722,489 @@ def truncate_table(engine: Engine, model: TableTypes):
         None
     """
     with engine.connect() as connection:
-        connection.execute(f"""TRUNCATE TABLE "{model.__table_args__['schema']}".{model.__tablename__}""")
+        connection.execute(f"TRUNCATE TABLE {qualified_table_name(model)}")
         LOGGER.info(f"Truncated table: {model.__tablename__}")
+
+
+def quarantine_rows(engine: Engine, model_name: str, rejected: list[dict]):
+    """
+    Writes rows that failed validation to the quarantine table.
+
+    Args:
+        engine (Engine): The database engine.
+        model_name (str): The name of the Pydantic model the rows were validated against.
+        rejected (list[dict]): The rejected rows, as dicts with the original `payload` and the `reason`.
+
+    Returns:
+        None
+    """
+    quarantine = pd.DataFrame(
+        {
+            "model": model_name,
+            "reason": [row["reason"] for row in rejected],
+            "payload": [json.dumps(row["payload"], default=str) for row in rejected],
+            "quarantined_at": to_naive_utc(datetime.now(timezone.utc)),
+        }
+    )
+    write_to_database(engine=engine, model=QuarantineModel, data=quarantine, if_exists="append", method="copy")
+
+
+def primary_key_columns(model: TableTypes) -> list[str]:
+    """
+    Returns the names of the primary key columns of the given model.
+
+    Args:
+        model (TableTypes): The table model.
+
+    Returns:
+        list[str]: The primary key column names.
+    """
+    return [column.name for column in model.__table__.primary_key.columns]
+
+
+def read_table(engine: Engine, model: TableTypes) -> pd.DataFrame:
+    """
+    Reads the full table of the given model.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+
+    Returns:
+        pd.DataFrame: The rows of the table.
+    """
+    return pd.read_sql_table(model.__tablename__, con=engine, schema=model.__table__.schema)
+
+
+def iter_interval(
+    engine: Engine,
+    model: TableTypes,
+    start_date: datetime,
+    end_date: datetime,
+    timestamp_col: str,
+    columns: list[str],
+    source: str | None = None,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads the rows of an interval in chunks, with a server-side cursor, so the interval is never held in memory.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The end of the interval.
+        timestamp_col (str): The column the interval applies to.
+        columns (list[str]): The columns to read.
+        source (str | None, optional): Only read the rows of this source. Defaults to None.
+        chunk_size (int, optional): The number of rows per chunk. Defaults to COPY_CHUNK_SIZE.
+
+    Yields:
+        pd.DataFrame: The rows, ordered by timestamp.
+    """
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    condition = f'"{timestamp_col}" BETWEEN :start_date AND :end_date'
+    if source is not None:
+        condition += " AND source = :source"
+    query = text(
+        f'SELECT {column_list} FROM {qualified_table_name(model)} WHERE {condition} ORDER BY "{timestamp_col}"'
+    )
+    params = {"start_date": to_naive_utc(start_date), "end_date": to_naive_utc(end_date), "source": source}
+    with engine.connect().execution_options(stream_results=True) as connection:
+        yield from pd.read_sql(query, con=connection, params=params, chunksize=chunk_size)
+
+
+def get_latest_timestamp(
+    engine: Engine, model: TableTypes, timestamp_col: str, source: str | None = None
+) -> datetime | None:
+    """
+    Retrieves the latest timestamp of a table, optionally of a single source.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        timestamp_col (str): The timestamp column.
+        source (str | None, optional): Only consider the rows of this source. Defaults to None.
+
+    Returns:
+        datetime | None: The latest timestamp, or None if there are no rows.
+    """
+    condition = "WHERE source = :source" if source is not None else ""
+    query = text(f'SELECT max("{timestamp_col}") FROM {qualified_table_name(model)} {condition}')
+    with engine.connect() as connection:
+        return connection.execute(query, {"source": source}).scalar()
+
+
+def get_dataset_fingerprint(engine: Engine, dataset: str) -> str | None:
+    """
+    Retrieves the fingerprint of the last loaded version of a dataset.
+
+    Args:
+        engine (Engine): The database engine.
+        dataset (str): The name of the dataset.
+
+    Returns:
+        str | None: The fingerprint, or None if the dataset was never loaded.
+    """
+    table = DatasetFingerprintModel.__table__
+    with engine.connect() as connection:
+        return connection.execute(select(table.c.fingerprint).where(table.c.dataset == dataset)).scalar()
+
+
+def get_watermark(engine: Engine, key: str) -> str | None:
+    """
+    Retrieves the last committed API cursor of an ingest.
+
+    Args:
+        engine (Engine): The database engine.
+        key (str): The ingest, see `WatermarkModel`.
+
+    Returns:
+        str | None: The `after-timestamp` cursor, or None if nothing was committed yet.
+    """
+    table = WatermarkModel.__table__
+    with engine.connect() as connection:
+        return connection.execute(select(table.c.cursor).where(table.c.key == key)).scalar()
+
+
+def set_watermark(connection: sqlalchemy.engine.Connection, key: str, cursor: str):
+    """
+    Stores the API cursor of an ingest, in the transaction of the given connection.
+
+    Args:
+        connection (Connection): The connection, within the transaction that commits the rows up to the cursor.
+        key (str): The ingest, see `WatermarkModel`.
+        cursor (str): The `after-timestamp` cursor.
+    """
+    row = {"key": key, "cursor": cursor, "updated_at": to_naive_utc(datetime.now(timezone.utc))}
+    statement = insert(WatermarkModel.__table__).values(**row)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["key"], set_={"cursor": cursor, "updated_at": row["updated_at"]}
+        )
+    )
+
+
+def delete_watermark(engine: Engine, key: str):
+    """
+    Removes the cursor of an ingest, e.g. once a window is complete, so the next run starts from scratch.
+
+    Args:
+        engine (Engine): The database engine.
+        key (str): The ingest, see `WatermarkModel`.
+    """
+    table = WatermarkModel.__table__
+    with engine.begin() as connection:
+        connection.execute(delete(table).where(table.c.key == key))
+
+
+def append_with_watermark(
+    engine: Engine, model: TableTypes, data: pd.DataFrame, key: str, cursor: str, skip_duplicates: bool = False
+) -> int:
+    """
+    Appends a page of rows and advances the cursor of the ingest in a single transaction, so after a failure the
+    ingest resumes from exactly the last committed page.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        data (pd.DataFrame): The rows of the page.
+        key (str): The ingest, see `WatermarkModel`.
+        cursor (str): The `after-timestamp` cursor after the page.
+        skip_duplicates (bool, optional): Whether to skip the rows that conflict with a unique index, see
+            `insert_from_staging`. Defaults to False.
+
+    Returns:
+        int: The number of rows written.
+    """
+    with get_metrics().timer("db_copy") as timing, engine.begin() as connection:
+        written = len(data)
+        if not skip_duplicates and not data.empty:
+            copy_frame(dbapi_connection=connection.connection, table_name=qualified_table_name(model), data=data)
+        elif not data.empty:
+            staging = f'"{model.__tablename__}_append_{uuid.uuid4().hex[:12]}"'
+            column_list = ", ".join(f'"{column}"' for column in data.columns)
+            connection.execute(
+                f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {column_list} FROM {qualified_table_name(model)} WITH NO DATA"
+            )
+            copy_frame(dbapi_connection=connection.connection, table_name=staging, data=data)
+            written = connection.execute(
+                insert_from_staging(model, staging=staging, columns=list(data.columns), skip_duplicates=skip_duplicates)
+            ).rowcount
+        set_watermark(connection, key=key, cursor=cursor)
+        timing.rows = written
+    if written < len(data):
+        get_metrics().increment("rows_duplicate", len(data) - written)
+    return written
+
+
+def sync_table(engine: Engine, model: TableTypes, data: pd.DataFrame) -> ChangeSet | None:
+    """
+    Brings the table of the given model in line with `data`, writing only the rows that changed.
+
+    The dataset is fingerprinted first. When the fingerprint matches the one of the last load nothing is read or
+    written. Otherwise the stored rows are diffed against `data` by primary key and row hash, and the deleted and
+    updated rows are removed and the inserted and updated rows copied in, in a single transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        data (pd.DataFrame): The complete, current dataset.
+
+    Returns:
+        ChangeSet | None: The applied changes, or None if the dataset did not change.
+    """
+    key_columns = primary_key_columns(model)
+    fingerprint = fingerprint_frame(data, key_columns=key_columns)
+    if get_dataset_fingerprint(engine, dataset=model.__tablename__) == fingerprint:
+        LOGGER.info(f"Dataset {model.__tablename__} did not change since the last load, skipping write.")
+        return None
+
+    changes = diff_frames(current=data, stored=read_table(engine, model), key_columns=key_columns)
+    LOGGER.info(f"Applying changes to {model.__tablename__}: {changes}.")
+
+    table = model.__table__
+    stale_keys = pd.concat([changes.deleted, changes.updated[key_columns]])
+    upserts = pd.concat([changes.inserted, changes.updated])
+    fingerprint_row = {
+        "dataset": model.__tablename__,
+        "fingerprint": fingerprint,
+        "row_count": len(data),
+        "updated_at": to_naive_utc(datetime.now(timezone.utc)),
+    }
+    upsert_fingerprint = insert(DatasetFingerprintModel.__table__).values(**fingerprint_row)
+    upsert_fingerprint = upsert_fingerprint.on_conflict_do_update(
+        index_elements=["dataset"], set_={k: v for k, v in fingerprint_row.items() if k != "dataset"}
+    )
+
+    with get_metrics().timer("db_sync") as timing, engine.begin() as connection:
+        timing.rows = len(stale_keys) + len(upserts)
+        if not stale_keys.empty:
+            key = tuple_(*(table.c[column] for column in key_columns))
+            connection.execute(delete(table).where(key.in_(list(stale_keys.itertuples(index=False, name=None)))))
+        if not upserts.empty:
+            copy_frame(dbapi_connection=connection.connection, table_name=qualified_table_name(model), data=upserts)
+        connection.execute(upsert_fingerprint)
+    return changes
+
+
+@contextmanager
+def staging_table(engine: Engine, model: TableTypes, columns: list[str]) -> Iterator[str]:
+    """
+    Creates an empty, unlogged staging table next to the table of the given model and drops it afterwards.
+
+    The staging table only has the given columns, without constraints or identity columns, and a unique name, so
+    concurrent loads into the same target never share a staging table.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model of the target table.
+        columns (list[str]): The columns of the staging table.
+
+    Yields:
+        str: The qualified name of the staging table.
+    """
+    staging_name = f"{model.__tablename__}_staging_{uuid.uuid4().hex[:12]}"
+    staging = quote_table_name(table_name=staging_name, schema=model.__table__.schema)
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    with engine.begin() as connection:
+        connection.execute(
+            f"CREATE UNLOGGED TABLE {staging} AS SELECT {column_list} FROM {qualified_table_name(model)} WITH NO DATA"
+        )
+    try:
+        yield staging
+    finally:
+        with engine.begin() as connection:
+            connection.execute(f"DROP TABLE IF EXISTS {staging}")
+
+
+def replace_interval(
+    engine: Engine,
+    model: TableTypes,
+    data: pd.DataFrame,
+    start_date: datetime,
+    end_date: datetime,
+    timestamp_col: str,
+    chunk_size: int = COPY_CHUNK_SIZE,
+    n_connections: int = 1,
+    source: str | None = None,
+    partition: str | None = None,
+    skip_duplicates: bool = False,
+) -> int:
+    """
+    Atomically replaces the rows of an interval with `data`.
+
+    The rows are bulk loaded into an unlogged staging table first. The old rows of the interval are then deleted
+    and the staged rows inserted in a single transaction, so readers never see a half-loaded interval, a failed
+    load leaves the old rows in place, and retrying a load gives the same result.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        data (pd.DataFrame): The complete set of rows for the interval.
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The end of the interval.
+        timestamp_col (str): The column the interval applies to.
+        chunk_size (int, optional): The number of rows per COPY chunk. Defaults to COPY_CHUNK_SIZE.
+        n_connections (int, optional): The number of connections to stage with in parallel. Defaults to 1.
+        source (str | None, optional): Only replace the rows of this source. Defaults to None.
+        partition (str | None, optional): The qualified name of a partition that exactly covers the interval,
+            which is truncated instead of deleting the interval row by row, if it exists. Defaults to None.
+        skip_duplicates (bool, optional): Whether to skip the rows that conflict with a unique index, see
+            `insert_from_staging`. Defaults to False.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    with staging_table(engine=engine, model=model, columns=list(data.columns)) as staging:
+        copy_to_database(
+            engine=engine,
+            model=model,
+            data=data,
+            chunk_size=chunk_size,
+            n_connections=n_connections,
+            table_name=staging,
+        )
+        return replace_interval_from_staging(
+            engine=engine,
+            model=model,
+            staging=staging,
+            columns=list(data.columns),
+            start_date=start_date,
+            end_date=end_date,
+            timestamp_col=timestamp_col,
+            source=source,
+            partition=partition,
+            skip_duplicates=skip_duplicates,
+        )
+
+
+def insert_from_staging(model: TableTypes, staging: str, columns: list[str], skip_duplicates: bool = False) -> str:
+    """
+    Returns the statement that inserts the rows of a staging table into the table of the given model.
+
+    With `skip_duplicates`, rows that conflict with a unique index, e.g. a transaction that is already stored, are
+    skipped with `ON CONFLICT DO NOTHING`.
+
+    Args:
+        model (TableTypes): The table model of the target table.
+        staging (str): The qualified name of the staging table.
+        columns (list[str]): The columns to insert.
+        skip_duplicates (bool, optional): Whether to skip rows that conflict with a unique index. Defaults to False.
+
+    Returns:
+        str: The statement.
+    """
+    target = qualified_table_name(model)
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    statement = f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {staging}"
+    if skip_duplicates:
+        statement += " ON CONFLICT DO NOTHING"
+    return statement
+
+
+def replace_interval_from_staging(
+    engine: Engine,
+    model: TableTypes,
+    staging: str,
+    columns: list[str],
+    start_date: datetime,
+    end_date: datetime,
+    timestamp_col: str,
+    source: str | None = None,
+    partition: str | None = None,
+    skip_duplicates: bool = False,
+) -> int:
+    """
+    Replaces the rows of an interval with the rows of a staging table in a single transaction.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        staging (str): The qualified name of the staging table.
+        columns (list[str]): The columns to insert.
+        start_date (datetime): The start of the interval.
+        end_date (datetime): The end of the interval.
+        timestamp_col (str): The column the interval applies to.
+        source (str | None, optional): Only replace the rows of this source. Defaults to None.
+        partition (str | None, optional): The qualified name of a partition that exactly covers the interval,
+            which is truncated instead of deleting the interval row by row, if it exists. Defaults to None.
+        skip_duplicates (bool, optional): Whether to skip the rows that conflict with a unique index, see
+            `insert_from_staging`. Defaults to False.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    target = qualified_table_name(model)
+    with get_metrics().timer("db_merge") as timing, engine.begin() as connection:
+        if (
+            partition is not None
+            and connection.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar()
+        ):
+            connection.execute(f"TRUNCATE TABLE {partition}")
+            deleted = "all"
+        else:
+            condition = f'"{timestamp_col}" BETWEEN :start_date AND :end_date'
+            if source is not None:
+                condition += " AND source = :source"
+            deleted = connection.execute(
+                text(f"DELETE FROM {target} WHERE {condition}"),
+                {"start_date": to_naive_utc(start_date), "end_date": to_naive_utc(end_date), "source": source},
+            ).rowcount
+        inserted = connection.execute(
+            insert_from_staging(model, staging=staging, columns=columns, skip_duplicates=skip_duplicates)
+        ).rowcount
+        timing.rows = inserted
+    LOGGER.info(f"Replaced {deleted} rows with {inserted} rows in {target} for {start_date} - {end_date}.")
+    return inserted
+
+
+def upsert_table(
+    engine: Engine,
+    model: TableTypes,
+    data: pd.DataFrame,
+    delete_missing: bool = False,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> int:
+    """
+    Merges `data` into the table of the given model by primary key.
+
+    The rows are bulk loaded into an unlogged staging table and merged with `INSERT ... ON CONFLICT DO UPDATE` in a
+    single transaction, which makes the load idempotent and leaves the table untouched when it fails.
+
+    Args:
+        engine (Engine): The database engine.
+        model (TableTypes): The table model.
+        data (pd.DataFrame): The rows to merge. Must contain the primary key columns.
+        delete_missing (bool, optional): Whether to delete the rows whose key is not in `data`, making the table
+            equal to `data`. Defaults to False.
+        chunk_size (int, optional): The number of rows per COPY chunk. Defaults to COPY_CHUNK_SIZE.
+
+    Returns:
+        int: The number of rows inserted or updated.
+    """
+    target = qualified_table_name(model)
+    columns = list(data.columns)
+    key_columns = primary_key_columns(model)
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    key_list = ", ".join(f'"{column}"' for column in key_columns)
+    updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in key_columns)
+    on_conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+
+    with staging_table(engine=engine, model=model, columns=columns) as staging:
+        copy_to_database(engine=engine, model=model, data=data, chunk_size=chunk_size, table_name=staging)
+        with get_metrics().timer("db_merge") as timing, engine.begin() as connection:
+            upserted = connection.execute(
+                f"INSERT INTO {target} ({column_list}) SELECT DISTINCT ON ({key_list}) {column_list} FROM {staging} "
+                f"ON CONFLICT ({key_list}) {on_conflict}"
+            ).rowcount
+            deleted = 0
+            if delete_missing:
+                key_match = " AND ".join(f't."{column}" = s."{column}"' for column in key_columns)
+                deleted = connection.execute(
+                    f"DELETE FROM {target} t WHERE NOT EXISTS (SELECT 1 FROM {staging} s WHERE {key_match})"
+                ).rowcount
+            timing.rows = upserted + deleted
+    LOGGER.info(f"Upserted {upserted} rows into {target} and deleted {deleted} rows.")
+    return upserted
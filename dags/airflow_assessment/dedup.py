@@ -0,0 +1,87 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from airflow_assessment.metrics import get_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+CONTENT_HASH_COL = "content_hash"
+# The columns that make up a transaction. Ids are not unique, so the timestamp is part of it: the same id, parties
+# and amount at another time is another transaction.
+CONTENT_COLUMNS = ["trade_id", "payer", "receiver", "amount", "currency", "timestamp", "source"]
+
+
+def content_hashes(trades: pd.DataFrame) -> pd.Series:
+    """
+    Computes a stable 64-bit hash of the content of every transaction.
+
+    The hash only depends on the values, not on the dtypes, so a transaction hashes equally whether its text
+    columns are objects, Arrow strings or categoricals, its timestamp has any resolution, and in every run.
+
+    Args:
+        trades (pd.DataFrame): The transformed trades, with the CONTENT_COLUMNS.
+
+    Returns:
+        pd.Series: The hashes as signed integers, which fit a BIGINT column, aligned with `trades`.
+    """
+    content = trades[CONTENT_COLUMNS].assign(
+        timestamp=pd.to_datetime(trades["timestamp"], utc=True).astype("datetime64[ns, UTC]")
+    )
+    hashes = pd.util.hash_pandas_object(content, index=False)
+    return pd.Series(hashes.to_numpy().view("int64"), index=trades.index, name=CONTENT_HASH_COL)
+
+
+class SeenHashes:
+    """
+    The content hashes seen in a run, so a streamed interval drops the transactions that repeat one of an earlier
+    page. Holds a Python int per distinct transaction, roughly 70 bytes, so it is kept per month and source.
+    """
+
+    def __init__(self):
+        self._hashes: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add_new(self, hashes: pd.Series) -> np.ndarray:
+        """
+        Adds distinct hashes and returns which of them were not seen before.
+
+        Args:
+            hashes (pd.Series): The hashes of a page, without duplicates.
+
+        Returns:
+            np.ndarray: A boolean mask of the new hashes.
+        """
+        values = hashes.tolist()
+        is_new = np.fromiter((value not in self._hashes for value in values), dtype=bool, count=len(values))
+        self._hashes.update(values)
+        return is_new
+
+
+def drop_duplicate_trades(trades: pd.DataFrame, seen: SeenHashes | None = None) -> pd.DataFrame:
+    """
+    Adds the CONTENT_HASH_COL to transformed trades and drops the trades whose content repeats an earlier one of
+    the batch or, when `seen` is given, of an earlier batch.
+
+    Args:
+        trades (pd.DataFrame): The transformed trades.
+        seen (SeenHashes | None, optional): The hashes of the earlier batches of the run. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The first occurrence of every transaction.
+    """
+    with get_metrics().timer("dedup") as timing:
+        trades = trades.assign(**{CONTENT_HASH_COL: content_hashes(trades)})
+        keep = ~trades[CONTENT_HASH_COL].duplicated().to_numpy()
+        if seen is not None:
+            keep[keep] = seen.add_new(trades.loc[keep, CONTENT_HASH_COL])
+        n_duplicates = len(trades) - int(keep.sum())
+        if n_duplicates:
+            trades = trades.loc[keep]
+        timing.rows = len(trades)
+    get_metrics().increment("rows_duplicate", n_duplicates)
+    if n_duplicates:
+        LOGGER.info(f"Dropped {n_duplicates} duplicate trades.")
+    return trades
@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from airflow_assessment.constant import ENRICHMENT_INDEX_TTL
+from airflow_assessment.database import qualified_table_name
+from airflow_assessment.metrics import get_metrics
+from airflow_assessment.models.alchemy import CompanyModel, RateModel, TransactionModel
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+LOGGER = logging.getLogger(__name__)
+
+ENRICHMENT_COLUMNS = ["eur_amount", "country_payer", "country_receiver", "payer_company_id", "receiver_company_id"]
+
+# Recomputes the stored enrichment from the current rates and companies, for rows loaded before a change.
+# Only the rows whose EUR amount actually changes are rewritten, and their months and sources are returned.
+EUR_AMOUNT_SQL = """
+WITH updated AS (
+    UPDATE {transaction} t
+    SET eur_amount = t.amount * (SELECT r.eur_rate FROM {rate} r WHERE r.currency = t.currency)
+    WHERE ({condition})
+        AND t.eur_amount IS DISTINCT FROM t.amount * (SELECT r.eur_rate FROM {rate} r WHERE r.currency = t.currency)
+    RETURNING t.timestamp, t.source
+)
+SELECT DATE_TRUNC('month', timestamp) AS month, source FROM updated GROUP BY 1, 2 ORDER BY 1, 2
+"""
+
+COMPANY_ID_SQL = """
+UPDATE {transaction} t
+SET payer_company_id = (SELECT c.company_id FROM {company} c WHERE c.iban = t.payer),
+    receiver_company_id = (SELECT c.company_id FROM {company} c WHERE c.iban = t.receiver)
+WHERE {condition}
+"""
+
+COUNTRY_SQL = """
+UPDATE {transaction} t
+SET country_payer = SUBSTRING(t.payer, 1, 2), country_receiver = SUBSTRING(t.receiver, 1, 2)
+WHERE t.country_payer IS NULL OR t.country_receiver IS NULL
+"""
+
+_INDEXES: dict[str, tuple[float, "EnrichmentIndex"]] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+@dataclass
+class EnrichmentIndex:
+    """
+    Compact lookup tables of the current rates and company IBANs, so a page of trades is enriched with vectorized
+    hash lookups instead of joins at query time.
+
+    Attributes:
+        currencies (pd.Index): The currencies with a rate.
+        eur_rates (np.ndarray): The EUR rate of every currency, aligned with `currencies`.
+        ibans (pd.Index): The IBANs of the companies.
+        company_ids (np.ndarray): The company ID of every IBAN, aligned with `ibans`.
+    """
+
+    currencies: pd.Index
+    eur_rates: np.ndarray
+    ibans: pd.Index
+    company_ids: np.ndarray
+
+    @classmethod
+    def from_frames(cls, rates: pd.DataFrame, companies: pd.DataFrame) -> "EnrichmentIndex":
+        """
+        Builds the index from the rates and the companies, as stored in the `rate` and `company` tables.
+
+        Args:
+            rates (pd.DataFrame): The rates, with the `currency` and `eur_rate` columns.
+            companies (pd.DataFrame): The companies, with the `iban` and `company_id` columns.
+
+        Returns:
+            EnrichmentIndex: The index.
+        """
+        return cls(
+            currencies=pd.Index(rates["currency"].astype(object)),
+            eur_rates=rates["eur_rate"].to_numpy(dtype="float64"),
+            ibans=pd.Index(companies["iban"].astype(object)),
+            company_ids=companies["company_id"].to_numpy(dtype="int64"),
+        )
+
+
+def load_enrichment_index(engine: Engine) -> EnrichmentIndex:
+    """
+    Reads the enrichment index from the `rate` and `company` tables.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        EnrichmentIndex: The index.
+    """
+    with engine.connect() as connection:
+        rates = pd.read_sql(text(f"SELECT currency, eur_rate FROM {qualified_table_name(RateModel)}"), connection)
+        companies = pd.read_sql(
+            text(f"SELECT iban, company_id FROM {qualified_table_name(CompanyModel)} WHERE company_id IS NOT NULL"),
+            connection,
+        )
+    LOGGER.info(f"Loaded the enrichment index with {len(rates)} rates and {len(companies)} company IBANs.")
+    return EnrichmentIndex.from_frames(rates=rates, companies=companies)
+
+
+def get_enrichment_index(engine: Engine, ttl: float = ENRICHMENT_INDEX_TTL) -> EnrichmentIndex:
+    """
+    Returns the enrichment index of a database, reloading it when it is older than `ttl` seconds, so the pages of
+    a task share one index.
+
+    Args:
+        engine (Engine): The database engine.
+        ttl (float, optional): The maximum age of the index in seconds. Defaults to ENRICHMENT_INDEX_TTL.
+
+    Returns:
+        EnrichmentIndex: The index.
+    """
+    key = str(engine.url)
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(key)
+        if cached is not None and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        index = load_enrichment_index(engine)
+        _INDEXES[key] = (time.monotonic(), index)
+        return index
+
+
+def clear_enrichment_index():
+    """
+    Drops the cached enrichment indexes, e.g. after the rates or companies changed.
+    """
+    with _INDEXES_LOCK:
+        _INDEXES.clear()
+
+
+def _positions(index: pd.Index, values: pd.Series) -> np.ndarray:
+    # Categoricals are looked up once per category rather than once per row.
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        category_positions = index.get_indexer(values.cat.categories.astype(object))
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_positions[codes], -1)
+    return index.get_indexer(values.astype(object))
+
+
+def _lookup_ids(index: EnrichmentIndex, ibans: pd.Series) -> pd.arrays.IntegerArray:
+    positions = _positions(index.ibans, ibans)
+    missing = positions < 0
+    ids = index.company_ids[np.where(missing, 0, positions)] if len(index.company_ids) else np.zeros(len(ibans))
+    return pd.arrays.IntegerArray(ids.astype("int64"), missing)
+
+
+def enrich_trades(trades: pd.DataFrame, index: EnrichmentIndex) -> pd.DataFrame:
+    """
+    Adds the `ENRICHMENT_COLUMNS` to transformed trades: the amount in EUR, the countries of the payer and the
+    receiver, and the company IDs of the payer and the receiver.
+
+    Trades in a currency without a rate get no EUR amount and IBANs that belong to no company get no company ID.
+
+    Args:
+        trades (pd.DataFrame): The trades, as returned by `transform_trades`.
+        index (EnrichmentIndex): The lookup tables.
+
+    Returns:
+        pd.DataFrame: The enriched trades.
+    """
+    with get_metrics().timer("enrich") as timing:
+        trades = trades.copy()
+        rate_positions = _positions(index.currencies, trades["currency"])
+        rates = np.append(index.eur_rates, np.nan)[rate_positions]
+        trades["eur_amount"] = trades["amount"].to_numpy(dtype="float64") * rates
+        trades["country_payer"] = trades["payer"].str.slice(0, 2).astype("category")
+        trades["country_receiver"] = trades["receiver"].str.slice(0, 2).astype("category")
+        trades["payer_company_id"] = _lookup_ids(index, trades["payer"])
+        trades["receiver_company_id"] = _lookup_ids(index, trades["receiver"])
+        timing.rows = len(trades)
+    return trades
+
+
+def refresh_enrichment(
+    engine: Engine,
+    rates: bool = False,
+    companies: bool = False,
+    ibans: list[str] | None = None,
+    countries: bool = False,
+    currencies: list[str] | None = None,
+) -> list[tuple[datetime, str]]:
+    """
+    Recomputes the enrichment of stored transactions, after the rates or the companies changed or for the rows
+    that were loaded before the enrichment columns existed.
+
+    Args:
+        engine (Engine): The database engine.
+        rates (bool, optional): Whether to recompute the EUR amount of every transaction. Defaults to False.
+        currencies (list[str] | None, optional): Recompute the EUR amount of the transactions in these currencies
+            only. Defaults to None.
+        companies (bool, optional): Whether to recompute the company IDs of every transaction. Defaults to False.
+        ibans (list[str] | None, optional): Recompute the company IDs of the transactions of these IBANs only.
+            Defaults to None.
+        countries (bool, optional): Whether to fill in the missing countries. Defaults to False.
+
+    Returns:
+        list[tuple[datetime, str]]: The months and sources of the transactions whose EUR amount changed, so only
+            their aggregates have to be recomputed.
+    """
+    tables = {
+        "transaction": qualified_table_name(TransactionModel),
+        "rate": qualified_table_name(RateModel),
+        "company": qualified_table_name(CompanyModel),
+    }
+    months = []
+    with get_metrics().timer("enrichment_refresh"), engine.begin() as connection:
+        if rates:
+            months = connection.execute(text(EUR_AMOUNT_SQL.format(condition="TRUE", **tables))).fetchall()
+        elif currencies:
+            condition = "t.currency = ANY(:currencies)"
+            months = connection.execute(
+                text(EUR_AMOUNT_SQL.format(condition=condition, **tables)), {"currencies": list(currencies)}
+            ).fetchall()
+        if companies:
+            connection.execute(text(COMPANY_ID_SQL.format(condition="TRUE", **tables)))
+        elif ibans:
+            condition = "t.payer = ANY(:ibans) OR t.receiver = ANY(:ibans)"
+            connection.execute(text(COMPANY_ID_SQL.format(condition=condition, **tables)), {"ibans": list(ibans)})
+        if countries:
+            connection.execute(text(COUNTRY_SQL.format(**tables)))
+    clear_enrichment_index()
+    LOGGER.info(
+        f"Refreshed the transaction enrichment: {rates=}, {companies=}, {len(currencies or [])} currencies, "
+        f"{len(ibans or [])} IBANs. The EUR amounts changed in {len(months)} months."
+    )
+    return [(month, source) for month, source in months]
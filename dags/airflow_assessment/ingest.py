@@ -1,17 +1,60 @@
 import logging
-from datetime import datetime
-from typing import Any, Type
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Any, Iterator, Type
 
 import pandas as pd
 import pytz
-import requests
-from airflow_assessment.constant import CDM_API_URL, POSTGRES_CON_ID
+from airflow_assessment.aggregates import refresh_aggregates
+from airflow_assessment.client import get_cdm_client
+from airflow_assessment.columns import ColumnBuffer, rows_to_frame
+from airflow_assessment.constant import (
+    API_TS_FORMAT,
+    CDM_API_URL,
+    FETCH_MAX_WORKERS,
+    LAKE_ENABLED,
+    LOAD_MODE,
+    PAGE_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    POSTGRES_CON_ID,
+    TRANSACTION_WINDOW_HOURS,
+    VALIDATION_POLICY,
+)
 from airflow_assessment.database import (
+    LoadMode,
+    append_with_watermark,
+    copy_to_database,
     delete_rows_from_interval,
+    delete_watermark,
+    ensure_transaction_partitions,
     get_engine_from_airflow_conn_id,
-    truncate_table,
+    get_latest_timestamp,
+    get_watermark,
+    iter_interval,
+    quarantine_rows,
+    replace_interval,
+    replace_interval_from_staging,
+    staging_table,
+    sync_table,
+    transaction_partition_for_interval,
+    upsert_table,
     write_to_database,
 )
+from airflow_assessment.dedup import CONTENT_HASH_COL, SeenHashes, drop_duplicate_trades
+from airflow_assessment.enrichment import (
+    ENRICHMENT_COLUMNS,
+    enrich_trades,
+    get_enrichment_index,
+    refresh_enrichment,
+)
+from airflow_assessment.lake import (
+    lake_partition_writer,
+    transaction_lake_partition,
+    write_to_lake,
+)
+from airflow_assessment.metrics import get_metrics, instrumented
 from airflow_assessment.models.alchemy import CompanyModel, RateModel, TransactionModel
 from airflow_assessment.models.pydantic import (
     CompanyRaw,
@@ -20,17 +63,54 @@ from airflow_assessment.models.pydantic import (
     SwiftTransaction,
     Transaction,
 )
+from airflow_assessment.pipeline import run_pipeline
 from airflow_assessment.transformations import transform_companies, transform_trades
-from airflow_assessment.utils import last_day_of_month
+from airflow_assessment.utils import (
+    first_day_of_month,
+    first_day_of_next_month,
+    last_day_of_month,
+)
+from airflow_assessment.validation import (
+    DecodedBatch,
+    ValidationPolicy,
+    validate_batch,
+    validate_json_batch,
+)
 from pydantic import BaseModel
+from sqlalchemy.engine import Engine
 
 LOGGER = logging.getLogger(__name__)
 TIMESTAMP_COL = "timestamp"
+TRANSACTION_COLUMNS = [
+    "trade_id",
+    "payer",
+    "receiver",
+    "amount",
+    "currency",
+    TIMESTAMP_COL,
+    "source",
+    *ENRICHMENT_COLUMNS,
+    CONTENT_HASH_COL,
+]
+
+
+def get_bytes_from_url(url: str, params: Any | None = None) -> bytes:
+    """
+    Retrieves the raw response body of the specified URL with the pooled CDM API client of this process.
+
+    Args:
+        url (str): The URL to retrieve.
+        params (Any | None, optional): Additional parameters for the request. Defaults to None.
+
+    Returns:
+        bytes: The response body.
+    """
+    return get_cdm_client().get_bytes(url=url, params=params)
 
 
 def get_json_from_url(url: str, params: Any | None = None) -> list[dict]:
     """
-    Retrieves JSON data from the specified URL.
+    Retrieves JSON data from the specified URL with the pooled CDM API client of this process.
 
     Args:
         url (str): The URL to retrieve JSON data from.
@@ -39,132 +119,780 @@ def get_json_from_url(url: str, params: Any | None = None) -> list[dict]:
     Returns:
         list[dict]: The JSON data as a list of dictionaries.
     """
-    try:
-        res = requests.get(url, params=params)
-        if res.status_code == 200:
-            return res.json()
-        else:
-            raise Exception(f"Failed to get json from url: {res.status_code=}, {res.text=}")
-    except Exception as e:
-        raise Exception(f"Failed to get json from url: {e=}")
+    return get_cdm_client().get_json(url=url, params=params)
 
 
-def get_companies_from_api(url: str = CDM_API_URL) -> pd.DataFrame:
+def get_companies_from_api(
+    url: str = CDM_API_URL, engine: Engine | None = None, validation_policy: ValidationPolicy = VALIDATION_POLICY
+) -> pd.DataFrame:
     """
     Retrieves companies data from the API.
 
     Args:
         url (str, optional): The URL of the API. Defaults to CDM_API_URL.
+        engine (Engine | None, optional): The database engine to quarantine invalid rows with. Defaults to None.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
 
     Returns:
         pd.DataFrame: The companies data as a pandas DataFrame.
     """
-    results = get_json_from_url(url=f"{url}/companies")
-    validate_data(data=results, model=CompanyRaw)
+    body = get_bytes_from_url(url=f"{url}/companies")
+    results = validate_json_data(body, model=CompanyRaw, policy=validation_policy, engine=engine).valid
     LOGGER.debug("Successfully validated all companies data")
     companies = pd.DataFrame(results)
-    companies = transform_companies(companies)
+    with get_metrics().timer("transform") as timing:
+        companies = transform_companies(companies)
+        timing.rows = len(companies)
     return companies
 
 
-def validate_data(data: list[dict], model: Type[BaseModel]):
+def validate_data(
+    data: list[dict],
+    model: Type[BaseModel],
+    policy: ValidationPolicy = VALIDATION_POLICY,
+    engine: Engine | None = None,
+) -> list[dict]:
     """
-    Validates the given data against the specified Pydantic model.
+    Validates the given data against the specified Pydantic model and drops the invalid rows.
 
     Args:
         data (list[dict]): The data to validate.
         model (Type[BaseModel]): The Pydantic model to validate against.
+        policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        engine (Engine | None, optional): When given, the invalid rows are written to the quarantine table.
+            Defaults to None.
+
+    Returns:
+        list[dict]: The valid data.
     """
-    for item in data:
-        try:
-            model.model_validate(item)
-        except Exception as e:
-            LOGGER.warning(f"Failed to validate data: {e=} --- {item=}")
+    with get_metrics().timer("validate") as timing:
+        result = validate_batch(data=data, model=model, policy=policy)
+        timing.rows = len(data)
+    handle_rejected(result.rejected, n_rows=len(data), model=model, engine=engine)
+    return result.valid
 
 
-def retrieve_rates_from_api(url: str = CDM_API_URL):
+def validate_json_data(
+    body: bytes,
+    model: Type[BaseModel],
+    policy: ValidationPolicy = VALIDATION_POLICY,
+    engine: Engine | None = None,
+) -> DecodedBatch:
+    """
+    Decodes a raw JSON response and validates it against the specified Pydantic model in one pass, dropping the
+    invalid rows. The time spent decoding is part of the `validate` stage.
+
+    Args:
+        body (bytes): The raw response body, a JSON array of rows.
+        model (Type[BaseModel]): The Pydantic model to validate against.
+        policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        engine (Engine | None, optional): When given, the invalid rows are written to the quarantine table.
+            Defaults to None.
+
+    Returns:
+        DecodedBatch: The valid rows, and the size and last row of the response.
+    """
+    with get_metrics().timer("validate") as timing:
+        batch = validate_json_batch(body, model=model, policy=policy)
+        timing.rows = batch.n_rows
+    handle_rejected(batch.rejected, n_rows=batch.n_rows, model=model, engine=engine)
+    return batch
+
+
+def handle_rejected(rejected: list[dict], n_rows: int, model: Type[BaseModel], engine: Engine | None = None):
+    """
+    Counts and logs the rows rejected by validation and, when an engine is given, quarantines them.
+
+    Args:
+        rejected (list[dict]): The rejected rows, see `ValidationResult`.
+        n_rows (int): The number of validated rows.
+        model (Type[BaseModel]): The Pydantic model the rows were validated against.
+        engine (Engine | None, optional): The database engine of the quarantine table. Defaults to None.
+    """
+    get_metrics().increment("rows_rejected", len(rejected))
+    if rejected:
+        LOGGER.warning(f"Rejected {len(rejected)} of {n_rows} rows for {model.__name__}, e.g. {rejected[0]}")
+        if engine is not None:
+            quarantine_rows(engine=engine, model_name=model.__name__, rejected=rejected)
+
+
+def prepare_trades(trades: pd.DataFrame, source: str, engine: Engine, seen: SeenHashes | None = None) -> pd.DataFrame:
+    """
+    Transforms validated trades with `transform_trades`, drops the duplicates with `drop_duplicate_trades` and
+    enriches the rest with `enrich_trades`, using the rates and companies currently in the database.
+
+    Args:
+        trades (pd.DataFrame): The validated trades.
+        source (str): The source of the trades, e.g. "sepa".
+        engine (Engine): The database engine to load the enrichment index from.
+        seen (SeenHashes | None, optional): The content hashes of the earlier pages of a streamed interval.
+            Defaults to None.
+
+    Returns:
+        pd.DataFrame: The trades, with the TRANSACTION_COLUMNS.
+    """
+    if trades.empty:
+        return pd.DataFrame(columns=TRANSACTION_COLUMNS)
+    with get_metrics().timer("transform") as timing:
+        trades = transform_trades(trades, source=source)
+        timing.rows = len(trades)
+    trades = drop_duplicate_trades(trades, seen=seen)
+    return enrich_trades(trades, index=get_enrichment_index(engine))[TRANSACTION_COLUMNS]
+
+
+def retrieve_rates_from_api(
+    url: str = CDM_API_URL, engine: Engine | None = None, validation_policy: ValidationPolicy = VALIDATION_POLICY
+):
     """
     Retrieves exchange rates data from the API.
 
     Args:
         url (str, optional): The URL of the API. Defaults to CDM_API_URL.
+        engine (Engine | None, optional): The database engine to quarantine invalid rows with. Defaults to None.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
 
     Returns:
         pd.DataFrame: The exchange rates data as a pandas DataFrame.
     """
-    results = get_json_from_url(url=f"{url}/exchange-rates")
-    validate_data(data=results, model=Rate)
+    body = get_bytes_from_url(url=f"{url}/exchange-rates")
+    results = validate_json_data(body, model=Rate, policy=validation_policy, engine=engine).valid
     return pd.DataFrame(results)
 
 
-def ingest_companies(*args, **kwargs):
+@instrumented
+def ingest_companies(
+    *args,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    detect_changes: bool = True,
+    lake: bool = LAKE_ENABLED,
+    api_url: str = CDM_API_URL,
+    **kwargs,
+):
     """
     Ingests companies data into the database.
+
+    Args:
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        detect_changes (bool, optional): Whether to only write the companies that changed since the last load,
+            instead of merging the full dataset into the table. Defaults to True.
+        lake (bool, optional): Whether to also write the companies to the Parquet lake. Defaults to LAKE_ENABLED.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
     """
     engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
 
     LOGGER.info("Retrieving companies from api")
-    companies = get_companies_from_api()
+    companies = get_companies_from_api(url=api_url, engine=engine, validation_policy=validation_policy)
     LOGGER.info(f"Retrieving {len(companies)} from api.")
     if companies.empty:
         LOGGER.info("Companies data is empty. Not writing to database.")
         return
 
-    truncate_table(engine=engine, model=CompanyModel)
-    write_to_database(engine=engine, data=companies, model=CompanyModel, if_exists="append")
+    if detect_changes:
+        changes = sync_table(engine=engine, model=CompanyModel, data=companies)
+        if changes is not None and not changes.is_empty:
+            # Only the transactions of the changed IBANs get new company IDs.
+            changed = pd.concat([changes.inserted["iban"], changes.updated["iban"], changes.deleted["iban"]])
+            refresh_enrichment(engine=engine, ibans=changed.unique().tolist())
+    else:
+        upsert_table(engine=engine, model=CompanyModel, data=companies, delete_missing=True)
+        refresh_enrichment(engine=engine, companies=True)
+    if lake:
+        write_to_lake(companies, dataset=CompanyModel.__tablename__)
 
 
-def ingest_rates(*args, **kwargs):
+@instrumented
+def ingest_rates(
+    *args,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    detect_changes: bool = True,
+    lake: bool = LAKE_ENABLED,
+    api_url: str = CDM_API_URL,
+    **kwargs,
+):
     """
     Ingests exchange rates data into the database.
+
+    Args:
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        detect_changes (bool, optional): Whether to only write the rates that changed since the last load,
+            instead of merging the full dataset into the table. Defaults to True.
+        lake (bool, optional): Whether to also write the rates to the Parquet lake. Defaults to LAKE_ENABLED.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
     """
     engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
 
-    rates = retrieve_rates_from_api(url=CDM_API_URL)
+    rates = retrieve_rates_from_api(url=api_url, engine=engine, validation_policy=validation_policy)
     LOGGER.info(f"Succesfully retrieved {len(rates)} exchange rates from API.")
     if rates.empty:
         LOGGER.info(f"Trade data is empty. Not writing to database. {engine}")
         return
 
-    truncate_table(engine=engine, model=RateModel)
-    write_to_database(engine=engine, data=rates, model=RateModel, if_exists="append")
+    months = []
+    if detect_changes:
+        changes = sync_table(engine=engine, model=RateModel, data=rates)
+        if changes is not None and not changes.is_empty:
+            # Only the transactions in the changed currencies get new EUR amounts.
+            changed = pd.concat(
+                [changes.inserted["currency"], changes.updated["currency"], changes.deleted["currency"]]
+            )
+            months = refresh_enrichment(engine=engine, currencies=changed.unique().tolist())
+    else:
+        upsert_table(engine=engine, model=RateModel, data=rates, delete_missing=True)
+        months = refresh_enrichment(engine=engine, rates=True)
+    # The aggregates in EUR are only recomputed for the months and sources whose EUR amounts changed.
+    for month, source in months:
+        refresh_aggregates(engine=engine, start_date=month, end_date=month, source=source)
+    if lake:
+        write_to_lake(rates, dataset=RateModel.__tablename__)
 
 
-def retrieve_trades_single_day(url_suffix: str, *args, **kwargs):
+@instrumented
+def retrieve_trades_single_day(
+    url_suffix: str,
+    *args,
+    shard_hours: int | None = None,
+    max_workers: int = FETCH_MAX_WORKERS,
+    stream: bool = False,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    load_mode: LoadMode = LOAD_MODE,
+    lake: bool = LAKE_ENABLED,
+    api_url: str = CDM_API_URL,
+    **kwargs,
+):
     """
     Retrieves trades data for a single day from the API.
 
     Args:
         url_suffix (str): The URL suffix for the specific type of trades.
+        shard_hours (int | None, optional): When set, the interval is fetched in shards of this many hours
+            that are paged concurrently. Defaults to None, which pages the interval with a single cursor.
+        max_workers (int, optional): The number of shards fetched concurrently. Defaults to FETCH_MAX_WORKERS.
+        stream (bool, optional): Whether to stream the pages to the database one by one instead of collecting the
+            whole interval in memory first. Ignores `shard_hours`. Defaults to False.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        load_mode (LoadMode, optional): "staging" loads the month into a staging table and swaps it in atomically,
+            "append" deletes the month up front and appends to the table directly. Defaults to LOAD_MODE.
+        lake (bool, optional): Whether to also write the month to the Parquet lake, replacing the partition of the
+            source and month. Defaults to LAKE_ENABLED.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
     """
-    execution_date = str(kwargs["ts"])
-    execution_date = datetime.strptime(execution_date, "%Y-%m-%dT%H:%M:%S%z")
+    execution_date = get_execution_date(kwargs)
     engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
 
     end_ts = last_day_of_month(execution_date)
+    validation_model = SepaTransaction if url_suffix == "sepa" else SwiftTransaction
+    ensure_transaction_partitions(engine=engine, start_date=execution_date, end_date=end_ts, sources=[url_suffix])
+
+    if stream:
+        stream_transactions_to_database(
+            engine=engine,
+            start_date=execution_date,
+            end_ts=end_ts,
+            url=f"{api_url}/transactions/{url_suffix}",
+            validation_model=validation_model,
+            source=url_suffix,
+            validation_policy=validation_policy,
+            load_mode=load_mode,
+            lake=lake,
+        )
+    else:
+        # The after-timestamp cursor is exclusive, so start just before the month to include its first microsecond.
+        trades = get_transactions_from_api_interval(
+            start_date=execution_date - timedelta(microseconds=1),
+            end_ts=end_ts,
+            url=f"{api_url}/transactions/{url_suffix}",
+            validation_model=validation_model,
+            shard_width=timedelta(hours=shard_hours) if shard_hours else None,
+            max_workers=max_workers,
+            engine=engine,
+            validation_policy=validation_policy,
+        )
+        trades = prepare_trades(trades, source=url_suffix, engine=engine)
+        write_trades(
+            engine=engine,
+            trades=trades,
+            start_date=execution_date,
+            end_ts=end_ts,
+            source=url_suffix,
+            load_mode=load_mode,
+        )
+        if lake:
+            write_to_lake(
+                trades[TRANSACTION_COLUMNS],
+                dataset=TransactionModel.__tablename__,
+                partition=transaction_lake_partition(source=url_suffix, month=execution_date),
+                timestamp_col=TIMESTAMP_COL,
+            )
+
+    refresh_aggregates(engine=engine, start_date=execution_date, end_date=end_ts, source=url_suffix)
+
+
+def write_trades(
+    engine: Engine, trades: pd.DataFrame, start_date: datetime, end_ts: datetime, source: str, load_mode: LoadMode
+):
+    """
+    Replaces the transactions of a source in an interval with the given trades.
+
+    Args:
+        engine (Engine): The database engine.
+        trades (pd.DataFrame): The transformed trades of the interval.
+        start_date (datetime): The start date of the interval.
+        end_ts (datetime): The end date of the interval.
+        source (str): The source of the trades, e.g. "sepa".
+        load_mode (LoadMode): How to load the interval, see `retrieve_trades_single_day`.
+    """
+    LOGGER.info(f"Writing {len(trades)} trades to database {engine}")
+    if load_mode == "staging":
+        replace_interval(
+            engine=engine,
+            model=TransactionModel,
+            data=trades[TRANSACTION_COLUMNS],
+            start_date=start_date,
+            end_date=end_ts,
+            timestamp_col=TIMESTAMP_COL,
+            source=source,
+            partition=transaction_partition_for_interval(start_date, end_ts, source=source),
+            skip_duplicates=True,
+        )
+        return
 
     delete_rows_from_interval(
-        engine=engine, model=TransactionModel, start_date=execution_date, end_date=end_ts, timestamp_col=TIMESTAMP_COL
+        engine=engine,
+        model=TransactionModel,
+        start_date=start_date,
+        end_date=end_ts,
+        timestamp_col=TIMESTAMP_COL,
+        source=source,
+    )
+    if trades.empty:
+        LOGGER.info(f"Trade data is empty. Not writing to database. {engine}")
+        return
+    write_to_database(
+        engine=engine, data=trades[TRANSACTION_COLUMNS], model=TransactionModel, if_exists="append", method="copy"
     )
 
-    validation_model = SepaTransaction if url_suffix == "sepa" else SwiftTransaction
 
+def get_execution_date(context: dict) -> datetime:
+    """
+    Returns the timezone aware start of the data interval of a task run from its Airflow context.
+    """
+    return datetime.strptime(str(context["ts"]), "%Y-%m-%dT%H:%M:%S%z")
+
+
+def plan_transaction_windows(
+    url_suffix: str, *args, window_hours: int = TRANSACTION_WINDOW_HOURS, **kwargs
+) -> list[dict[str, str]]:
+    """
+    Splits the month of the run into windows that are ingested by separate, mapped tasks.
+
+    The windows are inclusive on both ends and one microsecond apart, the resolution of the API timestamps, so
+    they cover the month without overlap and every window can replace exactly its own rows.
+
+    A window narrower than the month replaces its rows with a DELETE. Only a window that spans the whole month,
+    i.e. with a `window_hours` of at least the length of the month, truncates the source partition of the month
+    instead, like the monthly load of `retrieve_trades_single_day` and the backfill do.
+
+    Args:
+        url_suffix (str): The URL suffix for the specific type of trades.
+        window_hours (int, optional): The width of a window in hours. Defaults to TRANSACTION_WINDOW_HOURS.
+
+    Returns:
+        list[dict[str, str]]: The op_kwargs of every window, with the ISO formatted `window_start` and `window_end`.
+    """
+    execution_date = get_execution_date(kwargs)
+    month_end = first_day_of_next_month(execution_date)
+    width = timedelta(hours=window_hours)
+    windows = []
+    window_start = execution_date
+    while window_start < month_end:
+        window_end = min(window_start + width, month_end)
+        windows.append(
+            {
+                "url_suffix": url_suffix,
+                "window_start": window_start.isoformat(),
+                "window_end": (window_end - timedelta(microseconds=1)).isoformat(),
+            }
+        )
+        window_start = window_end
+    LOGGER.info(f"Planned {len(windows)} windows of {width} for {url_suffix} in {execution_date:%Y-%m}.")
+    return windows
+
+
+@instrumented
+def ingest_transaction_window(
+    url_suffix: str,
+    window_start: str,
+    window_end: str,
+    *args,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    load_mode: LoadMode = LOAD_MODE,
+    api_url: str = CDM_API_URL,
+    **kwargs,
+):
+    """
+    Ingests the transactions of a single window, replacing the rows of the window and source.
+
+    A window only touches its own rows, so it can be retried on its own and runs in parallel with the other
+    windows of the month. The aggregates and the lake are brought up to date once the month is complete, by
+    `finalize_transaction_month`.
+
+    With the "append" load mode every page is committed together with a checkpoint of the window, so a retry
+    resumes from the last committed page instead of fetching the window again. The checkpoint is removed once the
+    window is complete, so a later run of the same window replaces it.
+
+    Args:
+        url_suffix (str): The URL suffix for the specific type of trades.
+        window_start (str): The ISO formatted, inclusive start of the window.
+        window_end (str): The ISO formatted, inclusive end of the window.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        load_mode (LoadMode, optional): How to load the window, see `retrieve_trades_single_day`.
+            Defaults to LOAD_MODE.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
+    """
+    start_date, end_ts = datetime.fromisoformat(window_start), datetime.fromisoformat(window_end)
+    engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
+    ensure_transaction_partitions(engine=engine, start_date=start_date, end_date=end_ts, sources=[url_suffix])
+
+    if load_mode == "append":
+        key = f"{url_suffix}@{window_start}"
+        cursor = get_watermark(engine, key=key)
+        if cursor is None:
+            delete_rows_from_interval(
+                engine, TransactionModel, start_date, end_ts, timestamp_col=TIMESTAMP_COL, source=url_suffix
+            )
+            cursor = (start_date - timedelta(microseconds=1)).strftime(API_TS_FORMAT)
+        else:
+            LOGGER.info(f"Resuming window {key} after {cursor}.")
+        load_pages_with_watermark(
+            engine=engine,
+            key=key,
+            source=url_suffix,
+            cursor=cursor,
+            end_ts=end_ts,
+            validation_policy=validation_policy,
+            api_url=api_url,
+        )
+        delete_watermark(engine, key=key)
+        return
+
+    # The after-timestamp cursor is exclusive, so start just before the window to include its first microsecond.
     trades = get_transactions_from_api_interval(
-        start_date=execution_date,
+        start_date=start_date - timedelta(microseconds=1),
         end_ts=end_ts,
-        url=f"{CDM_API_URL}/transactions/{url_suffix}",
-        validation_model=validation_model,
+        url=f"{api_url}/transactions/{url_suffix}",
+        validation_model=SepaTransaction if url_suffix == "sepa" else SwiftTransaction,
+        engine=engine,
+        validation_policy=validation_policy,
     )
-    if trades.empty:
-        LOGGER.info(f"Trade data is empty. Not writing to database. {engine}")
+    trades = prepare_trades(trades, source=url_suffix, engine=engine)
+    write_trades(
+        engine=engine, trades=trades, start_date=start_date, end_ts=end_ts, source=url_suffix, load_mode=load_mode
+    )
+
+
+@instrumented
+def finalize_transaction_month(url_suffix: str, *args, lake: bool = LAKE_ENABLED, **kwargs):
+    """
+    Refreshes the aggregates of the month of the run and, optionally, exports the month to the Parquet lake, once
+    all windows of the month are ingested.
+
+    Args:
+        url_suffix (str): The URL suffix for the specific type of trades.
+        lake (bool, optional): Whether to replace the lake partition of the source and month with the rows in the
+            database. Defaults to LAKE_ENABLED.
+    """
+    execution_date = get_execution_date(kwargs)
+    end_ts = last_day_of_month(execution_date)
+    engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
+    refresh_aggregates(engine=engine, start_date=execution_date, end_date=end_ts, source=url_suffix)
+    if not lake:
         return
-    trades = transform_trades(trades)
-    LOGGER.info(f"Writing trade data to database {engine}")
-    write_to_database(engine=engine, data=trades, model=TransactionModel, if_exists="append")
+
+    with lake_partition_writer(
+        TransactionModel.__tablename__,
+        partition=transaction_lake_partition(source=url_suffix, month=execution_date),
+        timestamp_col=TIMESTAMP_COL,
+    ) as writer:
+        for chunk in iter_interval(
+            engine=engine,
+            model=TransactionModel,
+            start_date=execution_date,
+            end_date=end_ts,
+            timestamp_col=TIMESTAMP_COL,
+            columns=TRANSACTION_COLUMNS,
+            source=url_suffix,
+        ):
+            # Timestamps are stored as naive UTC, the lake keeps them timezone aware like the ingest path does.
+            chunk[TIMESTAMP_COL] = chunk[TIMESTAMP_COL].dt.tz_localize("UTC")
+            writer.write(chunk)
+
+
+def parse_api_timestamp(timestamp: str) -> datetime:
+    """
+    Parses a timestamp as returned by the CDM API into a timezone aware UTC datetime.
+
+    Args:
+        timestamp (str): The timestamp, formatted as API_TS_FORMAT.
+
+    Returns:
+        datetime: The parsed timestamp.
+    """
+    return pytz.utc.localize(datetime.strptime(timestamp, API_TS_FORMAT))
+
+
+def format_api_timestamp(timestamp: datetime) -> str:
+    """
+    Formats a timezone aware datetime as an API timestamp, e.g. for the `after-timestamp` cursor.
+
+    Args:
+        timestamp (datetime): The timestamp.
+
+    Returns:
+        str: The timestamp in UTC, formatted as API_TS_FORMAT.
+    """
+    return timestamp.astimezone(pytz.utc).strftime(API_TS_FORMAT)
+
+
+def row_timestamp(row: dict) -> datetime:
+    """
+    Returns the timestamp of a transaction row, which is parsed when the row was fully validated and still the raw
+    API string otherwise.
+
+    Args:
+        row (dict): The row.
+
+    Returns:
+        datetime: The timezone aware timestamp.
+    """
+    timestamp = row[TIMESTAMP_COL]
+    return timestamp if isinstance(timestamp, datetime) else parse_api_timestamp(timestamp)
+
+
+def split_interval(start_date: datetime, end_ts: datetime, shard_width: timedelta) -> list[tuple[datetime, datetime]]:
+    """
+    Splits the interval `(start_date, end_ts]` into consecutive shards of at most `shard_width`.
+
+    Each shard is half-open on the left, like the `after-timestamp` cursor of the API, so the upper bound of a
+    shard is the exclusive lower bound of the next one and the shards neither overlap nor leave gaps.
+
+    Args:
+        start_date (datetime): The exclusive start of the interval.
+        end_ts (datetime): The inclusive end of the interval.
+        shard_width (timedelta): The maximum width of a shard.
+
+    Returns:
+        list[tuple[datetime, datetime]]: The `(start, end)` bounds of every shard, in chronological order.
+    """
+    if shard_width <= timedelta(0):
+        raise ValueError(f"Shard width must be positive: {shard_width=}")
+    shards = []
+    shard_start = start_date
+    while shard_start < end_ts:
+        shard_end = min(shard_start + shard_width, end_ts)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end
+    return shards
+
+
+def iter_validated_transaction_pages(
+    cursor: str,
+    end_ts: datetime,
+    url: str,
+    validation_model: Type[Transaction],
+    page_size: int | None = None,
+    engine: Engine | None = None,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+) -> Iterator[tuple[str, list[dict]]]:
+    """
+    Pages through the transactions after an `after-timestamp` cursor, up to and including `end_ts`, and decodes
+    and validates every page in one pass with `validate_json_data`.
+
+    The cursor follows the raw rows, so rows rejected by validation do not affect paging. Paging stops as soon as
+    the cursor passes `end_ts` and rows after `end_ts` are dropped from the last page, so the pages never contain
+    rows outside of the interval.
+
+    Args:
+        cursor (str): The exclusive `after-timestamp` to start after, in the API format.
+        end_ts (datetime): The inclusive end of the interval.
+        url (str): The URL of the API.
+        validation_model (Type[Transaction]): The Pydantic model to validate against.
+        page_size (int | None, optional): The number of rows requested per page. Defaults to None, which asks the
+            AimdController of the endpoint before every page, or uses PAGE_SIZE when the client is not adaptive.
+        engine (Engine | None, optional): The database engine to quarantine invalid rows with. Defaults to None.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+
+    Yields:
+        tuple[str, list[dict]]: The cursor after the page, i.e. the timestamp of its last row, and the valid rows.
+    """
+    metrics = get_metrics()
+    client = get_cdm_client()
+    controller = client.controller(url) if page_size is None and client.adaptive else None
+    cur_ts = parse_api_timestamp(cursor)
+    while cur_ts < end_ts:
+        LOGGER.debug(f"{cursor}")
+        limit = controller.page_size if controller is not None else page_size or PAGE_SIZE
+        body = get_bytes_from_url(url=url, params=f"limit={limit}&after-timestamp={cursor}")
+        page = validate_json_data(body, model=validation_model, policy=validation_policy, engine=engine)
+        if not page.n_rows:
+            break
+        metrics.increment("pages_fetched")
+        metrics.increment("rows_fetched", page.n_rows)
+        cur_ts = row_timestamp(page.last_row)
+        results = page.valid
+        if cur_ts <= end_ts:
+            cursor = format_api_timestamp(cur_ts)
+        else:
+            results = [row for row in results if row_timestamp(row) <= end_ts]
+            if results:
+                cursor = format_api_timestamp(row_timestamp(results[-1]))
+        yield cursor, results
+
+
+def iter_transaction_pages(
+    start_date: datetime,
+    end_ts: datetime,
+    url: str,
+    validation_model: Type[Transaction],
+    page_size: int | None = None,
+    engine: Engine | None = None,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+) -> Iterator[list[dict]]:
+    """
+    Pages through the transactions in `(start_date, end_ts]` with the `after-timestamp` cursor of the API.
+
+    The cursor follows the raw rows, so rows rejected by validation do not affect paging.
+
+    Args:
+        start_date (datetime): The exclusive start of the interval.
+        end_ts (datetime): The inclusive end of the interval.
+        url (str): The URL of the API.
+        validation_model (Type[Transaction]): The Pydantic model to validate against.
+        page_size (int | None, optional): The number of rows requested per page, see
+            `iter_validated_transaction_pages`. Defaults to None.
+        engine (Engine | None, optional): The database engine to quarantine invalid rows with. Defaults to None.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+
+    Yields:
+        list[dict]: The valid rows of every page.
+    """
+    pages = iter_validated_transaction_pages(
+        start_date.strftime(API_TS_FORMAT),
+        end_ts,
+        url,
+        validation_model,
+        page_size=page_size,
+        engine=engine,
+        validation_policy=validation_policy,
+    )
+    for _, results in pages:
+        yield results
+
+
+def load_pages_with_watermark(
+    engine: Engine,
+    key: str,
+    source: str,
+    cursor: str,
+    end_ts: datetime,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    api_url: str = CDM_API_URL,
+) -> tuple[int, datetime | None, datetime | None]:
+    """
+    Appends the transactions after `cursor` page by page, committing every page together with the cursor after it.
+
+    When the load is interrupted, nothing of the current page is committed and the watermark of `key` points at
+    the last committed page, so the next attempt resumes from there instead of from the start. Transactions that
+    repeat an earlier page or a stored transaction are skipped.
+
+    Args:
+        engine (Engine): The database engine.
+        key (str): The watermark key of the ingest, see `WatermarkModel`.
+        source (str): The source of the transactions, e.g. "sepa".
+        cursor (str): The exclusive `after-timestamp` to start after.
+        end_ts (datetime): The inclusive end of the interval.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
+
+    Returns:
+        tuple[int, datetime | None, datetime | None]: The number of rows written, and the first and last timestamp
+            written, or None when nothing was written.
+    """
+    url = f"{api_url}/transactions/{source}"
+    validation_model = SepaTransaction if source == "sepa" else SwiftTransaction
+    rows_written, first_ts, last_ts = 0, None, None
+    partitioned_months = set()
+    seen = SeenHashes()
+    pages = iter_validated_transaction_pages(
+        cursor, end_ts, url, validation_model, engine=engine, validation_policy=validation_policy
+    )
+    for cursor, valid in pages:
+        trades = prepare_trades(rows_to_frame(valid), source=source, engine=engine, seen=seen)
+        if not trades.empty:
+            page_start, page_end = trades[TIMESTAMP_COL].min(), trades[TIMESTAMP_COL].max()
+            months = (page_start.year, page_start.month, page_end.year, page_end.month)
+            if months not in partitioned_months:
+                ensure_transaction_partitions(engine=engine, start_date=page_start, end_date=page_end, sources=[source])
+                partitioned_months.add(months)
+            first_ts = page_start if first_ts is None else first_ts
+            last_ts = page_end
+        rows_written += append_with_watermark(
+            engine=engine, model=TransactionModel, data=trades, key=key, cursor=cursor, skip_duplicates=True
+        )
+    LOGGER.info(f"Appended {rows_written} rows for {key}, the watermark is at {get_watermark(engine, key)}.")
+    return rows_written, first_ts, last_ts
+
+
+@instrumented
+def ingest_transactions_incremental(
+    url_suffix: str,
+    *args,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    api_url: str = CDM_API_URL,
+    **kwargs,
+):
+    """
+    Ingests the transactions of a source that are new since the last committed page.
+
+    The first run starts after the latest stored transaction of the source, or at the start of the month of the run
+    for an empty table. The aggregates of the touched months are refreshed afterwards.
+
+    Args:
+        url_suffix (str): The URL suffix for the specific type of trades.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        api_url (str, optional): The URL of the API. Defaults to CDM_API_URL.
+    """
+    engine = get_engine_from_airflow_conn_id(conn_id=POSTGRES_CON_ID)
+    cursor = get_watermark(engine, key=url_suffix)
+    if cursor is None:
+        latest = get_latest_timestamp(engine, model=TransactionModel, timestamp_col=TIMESTAMP_COL, source=url_suffix)
+        start = (
+            latest if latest is not None else first_day_of_month(get_execution_date(kwargs)) - timedelta(microseconds=1)
+        )
+        cursor = start.strftime(API_TS_FORMAT)
+        LOGGER.info(f"No watermark for {url_suffix}, starting after {cursor}.")
+
+    rows, first_ts, last_ts = load_pages_with_watermark(
+        engine=engine,
+        key=url_suffix,
+        source=url_suffix,
+        cursor=cursor,
+        end_ts=datetime.now(pytz.utc),
+        validation_policy=validation_policy,
+        api_url=api_url,
+    )
+    if rows:
+        refresh_aggregates(engine=engine, start_date=first_ts, end_date=last_ts, source=url_suffix)
 
 
 def get_transactions_from_api_interval(
-    start_date: datetime, end_ts: datetime, url: str, validation_model: Type[Transaction]
+    start_date: datetime,
+    end_ts: datetime,
+    url: str,
+    validation_model: Type[Transaction],
+    shard_width: timedelta | None = None,
+    max_workers: int = FETCH_MAX_WORKERS,
+    engine: Engine | None = None,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
 ) -> pd.DataFrame:
     """
     Retrieves trades data for a specific interval from the API.
@@ -174,32 +902,149 @@ def get_transactions_from_api_interval(
         end_ts (datetime): The end date of the interval.
         url (str): The URL of the API.
         validation_model (Type[Transaction]): The Pydantic model to validate against.
+        shard_width (timedelta | None, optional): When set, the interval is split into shards of this width which
+            are paged concurrently and stitched back together in chronological order. Defaults to None.
+        max_workers (int, optional): The number of shards fetched concurrently. When the client is adaptive, this is
+            raised to the concurrency ceiling of the endpoint and its AimdController decides how many requests are in
+            flight. Defaults to FETCH_MAX_WORKERS.
+        engine (Engine | None, optional): The database engine to quarantine invalid rows with. Defaults to None.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
 
     Returns:
         pd.DataFrame: The trades data as a pandas DataFrame.
     """
-    LOGGER.info(f"Retrieving SEPA transactions from API for {start_date}")
-    data = []
-    cur_ts = start_date
-    ts_format = "%Y-%m-%dT%H:%M:%S.%fZ"
-    payload = {
-        "limit": 5000,
-        "after-timestamp": start_date.strftime(ts_format),
-    }
-    while cur_ts < end_ts:
-        LOGGER.debug(f'{payload["after-timestamp"]}')
-        payload_str = "&".join(f"{k}={v}" for k, v in payload.items())
-        results = get_json_from_url(url=url, params=payload_str)
-        validate_data(data=results, model=validation_model)
-        if not results:
-            break
-        data.extend(results)
-        payload["after-timestamp"] = results[-1][TIMESTAMP_COL]
-        cur_ts = pytz.utc.localize(datetime.strptime(results[-1][TIMESTAMP_COL], ts_format))
-    df = pd.DataFrame(data)
-    if df.empty:
-        return df
-    df[TIMESTAMP_COL] = pd.to_datetime(df[TIMESTAMP_COL])
-    # Filter out transactions that are not from the interval
-    df = df.loc[df[TIMESTAMP_COL] <= end_ts, :]
-    return df
+    LOGGER.info(f"Retrieving transactions from API for {start_date}")
+    client = get_cdm_client()
+    stats = client.stats.snapshot()
+
+    def fetch(shard_start: datetime, shard_end: datetime) -> list[list[dict]]:
+        pages = iter_transaction_pages(
+            shard_start, shard_end, url, validation_model, engine=engine, validation_policy=validation_policy
+        )
+        return list(pages)
+
+    # Pages are appended column by column, the paging already drops the rows after `end_ts`.
+    buffer = ColumnBuffer()
+    with get_metrics().timer("fetch") as timing:
+        if shard_width is None:
+            for page in fetch(start_date, end_ts):
+                buffer.extend(page)
+        else:
+            shards = split_interval(start_date=start_date, end_ts=end_ts, shard_width=shard_width)
+            if client.adaptive:
+                max_workers = max(max_workers, client.controller(url).limits.max_concurrency)
+            LOGGER.info(f"Fetching {len(shards)} shards of {shard_width} with {max_workers} workers.")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for page in chain.from_iterable(executor.map(lambda shard: fetch(*shard), shards)):
+                    buffer.extend(page)
+        timing.rows = len(buffer)
+    LOGGER.info(f"CDM API client stats of the interval: {client.stats.summary(since=stats)}")
+    if client.adaptive:
+        LOGGER.info(f"Adaptive paging of {url}: {client.controller(url).summary()}")
+    return buffer.to_frame()
+
+
+def stream_transactions_to_database(
+    engine: Engine,
+    start_date: datetime,
+    end_ts: datetime,
+    url: str,
+    validation_model: Type[Transaction],
+    source: str,
+    max_queue_size: int = PIPELINE_QUEUE_SIZE,
+    validation_policy: ValidationPolicy = VALIDATION_POLICY,
+    load_mode: LoadMode = LOAD_MODE,
+    lake: bool = LAKE_ENABLED,
+) -> int:
+    """
+    Streams the transactions of the interval `[start_date, end_ts]` page by page from the API into the database.
+
+    Pages are fetched and validated in a background thread and handed to the writer over a bounded queue, so the
+    next page is downloaded while the current one is transformed and written. At most `max_queue_size` pages
+    are held in memory, however large the interval is. With the "staging" load mode the pages are streamed into a
+    staging table, which replaces the interval in a single transaction once the last page is written. The content
+    hashes of the interval are kept in memory, so a transaction that repeats an earlier page is dropped.
+
+    Args:
+        engine (Engine): The database engine.
+        start_date (datetime): The inclusive start of the interval.
+        end_ts (datetime): The inclusive end of the interval.
+        url (str): The URL of the API.
+        validation_model (Type[Transaction]): The Pydantic model to validate against.
+        source (str): The source of the transactions, e.g. "sepa". Only rows of this source are replaced.
+        max_queue_size (int, optional): The maximum number of pages buffered. Defaults to PIPELINE_QUEUE_SIZE.
+        validation_policy (ValidationPolicy, optional): The validation policy. Defaults to VALIDATION_POLICY.
+        load_mode (LoadMode, optional): How to load the interval, see `retrieve_trades_single_day`.
+            Defaults to LOAD_MODE.
+        lake (bool, optional): Whether to also stream the pages into the Parquet lake partition of the source and
+            month, which is swapped in after the database load completed. Defaults to LAKE_ENABLED.
+
+    Returns:
+        int: The number of rows written.
+    """
+    LOGGER.info(f"Streaming transactions from API for {start_date} with a queue of {max_queue_size} pages.")
+    rows_written = 0
+    seen = SeenHashes()
+
+    def stream_pages(table_name: str | None = None):
+        def write_page(page: list[dict]):
+            nonlocal rows_written
+            if not page:
+                return
+            trades = prepare_trades(rows_to_frame(page), source=source, engine=engine, seen=seen)
+            copy_to_database(engine=engine, model=TransactionModel, data=trades, table_name=table_name)
+            if lake_writer is not None:
+                lake_writer.write(trades)
+            rows_written += len(trades)
+
+        # The after-timestamp cursor is exclusive, so start just before the interval to include its first microsecond.
+        pages = run_pipeline(
+            producer=iter_transaction_pages(
+                start_date - timedelta(microseconds=1),
+                end_ts,
+                url,
+                validation_model,
+                engine=engine,
+                validation_policy=validation_policy,
+            ),
+            consumer=write_page,
+            max_queue_size=max_queue_size,
+        )
+        LOGGER.info(f"Streamed {rows_written} rows in {pages} pages to the database.")
+
+    lake_context = (
+        lake_partition_writer(
+            TransactionModel.__tablename__,
+            partition=transaction_lake_partition(source=source, month=start_date),
+            timestamp_col=TIMESTAMP_COL,
+        )
+        if lake
+        else nullcontext()
+    )
+    with lake_context as lake_writer:
+        if load_mode == "staging":
+            with staging_table(engine=engine, model=TransactionModel, columns=TRANSACTION_COLUMNS) as staging:
+                stream_pages(table_name=staging)
+                replace_interval_from_staging(
+                    engine=engine,
+                    model=TransactionModel,
+                    staging=staging,
+                    columns=TRANSACTION_COLUMNS,
+                    start_date=start_date,
+                    end_date=end_ts,
+                    timestamp_col=TIMESTAMP_COL,
+                    source=source,
+                    partition=transaction_partition_for_interval(start_date, end_ts, source=source),
+                    skip_duplicates=True,
+                )
+        else:
+            delete_rows_from_interval(
+                engine=engine,
+                model=TransactionModel,
+                start_date=start_date,
+                end_date=end_ts,
+                timestamp_col=TIMESTAMP_COL,
+                source=source,
+            )
+            stream_pages()
+    return rows_written
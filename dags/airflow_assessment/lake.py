@@ -0,0 +1,361 @@
+import fcntl
+import json
+import logging
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from airflow_assessment.constant import LAKE_COMPRESSION, LAKE_ROOT, LAKE_ROWS_PER_FILE
+from airflow_assessment.metrics import get_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILE = "_manifest.json"
+
+
+def transaction_lake_partition(source: str, month: datetime) -> dict[str, str]:
+    """
+    Returns the lake partition of the transactions of a source in a month.
+
+    Args:
+        source (str): The source of the transactions, e.g. "sepa".
+        month (datetime): Any moment in the month.
+
+    Returns:
+        dict[str, str]: The partition keys and values, in directory order.
+    """
+    return {"source": source, "year": f"{month.year:04d}", "month": f"{month.month:02d}"}
+
+
+def dataset_path(dataset: str, root: str = LAKE_ROOT) -> Path:
+    """
+    Returns the directory of a dataset, which holds its partitions and its manifest.
+
+    Args:
+        dataset (str): The name of the dataset.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+
+    Returns:
+        Path: The directory of the dataset.
+    """
+    return Path(root) / dataset
+
+
+def partition_path(dataset: str, partition: dict[str, str] | None = None, root: str = LAKE_ROOT) -> Path:
+    """
+    Returns the directory of a partition of a dataset, laid out hive style, e.g.
+    `transaction/source=sepa/year=2022/month=01`.
+
+    Args:
+        dataset (str): The name of the dataset.
+        partition (dict[str, str] | None, optional): The partition keys and values. Defaults to None, for datasets
+            that are not partitioned, which are stored in a single `data` directory.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+
+    Returns:
+        Path: The directory of the partition.
+    """
+    path = dataset_path(dataset, root=root)
+    if not partition:
+        return path / "data"
+    for key, value in partition.items():
+        path /= f"{key}={value}"
+    return path
+
+
+class LakePartitionWriter:
+    """
+    Writes a partition of a dataset as compressed Parquet files and swaps it in once it is complete.
+
+    Frames are written to a hidden directory next to the partition as they come in, so a partition can be streamed
+    without holding it in memory. On `commit` the previous version of the partition is replaced by the new one and
+    the manifest is updated. Until then readers only see the previous version.
+
+    Args:
+        dataset (str): The name of the dataset.
+        partition (dict[str, str] | None, optional): The partition keys and values. Defaults to None.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+        timestamp_col (str | None, optional): The column whose min and max are recorded per file in the manifest.
+            Defaults to None.
+        compression (str, optional): The Parquet compression codec. Defaults to LAKE_COMPRESSION.
+        max_rows_per_file (int, optional): The number of rows after which a new file is started.
+            Defaults to LAKE_ROWS_PER_FILE.
+    """
+
+    def __init__(
+        self,
+        dataset: str,
+        partition: dict[str, str] | None = None,
+        root: str = LAKE_ROOT,
+        timestamp_col: str | None = None,
+        compression: str = LAKE_COMPRESSION,
+        max_rows_per_file: int = LAKE_ROWS_PER_FILE,
+    ):
+        self.dataset = dataset
+        self.root = root
+        self.path = partition_path(dataset, partition=partition, root=root)
+        self.partition_columns = list(partition or {})
+        self.timestamp_col = timestamp_col
+        self.compression = compression
+        self.max_rows_per_file = max_rows_per_file
+        self.tmp_path = self.path.with_name(f".{self.path.name}.tmp-{uuid.uuid4().hex[:12]}")
+        self.files: list[dict] = []
+        self.schema: pa.Schema | None = None
+        self._writer: pq.ParquetWriter | None = None
+
+    def write(self, data: pd.DataFrame):
+        """
+        Appends a frame to the partition, as one or more row groups.
+
+        Args:
+            data (pd.DataFrame): The rows to append. The first frame written determines the schema. Partition
+                columns are left out, as their values are encoded in the path.
+        """
+        if data.empty:
+            return
+        with get_metrics().timer("lake_write") as timing:
+            self._write(data)
+            timing.rows = len(data)
+
+    def _write(self, data: pd.DataFrame):
+        data = data.drop(columns=[column for column in self.partition_columns if column in data.columns])
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        if self.schema is None:
+            # Categorical columns are stored as plain strings, Parquet dictionary encodes them anyway and readers see
+            # the same schema in every file.
+            self.schema = pa.schema(
+                field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                for field in table.schema
+            )
+        table = table.cast(self.schema)
+
+        offset = 0
+        while offset < table.num_rows:
+            if self._writer is None or self.files[-1]["rows"] >= self.max_rows_per_file:
+                self._open_file()
+            n_rows = min(table.num_rows - offset, self.max_rows_per_file - self.files[-1]["rows"])
+            chunk = table.slice(offset, n_rows)
+            self._writer.write_table(chunk)
+            self._record(chunk)
+            offset += n_rows
+
+    def commit(self) -> dict:
+        """
+        Replaces the previous version of the partition with the written files and records them in the manifest.
+
+        Returns:
+            dict: The manifest entry of the partition.
+        """
+        self._close_file()
+        self.tmp_path.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "path": self.path.relative_to(dataset_path(self.dataset, root=self.root)).as_posix(),
+            "rows": sum(file["rows"] for file in self.files),
+            "files": self.files,
+            "written_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with manifest_lock(self.dataset, root=self.root):
+            swap_directory(self.tmp_path, self.path)
+            manifest = read_manifest(self.dataset, root=self.root)
+            manifest["partitions"][entry["path"]] = entry
+            write_manifest(manifest, self.dataset, root=self.root)
+        LOGGER.info(f"Wrote {entry['rows']} rows in {len(self.files)} files to {self.path}.")
+        return entry
+
+    def abort(self):
+        """
+        Discards the written files, leaving the previous version of the partition in place.
+        """
+        self._close_file()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+    def _open_file(self):
+        self._close_file()
+        self.tmp_path.mkdir(parents=True, exist_ok=True)
+        name = f"part-{len(self.files):05d}.parquet"
+        self._writer = pq.ParquetWriter(self.tmp_path / name, self.schema, compression=self.compression)
+        self.files.append({"path": name, "rows": 0, "min_timestamp": None, "max_timestamp": None})
+
+    def _close_file(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _record(self, chunk: pa.Table):
+        file = self.files[-1]
+        file["rows"] += chunk.num_rows
+        if self.timestamp_col is None:
+            return
+        bounds = pc.min_max(chunk[self.timestamp_col]).as_py()
+        if bounds["min"] is None:
+            return
+        low, high = bounds["min"].isoformat(), bounds["max"].isoformat()
+        file["min_timestamp"] = low if file["min_timestamp"] is None else min(file["min_timestamp"], low)
+        file["max_timestamp"] = high if file["max_timestamp"] is None else max(file["max_timestamp"], high)
+
+
+@contextmanager
+def lake_partition_writer(
+    dataset: str, partition: dict[str, str] | None = None, root: str = LAKE_ROOT, timestamp_col: str | None = None
+) -> Iterator[LakePartitionWriter]:
+    """
+    Opens a LakePartitionWriter that is committed when the block completes and aborted when it raises.
+
+    Args:
+        dataset (str): The name of the dataset.
+        partition (dict[str, str] | None, optional): The partition keys and values. Defaults to None.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+        timestamp_col (str | None, optional): The column to record min and max timestamps of. Defaults to None.
+
+    Yields:
+        LakePartitionWriter: The writer.
+    """
+    writer = LakePartitionWriter(dataset, partition=partition, root=root, timestamp_col=timestamp_col)
+    try:
+        yield writer
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+
+
+def write_to_lake(
+    data: pd.DataFrame,
+    dataset: str,
+    partition: dict[str, str] | None = None,
+    root: str = LAKE_ROOT,
+    timestamp_col: str | None = None,
+) -> dict:
+    """
+    Writes a frame as a partition of a dataset in the lake, replacing the previous version of the partition.
+
+    Args:
+        data (pd.DataFrame): The complete contents of the partition.
+        dataset (str): The name of the dataset.
+        partition (dict[str, str] | None, optional): The partition keys and values. Defaults to None.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+        timestamp_col (str | None, optional): The column to record min and max timestamps of. Defaults to None.
+
+    Returns:
+        dict: The manifest entry of the partition.
+    """
+    writer = LakePartitionWriter(dataset, partition=partition, root=root, timestamp_col=timestamp_col)
+    try:
+        writer.write(data)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit()
+
+
+def swap_directory(source: Path, target: Path):
+    """
+    Moves `source` to `target`, replacing what was there.
+
+    Both renames stay within the same directory, so readers see either the old or the new files, apart from the
+    moment between the two renames in which the partition is missing.
+
+    Args:
+        source (Path): The directory to move.
+        target (Path): The directory to replace.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if not target.exists():
+        os.rename(source, target)
+        return
+    old = target.with_name(f".{target.name}.old-{uuid.uuid4().hex[:12]}")
+    os.rename(target, old)
+    os.rename(source, target)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+@contextmanager
+def manifest_lock(dataset: str, root: str = LAKE_ROOT) -> Iterator[None]:
+    """
+    Serializes updates of the manifest of a dataset across processes, e.g. the sepa and swift loads of a month.
+
+    Args:
+        dataset (str): The name of the dataset.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+    """
+    path = dataset_path(dataset, root=root)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / f"{MANIFEST_FILE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def read_manifest(dataset: str, root: str = LAKE_ROOT) -> dict:
+    """
+    Reads the manifest of a dataset.
+
+    Args:
+        dataset (str): The name of the dataset.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+
+    Returns:
+        dict: The manifest, with the entry of every partition under `partitions`, keyed by partition path.
+    """
+    path = dataset_path(dataset, root=root) / MANIFEST_FILE
+    if not path.exists():
+        return {"dataset": dataset, "partitions": {}}
+    return json.loads(path.read_text())
+
+
+def write_manifest(manifest: dict, dataset: str, root: str = LAKE_ROOT):
+    """
+    Atomically replaces the manifest of a dataset.
+
+    Args:
+        manifest (dict): The manifest.
+        dataset (str): The name of the dataset.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+    """
+    path = dataset_path(dataset, root=root) / MANIFEST_FILE
+    tmp_path = path.with_name(f".{MANIFEST_FILE}.tmp-{uuid.uuid4().hex[:12]}")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(tmp_path, path)
+
+
+def files_for_interval(
+    dataset: str, start_date: datetime, end_date: datetime, root: str = LAKE_ROOT, **partition: str
+) -> list[Path]:
+    """
+    Returns the files of a dataset that can hold rows in `[start_date, end_date]`, using only the manifest.
+
+    Args:
+        dataset (str): The name of the dataset.
+        start_date (datetime): The start of the interval, timezone aware.
+        end_date (datetime): The end of the interval, timezone aware.
+        root (str, optional): The root directory of the lake. Defaults to LAKE_ROOT.
+        **partition (str): Partition values to filter on, e.g. `source="sepa"`.
+
+    Returns:
+        list[Path]: The paths of the matching files.
+    """
+    base = dataset_path(dataset, root=root)
+    wanted = {f"{key}={value}" for key, value in partition.items()}
+    files = []
+    for path, entry in sorted(read_manifest(dataset, root=root)["partitions"].items()):
+        if not wanted.issubset(path.split("/")):
+            continue
+        for file in entry["files"]:
+            if file["min_timestamp"] is None:
+                continue
+            if datetime.fromisoformat(file["max_timestamp"]) < start_date:
+                continue
+            if datetime.fromisoformat(file["min_timestamp"]) > end_date:
+                continue
+            files.append(base / path / file["path"])
+    return files
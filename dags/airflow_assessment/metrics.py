@@ -0,0 +1,375 @@
+import functools
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator
+
+from airflow_assessment.constant import (
+    METRICS_PREFIX,
+    METRICS_TEXTFILE_DIR,
+    STATSD_HOST,
+    STATSD_PORT,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ACTIVE: "IngestMetrics | None" = None
+_ACTIVE_LOCK = threading.Lock()
+
+
+@dataclass
+class StageTiming:
+    """
+    The time spent in a stage and the number of rows it handled.
+
+    Attributes:
+        seconds (float): The total time spent in the stage.
+        calls (int): The number of times the stage ran.
+        rows (int): The number of rows handled by the stage.
+    """
+
+    seconds: float = 0.0
+    calls: int = 0
+    rows: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed buckets, in the Prometheus style.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q: float) -> float | None:
+        """
+        Returns the upper bound of the bucket that holds the `q` quantile, capped at the largest bucket, or None
+        without observations.
+        """
+        if not self.count:
+            return None
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= q * self.count:
+                return bound
+        return self.buckets[-1]
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram(self.buckets)
+        histogram.counts, histogram.count, histogram.sum = list(self.counts), self.count, self.sum
+        return histogram
+
+    def since(self, earlier: "Histogram") -> "Histogram":
+        """
+        Returns the observations made after `earlier`, an earlier copy of this histogram.
+        """
+        histogram = Histogram(self.buckets)
+        histogram.counts = [count - earlier_count for count, earlier_count in zip(self.counts, earlier.counts)]
+        histogram.count = self.count - earlier.count
+        histogram.sum = self.sum - earlier.sum
+        return histogram
+
+
+class StatsdClient:
+    """
+    Sends metrics to a StatsD server over UDP. Sending never raises, as metrics must not fail a task.
+
+    Args:
+        host (str): The StatsD host.
+        port (int, optional): The StatsD port. Defaults to STATSD_PORT.
+        prefix (str, optional): The prefix of every metric name. Defaults to METRICS_PREFIX.
+    """
+
+    def __init__(self, host: str, port: int = STATSD_PORT, prefix: str = METRICS_PREFIX):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, name: str, value: float, kind: str, tags: dict[str, str] | None = None):
+        tag_string = "|#" + ",".join(f"{key}:{value}" for key, value in tags.items()) if tags else ""
+        try:
+            self.socket.sendto(f"{self.prefix}.{name}:{value}|{kind}{tag_string}".encode(), self.address)
+        except OSError as e:
+            LOGGER.debug(f"Failed to send metric {name} to StatsD: {e}")
+
+
+class IngestMetrics:
+    """
+    Thread-safe counters, stage timings and latency histograms of a single task run.
+
+    Args:
+        labels (dict[str, str] | None, optional): The labels of the run, e.g. the DAG, task and source.
+            Defaults to None.
+        statsd (StatsdClient | None, optional): When given, latency observations are streamed to StatsD as they
+            happen and the totals are sent on `publish`. Defaults to None.
+    """
+
+    def __init__(self, labels: dict[str, str] | None = None, statsd: StatsdClient | None = None):
+        self.labels = labels or {}
+        self.statsd = statsd
+        self.counters: dict[str, float] = {}
+        self.stages: dict[str, StageTiming] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1):
+        """
+        Adds `value` to a counter, e.g. `pages_fetched` or `rows_rejected`.
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """
+        Records an observation in a histogram, e.g. the latency of an HTTP request in seconds.
+        """
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+        if self.statsd is not None:
+            self.statsd.send(name, round(value * 1000, 3), "ms", tags=self.labels)
+
+    def add_stage(self, stage: str, seconds: float, rows: int = 0):
+        """
+        Adds the time spent in a stage and the rows it handled.
+        """
+        with self._lock:
+            timing = self.stages.setdefault(stage, StageTiming())
+            timing.seconds += seconds
+            timing.calls += 1
+            timing.rows += rows
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[StageTiming]:
+        """
+        Times the block as a run of `stage`. Set `rows` on the yielded timing to record the rows it handled.
+
+        Yields:
+            StageTiming: The timing of this run only.
+        """
+        timing = StageTiming()
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            self.add_stage(stage, time.perf_counter() - start, rows=timing.rows)
+
+    def summary(self) -> dict:
+        """
+        Summarizes the run, e.g. for an XCom.
+
+        Returns:
+            dict: The labels, counters, stages with rows per second, and the count, mean, p50 and p95 of every
+                histogram.
+        """
+        with self._lock:
+            stages = {
+                stage: {
+                    "seconds": round(timing.seconds, 4),
+                    "calls": timing.calls,
+                    "rows": timing.rows,
+                    "rows_per_second": round(timing.rows_per_second, 1),
+                }
+                for stage, timing in self.stages.items()
+            }
+            histograms = {
+                name: {
+                    "count": histogram.count,
+                    "mean": round(histogram.sum / histogram.count, 4) if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for name, histogram in self.histograms.items()
+            }
+            return {
+                "labels": dict(self.labels),
+                "counters": dict(self.counters),
+                "stages": stages,
+                "histograms": histograms,
+            }
+
+    def to_prometheus(self, prefix: str = METRICS_PREFIX) -> str:
+        """
+        Renders the run in the Prometheus text exposition format, for the node exporter textfile collector.
+
+        Returns:
+            str: The metrics.
+        """
+        labels = self.labels
+
+        def line(name: str, value: float, **extra: str) -> str:
+            all_labels = {**labels, **extra}
+            label_string = ",".join(f'{key}="{_escape(str(label))}"' for key, label in all_labels.items())
+            return f"{prefix}_{name}{{{label_string}}} {value}"
+
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {prefix}_{name} gauge", line(name, value)]
+            if self.stages:
+                lines.append(f"# TYPE {prefix}_stage_seconds gauge")
+                lines += [line("stage_seconds", t.seconds, stage=stage) for stage, t in sorted(self.stages.items())]
+                lines.append(f"# TYPE {prefix}_stage_rows gauge")
+                lines += [line("stage_rows", t.rows, stage=stage) for stage, t in sorted(self.stages.items())]
+                lines.append(f"# TYPE {prefix}_stage_rows_per_second gauge")
+                lines += [
+                    line("stage_rows_per_second", round(t.rows_per_second, 1), stage=stage)
+                    for stage, t in sorted(self.stages.items())
+                ]
+            for name, histogram in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {prefix}_{name} histogram")
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(line(f"{name}_bucket", count, le=str(bound)))
+                lines.append(line(f"{name}_bucket", histogram.count, le="+Inf"))
+                lines += [line(f"{name}_sum", round(histogram.sum, 6)), line(f"{name}_count", histogram.count)]
+            lines += [
+                f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+                line("last_run_timestamp_seconds", time.time()),
+            ]
+        return "\n".join(lines) + "\n"
+
+    def publish(self, textfile_dir: str | None = METRICS_TEXTFILE_DIR):
+        """
+        Writes the run as a Prometheus textfile and sends the totals to StatsD, where configured. Failures are
+        logged and never raised.
+
+        Args:
+            textfile_dir (str | None, optional): The directory of the textfile collector. Defaults to
+                METRICS_TEXTFILE_DIR, None disables the textfile.
+        """
+        LOGGER.info(f"Ingest metrics: {self.summary()}")
+        if textfile_dir is not None:
+            try:
+                write_textfile(self.to_prometheus(), textfile_dir, name=textfile_name(self.labels))
+            except OSError as e:
+                LOGGER.warning(f"Failed to write the metrics textfile to {textfile_dir}: {e}")
+        if self.statsd is not None:
+            for name, value in self.counters.items():
+                self.statsd.send(name, value, "c", tags=self.labels)
+            for stage, timing in self.stages.items():
+                tags = {**self.labels, "stage": stage}
+                self.statsd.send("stage_seconds", round(timing.seconds * 1000, 3), "ms", tags=tags)
+                self.statsd.send("stage_rows", timing.rows, "c", tags=tags)
+                self.statsd.send("stage_rows_per_second", round(timing.rows_per_second, 1), "g", tags=tags)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def textfile_name(labels: dict[str, str]) -> str:
+    """
+    Returns the textfile name of a task, so every task, and every source of a task, keeps its own file.
+    """
+    name = "__".join(str(value) for value in labels.values()) or "ingest"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) + ".prom"
+
+
+def write_textfile(content: str, directory: str, name: str):
+    """
+    Atomically replaces a textfile, so the collector never reads a partial file.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_path = path / f".{name}.{uuid.uuid4().hex[:12]}"
+    tmp_path.write_text(content)
+    os.replace(tmp_path, path / name)
+
+
+def get_metrics() -> IngestMetrics:
+    """
+    Returns the metrics of the task run of the current process, or a throwaway instance outside of a task run.
+    """
+    return _ACTIVE if _ACTIVE is not None else IngestMetrics()
+
+
+def start_run(labels: dict[str, str] | None = None) -> IngestMetrics:
+    """
+    Starts recording the metrics of a task run in the current process.
+
+    Args:
+        labels (dict[str, str] | None, optional): The labels of the run. Defaults to None.
+
+    Returns:
+        IngestMetrics: The metrics of the run.
+    """
+    global _ACTIVE
+    statsd = StatsdClient(STATSD_HOST) if STATSD_HOST else None
+    with _ACTIVE_LOCK:
+        _ACTIVE = IngestMetrics(labels=labels, statsd=statsd)
+        return _ACTIVE
+
+
+def end_run():
+    global _ACTIVE
+    with _ACTIVE_LOCK:
+        _ACTIVE = None
+
+
+def task_labels(task: str, context: dict) -> dict[str, str]:
+    """
+    Returns the labels of a task run from its Airflow context.
+    """
+    ti = context.get("ti")
+    labels = {
+        "dag_id": getattr(ti, "dag_id", None),
+        "task_id": getattr(ti, "task_id", None) or task,
+        "source": context.get("url_suffix"),
+        "map_index": getattr(ti, "map_index", -1) if getattr(ti, "map_index", -1) >= 0 else None,
+    }
+    return {key: str(value) for key, value in labels.items() if value is not None}
+
+
+def instrumented(function: Callable) -> Callable:
+    """
+    Records the metrics of an ingest task. When the task ends, the metrics are published and pushed as the
+    `ingest_metrics` XCom, also when the task fails.
+
+    Args:
+        function (Callable): The task callable, which receives the Airflow context as keyword arguments.
+
+    Returns:
+        Callable: The instrumented callable.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = start_run(labels=task_labels(function.__name__, kwargs))
+        try:
+            with metrics.timer("task"):
+                return function(*args, **kwargs)
+        except BaseException:
+            metrics.increment("task_failures")
+            raise
+        finally:
+            end_run()
+            metrics.publish(textfile_dir=METRICS_TEXTFILE_DIR)
+            ti = kwargs.get("ti")
+            if ti is not None:
+                try:
+                    ti.xcom_push(key="ingest_metrics", value=metrics.summary())
+                except Exception as e:
+                    LOGGER.warning(f"Failed to push the ingest metrics XCom: {e}")
+
+    return wrapper
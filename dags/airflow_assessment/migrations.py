@@ -0,0 +1,215 @@
+import hashlib
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Callable, Iterator
+
+from airflow_assessment.constant import AIRFLOW_SCHEMA_NAME, MIGRATION_LOCK_ID
+from airflow_assessment.database import (
+    create_partitioned_transaction_table,
+    create_tables,
+    partition_transaction_table,
+    qualified_table_name,
+)
+from airflow_assessment.metrics import get_metrics
+from airflow_assessment.models.alchemy import SchemaMigrationModel, prod_base
+from airflow_assessment.utils import to_naive_utc
+from sqlalchemy import MetaData, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    A versioned change of the schema, applied once per database.
+
+    Attributes:
+        version (int): The version, migrations are applied in increasing order.
+        name (str): The name of the migration.
+        apply (Callable[[Engine], None]): Applies the migration.
+    """
+
+    version: int
+    name: str
+    apply: Callable[[Engine], None]
+
+
+def create_schema(engine: Engine):
+    """
+    Creates the schema of the project. Unlike `CreateSchema`, concurrent runs do not race on it.
+    """
+    with engine.begin() as connection:
+        connection.execute(f'CREATE SCHEMA IF NOT EXISTS "{AIRFLOW_SCHEMA_NAME}"')
+
+
+def sync_schema(engine: Engine):
+    """
+    Creates the tables, indexes and columns of the models that the database is missing. It is idempotent, and runs
+    whenever the models change, so adding a column or an index to a model needs no migration of its own.
+    """
+    added = create_partitioned_transaction_table(engine=engine)
+    create_tables(engine=engine)
+    if added:
+        LOGGER.info(f"Added the columns {added} to the transaction table.")
+
+
+def enrich_transactions(engine: Engine):
+    """
+    Enriches the transactions that were loaded before the enrichment columns existed.
+    """
+    from airflow_assessment.enrichment import refresh_enrichment
+
+    refresh_enrichment(engine=engine, rates=True, companies=True, countries=True)
+
+
+def partition_transactions(engine: Engine):
+    """
+    Moves a transaction table created before partitioning into the partitioned layout, see
+    `partition_transaction_table`. Databases created since are partitioned from the start.
+    """
+    if engine.dialect.name == "postgresql":
+        partition_transaction_table(engine=engine)
+
+
+MIGRATIONS = [
+    Migration(version=1, name="create_schema", apply=create_schema),
+    Migration(version=2, name="sync_schema", apply=sync_schema),
+    Migration(version=3, name="enrich_transactions", apply=enrich_transactions),
+    Migration(version=4, name="partition_transactions", apply=partition_transactions),
+]
+
+
+@lru_cache
+def schema_fingerprint(metadata: MetaData = prod_base.metadata) -> str:
+    """
+    Computes a fingerprint of the tables and indexes of the models, from their Postgres DDL.
+
+    Args:
+        metadata (MetaData, optional): The metadata of the models. Defaults to the metadata of `prod_base`.
+
+    Returns:
+        str: The hex SHA-256 fingerprint.
+    """
+    dialect = postgresql.dialect()
+    digest = hashlib.sha256()
+    for table in metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for statement in sorted(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes):
+            digest.update(statement.encode())
+    return digest.hexdigest()
+
+
+def get_schema_version(engine: Engine) -> tuple[int, str] | None:
+    """
+    Returns the version and fingerprint of the latest applied migration, with a single primary key lookup.
+
+    Args:
+        engine (Engine): The database engine.
+
+    Returns:
+        tuple[int, str] | None: The version and fingerprint, or None if no migration was applied yet.
+    """
+    statement = text(
+        f"SELECT version, fingerprint FROM {qualified_table_name(SchemaMigrationModel)} ORDER BY version DESC LIMIT 1"
+    )
+    try:
+        with engine.connect() as connection:
+            row = connection.execute(statement).first()
+    except DBAPIError:
+        # The migrations table does not exist yet.
+        return None
+    return (row[0], row[1]) if row is not None else None
+
+
+@contextmanager
+def advisory_lock(engine: Engine, lock_id: int = MIGRATION_LOCK_ID) -> Iterator[None]:
+    """
+    Holds a Postgres session level advisory lock for the duration of the block, so concurrent runs migrate one at
+    a time. Other databases, e.g. SQLite in tests, are not locked.
+
+    Args:
+        engine (Engine): The database engine.
+        lock_id (int, optional): The key of the lock. Defaults to MIGRATION_LOCK_ID.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": lock_id})
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+
+
+def migrate(
+    engine: Engine,
+    migrations: list[Migration] = MIGRATIONS,
+    sync: Callable[[Engine], None] = sync_schema,
+    metadata: MetaData = prod_base.metadata,
+) -> list[str]:
+    """
+    Brings the schema of the database up to date.
+
+    When the latest migration is applied and the models did not change since, this is a single lookup in the
+    migrations table. Otherwise the advisory lock is taken, the pending migrations are applied in order, each
+    recorded once it succeeded, and `sync` brings the schema in line with changed models.
+
+    Args:
+        engine (Engine): The database engine.
+        migrations (list[Migration], optional): The migrations, in increasing order of version. Defaults to
+            MIGRATIONS.
+        sync (Callable[[Engine], None], optional): Applies changes of the models. Defaults to `sync_schema`.
+        metadata (MetaData, optional): The metadata of the models. Defaults to the metadata of `prod_base`.
+
+    Returns:
+        list[str]: The names of the applied migrations, "sync" when the models were synced.
+    """
+    fingerprint = schema_fingerprint(metadata)
+    latest = migrations[-1].version
+    if get_schema_version(engine) == (latest, fingerprint):
+        LOGGER.info(f"The schema is up to date at version {latest}.")
+        return []
+
+    table = SchemaMigrationModel.__table__
+    applied = []
+    with get_metrics().timer("migrate"), advisory_lock(engine):
+        # Another run may have migrated the schema while this one waited for the lock.
+        state = get_schema_version(engine)
+        if state == (latest, fingerprint):
+            return []
+        if state is not None and state[0] > latest:
+            LOGGER.warning(f"The schema is at version {state[0]}, ahead of the latest known migration {latest}.")
+            return []
+
+        table.create(engine, checkfirst=True)
+        pending = [migration for migration in migrations if state is None or migration.version > state[0]]
+        for migration in pending:
+            LOGGER.info(f"Applying migration {migration.version} {migration.name}.")
+            migration.apply(engine)
+            with engine.begin() as connection:
+                connection.execute(
+                    table.insert().values(
+                        version=migration.version,
+                        name=migration.name,
+                        fingerprint=fingerprint,
+                        applied_at=to_naive_utc(datetime.now(timezone.utc)),
+                    )
+                )
+            applied.append(migration.name)
+
+        if state is not None and state[1] != fingerprint and all(migration.apply is not sync for migration in pending):
+            LOGGER.info("The models changed since the last migration, syncing the schema.")
+            sync(engine)
+            with engine.begin() as connection:
+                connection.execute(table.update().where(table.c.version == latest).values(fingerprint=fingerprint))
+            applied.append("sync")
+    LOGGER.info(f"Migrated the schema to version {latest}: {applied}.")
+    return applied
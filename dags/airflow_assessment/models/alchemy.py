@@ -1,6 +1,6 @@
 from typing import Union
 
-from sqlalchemy import Column, DateTime, Float, Integer, String
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Identity
 
@@ -58,9 +58,28 @@ class TransactionModel(prod_base):
         amount (float): The amount of the transaction.
         currency (str): The currency of the transaction.
         timestamp (datetime): The timestamp of the transaction.
+        source (str): The API the transaction was ingested from, e.g. "sepa" or "swift".
+        eur_amount (float): The amount in EUR, at the rate at ingest time.
+        country_payer (str): The country code of the payer IBAN.
+        country_receiver (str): The country code of the receiver IBAN.
+        payer_company_id (int): The ID of the company of the payer, if it is a known company.
+        receiver_company_id (int): The ID of the company of the receiver, if it is a known company.
+        content_hash (int): The hash of the content of the transaction, see `dedup.content_hashes`.
+
+    The enrichment columns are computed at ingest, see `enrichment.enrich_trades`. In Postgres the table is range
+    partitioned by month on `timestamp` and list partitioned by `source` within every month, see
+    `database.create_partitioned_transaction_table`. The unique index on the content hash includes the partition
+    columns, as Postgres requires, so it rejects exact replays of a transaction.
     """
 
     __tablename__ = "transaction"
+    __table_args__ = (
+        Index("ix_transaction_timestamp", "timestamp", postgresql_using="brin"),
+        Index("ix_transaction_payer", "payer"),
+        Index("ix_transaction_receiver", "receiver"),
+        Index("ix_transaction_currency", "currency"),
+        Index("ux_transaction_content_hash", "content_hash", "timestamp", "source", unique=True),
+    )
 
     id = Column(Integer, Identity(start=1, cycle=True), primary_key=True)
     trade_id = Column(String)
@@ -69,6 +88,138 @@ class TransactionModel(prod_base):
     amount = Column(Float)
     currency = Column(String)
     timestamp = Column(DateTime)
+    source = Column(String)
+    eur_amount = Column(Float)
+    country_payer = Column(String(2))
+    country_receiver = Column(String(2))
+    payer_company_id = Column(Integer)
+    receiver_company_id = Column(Integer)
+    content_hash = Column(BigInteger)
 
 
-TableTypes = Union[CompanyModel, RateModel, TransactionModel]
+class QuarantineModel(prod_base):
+    """
+    Represents a row from the API that failed validation.
+
+    Attributes:
+        id (int): The ID of the quarantined row.
+        model (str): The name of the Pydantic model the row was validated against.
+        reason (str): The validation errors of the row.
+        payload (str): The row as received from the API, serialized as JSON.
+        quarantined_at (datetime): The moment the row was quarantined.
+    """
+
+    __tablename__ = "quarantine"
+
+    id = Column(Integer, Identity(start=1, cycle=True), primary_key=True)
+    model = Column(String)
+    reason = Column(String)
+    payload = Column(String)
+    quarantined_at = Column(DateTime)
+
+
+class DatasetFingerprintModel(prod_base):
+    """
+    Represents the fingerprint of the last loaded version of a dataset.
+
+    Attributes:
+        dataset (str): The name of the table the dataset is loaded into.
+        fingerprint (str): The SHA-256 fingerprint of the loaded dataset.
+        row_count (int): The number of rows of the loaded dataset.
+        updated_at (datetime): The moment the dataset was loaded.
+    """
+
+    __tablename__ = "dataset_fingerprint"
+
+    dataset = Column(String, primary_key=True)
+    fingerprint = Column(String)
+    row_count = Column(Integer)
+    updated_at = Column(DateTime)
+
+
+class AccountBalanceModel(prod_base):
+    """
+    Represents the net EUR mutation of an account within a month, for the transactions of one source.
+
+    Attributes:
+        account (str): The IBAN of the account.
+        month (datetime): The first day of the month.
+        source (str): The source of the transactions, e.g. "sepa" or "swift".
+        balance (float): The sum of the incoming minus the outgoing EUR amounts.
+    """
+
+    __tablename__ = "account_month_balance"
+
+    account = Column(String, primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    source = Column(String, primary_key=True)
+    balance = Column(Float)
+
+
+class AccountCountryModel(prod_base):
+    """
+    Represents a country an account interacted with within a month, for the transactions of one source.
+
+    Attributes:
+        account (str): The IBAN of the account.
+        month (datetime): The first day of the month.
+        source (str): The source of the transactions, e.g. "sepa" or "swift".
+        interaction_country (str): The country code of the counterparty IBAN.
+    """
+
+    __tablename__ = "account_month_country"
+
+    account = Column(String, primary_key=True)
+    month = Column(DateTime, primary_key=True)
+    source = Column(String, primary_key=True)
+    interaction_country = Column(String, primary_key=True)
+
+
+class WatermarkModel(prod_base):
+    """
+    Represents the last committed API cursor of an ingest, so an interrupted ingest resumes where it stopped.
+
+    Attributes:
+        key (str): The ingest the cursor belongs to, e.g. "sepa" for the incremental ingest of a source or
+            "sepa@2022-02-01T00:00:00+00:00" for a window.
+        cursor (str): The `after-timestamp` of the last committed page, exactly as returned by the API.
+        updated_at (datetime): The moment the cursor was committed.
+    """
+
+    __tablename__ = "ingest_watermark"
+
+    key = Column(String, primary_key=True)
+    cursor = Column(String, nullable=False)
+    updated_at = Column(DateTime)
+
+
+class SchemaMigrationModel(prod_base):
+    """
+    Represents a schema migration that was applied to the database, see `migrations.migrate`.
+
+    Attributes:
+        version (int): The version of the migration.
+        name (str): The name of the migration.
+        fingerprint (str): The fingerprint of the models the schema was last brought in line with.
+        applied_at (datetime): The moment the migration was applied.
+    """
+
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    fingerprint = Column(String, nullable=False)
+    applied_at = Column(DateTime)
+
+
+TableTypes = Union[
+    CompanyModel,
+    RateModel,
+    TransactionModel,
+    QuarantineModel,
+    DatasetFingerprintModel,
+    AccountBalanceModel,
+    AccountCountryModel,
+    WatermarkModel,
+    SchemaMigrationModel,
+]
@@ -0,0 +1,65 @@
+import logging
+import queue
+import threading
+from typing import Callable, Iterable, TypeVar
+
+LOGGER = logging.getLogger(__name__)
+T = TypeVar("T")
+
+_DONE = object()
+
+
+def run_pipeline(producer: Iterable[T], consumer: Callable[[T], None], max_queue_size: int) -> int:
+    """
+    Runs a producer/consumer pipeline over a bounded queue.
+
+    The producer is iterated in a background thread while the consumer handles the items in the calling thread,
+    so producing the next item overlaps with consuming the current one. The producer blocks once `max_queue_size`
+    items are waiting, which caps the memory held by the pipeline. An exception on either side stops the pipeline
+    and is re-raised in the calling thread.
+
+    Args:
+        producer (Iterable[T]): The items to process, e.g. a generator of pages.
+        consumer (Callable[[T], None]): The function handling every item.
+        max_queue_size (int): The maximum number of items buffered between producer and consumer.
+
+    Returns:
+        int: The number of items consumed.
+    """
+    items: queue.Queue = queue.Queue(maxsize=max_queue_size)
+    stop = threading.Event()
+    errors: list[BaseException] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in producer:
+                if not put(item):
+                    return
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, name="pipeline-producer", daemon=True)
+    thread.start()
+    consumed = 0
+    try:
+        while (item := items.get()) is not _DONE:
+            consumer(item)
+            consumed += 1
+    finally:
+        stop.set()
+        thread.join()
+    if errors:
+        raise errors[0]
+    LOGGER.debug(f"Pipeline consumed {consumed} items.")
+    return consumed
@@ -0,0 +1,182 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Literal
+from urllib.parse import parse_qsl, urlparse
+
+from airflow_assessment.constant import RAW_CACHE_COMPRESSLEVEL, RAW_CACHE_ROOT
+from airflow_assessment.metrics import get_metrics
+
+LOGGER = logging.getLogger(__name__)
+
+MANIFEST_FILE = "_manifest.jsonl"
+# The parameters that only change how a response is paged, not where it starts.
+PAGING_PARAMS = ("limit",)
+
+# off: the cache is not used. record: every response is fetched and stored. prefer: cached responses are served,
+# others are fetched and stored, for backfills of closed history. replay: only cached responses are served.
+RawCacheMode = Literal["off", "record", "prefer", "replay"]
+
+
+class RawCacheMiss(KeyError):
+    """
+    Raised in replay mode when a request has no cached response.
+    """
+
+
+def request_key(url: str, params: Any | None = None, ignore: tuple[str, ...] = ()) -> tuple[str, str, list[list[str]]]:
+    """
+    Returns the cache key of a request, which depends on the endpoint path and the parameters only, so the cache
+    stays valid when the host of the API changes.
+
+    Args:
+        url (str): The URL of the request.
+        params (Any | None, optional): The parameters, as a query string or a mapping. Defaults to None.
+        ignore (tuple[str, ...], optional): The parameters to leave out of the key. Defaults to ().
+
+    Returns:
+        tuple[str, str, list[list[str]]]: The key, the endpoint and the sorted parameters.
+    """
+    parsed = urlparse(url)
+    pairs = parse_qsl(parsed.query)
+    if isinstance(params, str):
+        pairs += parse_qsl(params)
+    elif params:
+        pairs += [(str(key), str(value)) for key, value in dict(params).items()]
+    sorted_params = sorted([key, value] for key, value in pairs if key not in ignore)
+    key = hashlib.sha256(json.dumps([parsed.path, sorted_params]).encode()).hexdigest()
+    return key, parsed.path, sorted_params
+
+
+class RawCache:
+    """
+    An on-disk, content-addressed store of raw API responses.
+
+    Response bodies are stored gzip compressed under the SHA-256 of their content, so identical responses, e.g.
+    empty pages, are stored once. Every request points at its response through a small ref file keyed by
+    `request_key`, and every stored response is appended to a manifest. A second ref ignores the PAGING_PARAMS,
+    so a request for a page at the same cursor but with another page size, e.g. after the adaptive paging of the
+    client settled elsewhere, is served the cached page. As paging follows the rows of the pages, it then continues
+    along the cached cursors.
+
+    The layout is:
+
+        <root>/objects/ab/abcdef....json.gz
+        <root>/refs/12/123456...
+        <root>/_manifest.jsonl
+
+    Args:
+        root (str, optional): The root directory of the cache. Defaults to RAW_CACHE_ROOT.
+        compresslevel (int, optional): The gzip compression level. Defaults to RAW_CACHE_COMPRESSLEVEL.
+    """
+
+    def __init__(self, root: str = RAW_CACHE_ROOT, compresslevel: int = RAW_CACHE_COMPRESSLEVEL):
+        self.root = Path(root)
+        self.compresslevel = compresslevel
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.json.gz"
+
+    def ref_path(self, key: str) -> Path:
+        return self.root / "refs" / key[:2] / key
+
+    def get(self, url: str, params: Any | None = None) -> bytes | None:
+        """
+        Returns the cached response body of a request.
+
+        Args:
+            url (str): The URL of the request.
+            params (Any | None, optional): The parameters of the request. Defaults to None.
+
+        Returns:
+            bytes | None: The body, or None if the request is not cached.
+        """
+        for ignore in ((), PAGING_PARAMS):
+            key, _, _ = request_key(url, params, ignore=ignore)
+            try:
+                digest = self.ref_path(key).read_text()
+                body = gzip.decompress(self.object_path(digest).read_bytes())
+            except FileNotFoundError:
+                continue
+            get_metrics().increment("raw_cache_hits")
+            return body
+        get_metrics().increment("raw_cache_misses")
+        return None
+
+    def put(self, url: str, params: Any | None, body: bytes) -> str:
+        """
+        Stores the response body of a request and records it in the manifest.
+
+        Args:
+            url (str): The URL of the request.
+            params (Any | None): The parameters of the request.
+            body (bytes): The response body.
+
+        Returns:
+            str: The SHA-256 of the body.
+        """
+        key, endpoint, sorted_params = request_key(url, params)
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self.object_path(digest)
+        if not object_path.exists():
+            _atomic_write(object_path, gzip.compress(body, compresslevel=self.compresslevel))
+            get_metrics().increment("raw_cache_bytes_written", object_path.stat().st_size)
+        _atomic_write(self.ref_path(key), digest.encode())
+        paging_key, _, _ = request_key(url, params, ignore=PAGING_PARAMS)
+        if paging_key != key:
+            _atomic_write(self.ref_path(paging_key), digest.encode())
+        self._append_manifest(
+            {
+                "key": key,
+                "endpoint": endpoint,
+                "params": sorted_params,
+                "sha256": digest,
+                "bytes": len(body),
+                "stored_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        return digest
+
+    def _append_manifest(self, entry: dict):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / MANIFEST_FILE, "a") as manifest:
+            fcntl.flock(manifest, fcntl.LOCK_EX)
+            try:
+                manifest.write(json.dumps(entry, sort_keys=True) + "\n")
+            finally:
+                fcntl.flock(manifest, fcntl.LOCK_UN)
+
+    def entries(self, endpoint: str | None = None) -> Iterator[dict]:
+        """
+        Iterates over the manifest, keeping only the latest entry of every request.
+
+        Args:
+            endpoint (str | None, optional): Only return the entries of this endpoint path, e.g.
+                "/transactions/sepa". Defaults to None.
+
+        Yields:
+            dict: The manifest entries, with the key, endpoint, params, sha256, bytes and stored_at of a response.
+        """
+        path = self.root / MANIFEST_FILE
+        if not path.exists():
+            return
+        latest = {}
+        with open(path) as manifest:
+            for line in manifest:
+                entry = json.loads(line)
+                if endpoint is None or entry["endpoint"] == endpoint:
+                    latest[entry["key"]] = entry
+        yield from latest.values()
+
+
+def _atomic_write(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp-{uuid.uuid4().hex[:12]}")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
@@ -0,0 +1,34 @@
+import importlib
+from typing import Callable
+
+
+def lazy_task(module: str, name: str) -> Callable:
+    """
+    Returns a task callable that imports its implementation only when the task runs.
+
+    DAG files are parsed continuously by the scheduler's DAG processor. Referencing the task functions through this
+    module keeps pandas, SQLAlchemy and the other dependencies of the ingest out of every parse.
+
+    Args:
+        module (str): The module of the implementation, e.g. "airflow_assessment.ingest".
+        name (str): The name of the function in the module.
+
+    Returns:
+        Callable: The task callable, which passes its arguments and the Airflow context on to the implementation.
+    """
+
+    def task(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+    task.__name__ = task.__qualname__ = name
+    task.__doc__ = f"Runs `{module}.{name}`, imported when the task runs."
+    return task
+
+
+prep_database = lazy_task("airflow_assessment.database", "prep_database")
+ingest_companies = lazy_task("airflow_assessment.ingest", "ingest_companies")
+ingest_rates = lazy_task("airflow_assessment.ingest", "ingest_rates")
+plan_transaction_windows = lazy_task("airflow_assessment.ingest", "plan_transaction_windows")
+ingest_transaction_window = lazy_task("airflow_assessment.ingest", "ingest_transaction_window")
+finalize_transaction_month = lazy_task("airflow_assessment.ingest", "finalize_transaction_month")
+ingest_transactions_incremental = lazy_task("airflow_assessment.ingest", "ingest_transactions_incremental")
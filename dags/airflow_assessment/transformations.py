@@ -1,9 +1,31 @@
 import pandas as pd
+from airflow_assessment.constant import API_TS_FORMAT
+
+# An IBAN is a country code, two check digits and up to 30 alphanumeric characters.
+IBAN_PATTERN = r"([A-Z]{2}[0-9]{2}[A-Z0-9]{1,30})"
+
+
+def parse_iban_lists(ibans: pd.Series) -> pd.Series:
+    """
+    Parses a column of IBAN lists, e.g. `"['NL58EQEN7258967872', 'DE45306993503114243904']"`, into a flat Series.
+
+    The IBANs are matched with a compiled regular expression and flattened with a single `explode`, instead of
+    evaluating every list, so the API content is never executed.
+
+    Args:
+        ibans (pd.Series): The IBAN lists, as strings.
+
+    Returns:
+        pd.Series: One IBAN per row, indexed by the index of the list it came from.
+    """
+    return ibans.str.findall(IBAN_PATTERN).explode().dropna()
 
 
 def transform_companies(companies: pd.DataFrame, iban_field_name: str = "ibans") -> pd.DataFrame:
     """
-    Transforms the given DataFrame of companies.
+    Transforms the given DataFrame of companies into one row per IBAN.
+
+    Companies without a valid IBAN are dropped, as the IBAN identifies a company in the database.
 
     Args:
         companies (pd.DataFrame): The DataFrame of companies.
@@ -11,24 +33,31 @@ def transform_companies(companies: pd.DataFrame, iban_field_name: str = "ibans")
     Returns:
         pd.DataFrame: The transformed DataFrame of companies.
     """
-    companies[iban_field_name] = companies[iban_field_name].apply(pd.eval)  # type: ignore
-    companies = companies.explode(iban_field_name)
-    companies["country"] = companies[iban_field_name].str.slice(0, 2)
-    companies = companies.rename(columns={iban_field_name: "iban", "id": "company_id"})
+    columns = ["iban" if column == iban_field_name else column for column in companies.columns]
+    companies = companies.reset_index(drop=True)
+    ibans = parse_iban_lists(companies[iban_field_name]).rename("iban")
+    companies = companies.drop(columns=iban_field_name).join(ibans, how="inner")[columns]
+    companies["country"] = companies["iban"].str.slice(0, 2)
+    companies = companies.rename(columns={"id": "company_id"})
     return companies
 
 
-def transform_trades(trades: pd.DataFrame) -> pd.DataFrame:
+def transform_trades(trades: pd.DataFrame, source: str | None = None) -> pd.DataFrame:
     """
     Transforms the given DataFrame of trades.
 
     Args:
         trades (pd.DataFrame): The DataFrame of trades.
+        source (str | None, optional): The source of the trades, e.g. "sepa", stored in the `source` column.
+            Defaults to None, which leaves the column out.
 
     Returns:
         pd.DataFrame: The transformed DataFrame of trades.
     """
-    trades["timestamp"] = pd.to_datetime(trades["timestamp"])
+    if not pd.api.types.is_datetime64_any_dtype(trades["timestamp"]):
+        trades["timestamp"] = pd.to_datetime(trades["timestamp"], format=API_TS_FORMAT, utc=True)
     column_mapping = {"sender": "payer", "beneficiary": "receiver", "id": "trade_id"}
     trades = trades.rename(columns=column_mapping, errors="ignore")
+    if source is not None:
+        trades["source"] = pd.Categorical([source] * len(trades))
     return trades
@@ -16,3 +16,47 @@ def last_day_of_month(any_day: datetime.datetime) -> datetime.datetime:
     last_day = next_month - datetime.timedelta(days=next_month.day)
     last_day = last_day.replace(hour=23, minute=59, second=59, microsecond=999999)
     return last_day
+
+
+def first_day_of_month(any_day: datetime.datetime) -> datetime.datetime:
+    """
+    Returns the start of the month for a given date.
+
+    Parameters:
+        any_day (datetime.datetime): The date for which the start of the month is to be determined.
+
+    Returns:
+        datetime.datetime: Midnight of the first day of the month.
+
+    """
+    return any_day.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def first_day_of_next_month(any_day: datetime.datetime) -> datetime.datetime:
+    """
+    Returns the start of the next month for a given date.
+
+    Parameters:
+        any_day (datetime.datetime): The date for which the start of the next month is to be determined.
+
+    Returns:
+        datetime.datetime: Midnight of the first day of the next month.
+
+    """
+    return first_day_of_month(first_day_of_month(any_day) + datetime.timedelta(days=32))
+
+
+def to_naive_utc(any_day: datetime.datetime) -> datetime.datetime:
+    """
+    Converts a date to a naive UTC datetime, the way timestamps are stored in the database.
+
+    Parameters:
+        any_day (datetime.datetime): The date to convert. Naive dates are assumed to be UTC already.
+
+    Returns:
+        datetime.datetime: The naive UTC datetime.
+
+    """
+    if any_day.tzinfo is not None:
+        any_day = any_day.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return any_day
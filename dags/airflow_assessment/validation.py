@@ -0,0 +1,196 @@
+import json
+import logging
+import random
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Annotated, Literal, Type
+
+from airflow_assessment.constant import VALIDATION_SAMPLE_RATE
+from pydantic import BaseModel, TypeAdapter, ValidationError
+from typing_extensions import TypedDict
+
+LOGGER = logging.getLogger(__name__)
+
+ValidationPolicy = Literal["full", "sampled", "schema"]
+
+
+@dataclass
+class ValidationResult:
+    """
+    Represents the outcome of validating a batch of rows.
+
+    Attributes:
+        valid (list[dict]): The rows that passed validation or were not checked.
+        rejected (list[dict]): The rejected rows, as dicts with the original `payload` and the `reason`.
+    """
+
+    valid: list[dict] = field(default_factory=list)
+    rejected: list[dict] = field(default_factory=list)
+
+
+@dataclass
+class DecodedBatch(ValidationResult):
+    """
+    Represents the outcome of decoding and validating a raw JSON response.
+
+    Attributes:
+        n_rows (int): The number of rows in the response, including the rejected rows.
+        last_row (dict | None): The last row of the response, validated when it was valid. Used as a paging cursor.
+    """
+
+    n_rows: int = 0
+    last_row: dict | None = None
+
+
+@lru_cache(maxsize=None)
+def get_list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """
+    Returns a cached TypeAdapter that validates a list of the given model in a single call.
+
+    Args:
+        model (Type[BaseModel]): The Pydantic model.
+
+    Returns:
+        TypeAdapter: The adapter for `list[model]`.
+    """
+    return TypeAdapter(list[model])
+
+
+@lru_cache(maxsize=None)
+def get_json_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """
+    Returns a cached TypeAdapter that decodes and validates a JSON array of the given model straight from bytes,
+    into plain dicts.
+
+    The rows are described by a TypedDict that is generated from the fields and config of the model, so the model
+    stays the source of truth for the schema, while no model instances are created and dumped again.
+
+    Args:
+        model (Type[BaseModel]): The Pydantic model.
+
+    Returns:
+        TypeAdapter: The adapter for a list of the generated TypedDict.
+    """
+    fields = {name: Annotated[info.annotation, info] for name, info in model.model_fields.items()}
+    row_type = TypedDict(f"{model.__name__}Dict", fields)
+    row_type.__pydantic_config__ = model.model_config
+    return TypeAdapter(list[row_type])
+
+
+def format_error(error: dict) -> str:
+    """
+    Formats a single pydantic error, dropping the list index from its location.
+
+    Args:
+        error (dict): The error, as returned by `ValidationError.errors()`.
+
+    Returns:
+        str: The error formatted as `field: message`.
+    """
+    location = ".".join(str(part) for part in error["loc"][1:])
+    return f"{location}: {error['msg']}"
+
+
+def select_rows_to_check(n_rows: int, policy: ValidationPolicy, sample_rate: float) -> list[int]:
+    """
+    Selects the indices of the rows to validate under the given policy.
+
+    Args:
+        n_rows (int): The number of rows in the batch.
+        policy (ValidationPolicy): "full" checks every row, "sampled" a random `sample_rate` fraction of the rows
+            and "schema" only the first row of the batch.
+        sample_rate (float): The fraction of rows to check with the "sampled" policy.
+
+    Returns:
+        list[int]: The sorted indices of the rows to check.
+    """
+    if policy == "full":
+        return list(range(n_rows))
+    if policy == "schema":
+        return list(range(min(1, n_rows)))
+    if policy == "sampled":
+        n_samples = min(n_rows, max(1, round(n_rows * sample_rate)))
+        return sorted(random.sample(range(n_rows), n_samples))
+    raise ValueError(f"Unknown validation policy: {policy=}")
+
+
+def validate_batch(
+    data: list[dict],
+    model: Type[BaseModel],
+    policy: ValidationPolicy = "full",
+    sample_rate: float = VALIDATION_SAMPLE_RATE,
+) -> ValidationResult:
+    """
+    Validates a batch of rows against the given Pydantic model in one pass.
+
+    With the "full" policy the valid rows are returned as typed dicts, e.g. with parsed timestamps and without
+    unknown fields. The "sampled" and "schema" policies only check part of the batch and return the accepted rows
+    as they came in, so large backfills can trade strictness for throughput.
+
+    Args:
+        data (list[dict]): The rows to validate.
+        model (Type[BaseModel]): The Pydantic model to validate against.
+        policy (ValidationPolicy, optional): The validation policy. Defaults to "full".
+        sample_rate (float, optional): The fraction of rows to check with the "sampled" policy.
+            Defaults to VALIDATION_SAMPLE_RATE.
+
+    Returns:
+        ValidationResult: The valid and the rejected rows.
+    """
+    adapter = get_list_adapter(model)
+    checked = select_rows_to_check(len(data), policy=policy, sample_rate=sample_rate)
+    reasons: dict[int, list[str]] = {}
+    try:
+        validated = adapter.validate_python([data[i] for i in checked])
+    except ValidationError as e:
+        for error in e.errors():
+            reasons.setdefault(checked[error["loc"][0]], []).append(format_error(error))
+        validated = None
+
+    result = ValidationResult()
+    result.rejected = [{"payload": data[i], "reason": "; ".join(reason)} for i, reason in reasons.items()]
+    if policy == "full":
+        if validated is None:
+            validated = adapter.validate_python([item for i, item in enumerate(data) if i not in reasons])
+        result.valid = adapter.dump_python(validated)
+    else:
+        result.valid = [item for i, item in enumerate(data) if i not in reasons]
+    return result
+
+
+def validate_json_batch(
+    body: bytes,
+    model: Type[BaseModel],
+    policy: ValidationPolicy = "full",
+    sample_rate: float = VALIDATION_SAMPLE_RATE,
+) -> DecodedBatch:
+    """
+    Decodes and validates a raw JSON array of rows.
+
+    With the "full" policy the response is decoded and validated in a single pass by `get_json_adapter`. Only when
+    that fails, i.e. when the response holds invalid rows, it is decoded again and validated row by row with
+    `validate_batch` to find the rejected rows. The other policies decode the response and use `validate_batch`.
+
+    Args:
+        body (bytes): The raw response body.
+        model (Type[BaseModel]): The Pydantic model to validate against.
+        policy (ValidationPolicy, optional): The validation policy. Defaults to "full".
+        sample_rate (float, optional): The fraction of rows to check with the "sampled" policy.
+            Defaults to VALIDATION_SAMPLE_RATE.
+
+    Returns:
+        DecodedBatch: The valid and the rejected rows, and the size and last row of the response.
+    """
+    if policy == "full":
+        try:
+            valid = get_json_adapter(model).validate_json(body)
+        except ValidationError:
+            pass
+        else:
+            return DecodedBatch(valid=valid, n_rows=len(valid), last_row=valid[-1] if valid else None)
+
+    data = json.loads(body)
+    result = validate_batch(data=data, model=model, policy=policy, sample_rate=sample_rate)
+    return DecodedBatch(
+        valid=result.valid, rejected=result.rejected, n_rows=len(data), last_row=data[-1] if data else None
+    )
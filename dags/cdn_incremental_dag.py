@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from airflow.decorators import dag
+from airflow.operators.python import PythonOperator
+from airflow_assessment.constant import INCREMENTAL_SCHEDULE
+from airflow_assessment.tasks import ingest_transactions_incremental, prep_database
+
+
+# Micro-batches of the transactions that arrived since the last committed page of every source. Runs never overlap,
+# so every source has a single writer advancing its watermark.
+@dag(
+    schedule=INCREMENTAL_SCHEDULE,
+    start_date=datetime(2024, 1, 1),
+    catchup=False,
+    max_active_runs=1,
+    tags=["cdn_ingestion"],
+)
+def ingest_incremental():
+    prep_database_task = PythonOperator(
+        task_id="prep_database",
+        python_callable=prep_database,
+    )
+
+    for source in ["sepa", "swift"]:
+        ingest_task = PythonOperator(
+            task_id=f"ingest_transactions_{source}",
+            python_callable=ingest_transactions_incremental,
+            op_kwargs={"url_suffix": source},
+            retries=3,
+        )
+        prep_database_task >> ingest_task
+
+
+ingest_incremental()
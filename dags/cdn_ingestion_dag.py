@@ -2,11 +2,14 @@ from datetime import datetime
 
 from airflow.decorators import dag
 from airflow.operators.python import PythonOperator
-from airflow_assessment.database import prep_database
-from airflow_assessment.ingest import (
+from airflow_assessment.constant import TRANSACTION_WINDOW_HOURS
+from airflow_assessment.tasks import (
+    finalize_transaction_month,
     ingest_companies,
     ingest_rates,
-    retrieve_trades_single_day,
+    ingest_transaction_window,
+    plan_transaction_windows,
+    prep_database,
 )
 
 
@@ -23,31 +26,36 @@ def create_summaries():
         provide_context=True,
     )
 
-    ingest_daily_trades_sepa_task = PythonOperator(
-        task_id="ingest_daily_rates_sepa",
-        python_callable=retrieve_trades_single_day,
-        provide_context=True,
-        op_kwargs={"url_suffix": "sepa"},
-    )
-
-    ingest_daily_trades_swift_task = PythonOperator(
-        task_id="ingest_daily_rates_swift",
-        python_callable=retrieve_trades_single_day,
-        provide_context=True,
-        op_kwargs={"url_suffix": "swift"},
-    )
-
     ingest_rates_task = PythonOperator(
         task_id="ingest_rates",
         python_callable=ingest_rates,
     )
 
-    prep_database_task >> [
-        ingest_companies_task,
-        ingest_daily_trades_sepa_task,
-        ingest_daily_trades_swift_task,
-        ingest_rates_task,
-    ]
+    prep_database_task >> [ingest_companies_task, ingest_rates_task]
+
+    # Every source is ingested in windows of TRANSACTION_WINDOW_HOURS, one mapped task per window, so a month spreads
+    # over the available worker slots and a failed window is retried on its own.
+    for source in ["sepa", "swift"]:
+        plan_windows_task = PythonOperator(
+            task_id=f"plan_transaction_windows_{source}",
+            python_callable=plan_transaction_windows,
+            op_kwargs={"url_suffix": source, "window_hours": TRANSACTION_WINDOW_HOURS},
+        )
+
+        ingest_windows_task = PythonOperator.partial(
+            task_id=f"ingest_transactions_{source}",
+            python_callable=ingest_transaction_window,
+            retries=3,
+        ).expand(op_kwargs=plan_windows_task.output)
+
+        finalize_month_task = PythonOperator(
+            task_id=f"finalize_transactions_{source}",
+            python_callable=finalize_transaction_month,
+            op_kwargs={"url_suffix": source},
+        )
+
+        # The windows are enriched with the rates and companies in the database, so those are ingested first.
+        [ingest_companies_task, ingest_rates_task] >> plan_windows_task >> ingest_windows_task >> finalize_month_task
 
 
 create_summaries()
@@ -16,14 +16,13 @@ def create_views():
         task_id="create_view_transaction_enriched",
         postgres_conn_id=POSTGRES_CON_ID,
         sql="""
-            CREATE OR REPLACE VIEW "transaction_enriched" AS 
-            select 
-                t.*, 
-                t.amount * r.eur_rate as eur_amount, 
-                SUBSTRING(t.payer, 0, 3) as "country_payer", 
-                SUBSTRING(t.receiver, 0, 3) as "country_receiver"
+            -- The enrichment is stored on the transactions since it moved to the ingest, and a replaced view cannot
+            -- change its columns. The views that depended on it are dropped along and recreated after it.
+            DROP VIEW IF EXISTS "transaction_enriched" CASCADE;
+            CREATE VIEW "transaction_enriched" AS
+            select t.*
             from transaction t
-            join rate r on t.currency = r.currency;
+            where t.eur_amount is not null;
             """,
     )
 
@@ -34,13 +33,8 @@ def create_views():
             CREATE OR REPLACE VIEW "account_balance" as
             select c.name, b.*
             from (
-                select account, sum(mutation)
-                from (
-                    select payer as account, -eur_amount as "mutation"
-                from transaction_enriched te
-                UNION 
-                select receiver as account, eur_amount as "mutation"
-                from transaction_enriched)
+                select account, sum(balance)
+                from account_month_balance
                 group by account
                 ) as b
             join company c on c.iban = b.account;
@@ -53,18 +47,12 @@ def create_views():
         sql="""
             CREATE OR REPLACE VIEW "interacted_countries" as
             select distinct account, interaction_country
-            from (
-                select payer as account, country_receiver as interaction_country
-                from transaction_enriched
-                union
-                select receiver as account, country_payer as interaction_country
-                from transaction_enriched
-            )
+            from account_month_country
             ORDER BY account
         """,
     )
 
-    [create_view_transaction_enriched, create_view_balances, create_view_interacted_countries_enriched]
+    create_view_transaction_enriched >> [create_view_balances, create_view_interacted_countries_enriched]
 
 
 @dag(schedule=None, default_args=default_args, tags=["SQL"])
@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytz
+from airflow_assessment.aggregates import refresh_aggregates
+
+
+class RecordingEngine:
+    def __init__(self):
+        self.statements = []
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return type("Result", (), {"rowcount": 0})()
+
+
+def test_refresh_aggregates_for_interval():
+    engine = RecordingEngine()
+    refresh_aggregates(
+        engine,
+        start_date=pytz.utc.localize(datetime(2022, 1, 15)),
+        end_date=pytz.utc.localize(datetime(2022, 1, 31, 23, 59)),
+        source="sepa",
+    )
+
+    deletes, inserts = engine.statements[:2], engine.statements[2:]
+    assert [statement.split(" WHERE ")[0] for statement, _ in deletes] == [
+        'DELETE FROM "account_month_balance"',
+        'DELETE FROM "account_month_country"',
+    ]
+    assert all("month >= :month_from" in statement and "source = :source" in statement for statement, _ in deletes)
+    assert all("t.timestamp < :month_to AND t.source = :source" in statement for statement, _ in inserts)
+    # The EUR amounts stored at ingest are aggregated, the rates are not joined again.
+    assert all("t.eur_amount" in statement and "rate" not in statement for statement, _ in inserts)
+    assert engine.statements[0][1] == {
+        "month_from": datetime(2022, 1, 1),
+        "month_to": datetime(2022, 2, 1),
+        "source": "sepa",
+    }
+
+
+def test_refresh_aggregates_all_months():
+    engine = RecordingEngine()
+    refresh_aggregates(engine)
+
+    assert len(engine.statements) == 4
+    assert all(params == {} for _, params in engine.statements)
+    assert engine.statements[0][0] == 'DELETE FROM "account_month_balance" WHERE TRUE'
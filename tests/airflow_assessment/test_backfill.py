@@ -0,0 +1,65 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from airflow_assessment import backfill
+from airflow_assessment.backfill import BackfillState, BackfillUnit, main, plan_units, run_backfill
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def retrieve_trades_single_day(url_suffix, ts, **kwargs):
+        calls.append((url_suffix, ts))
+        if ts.startswith("2021-02") and url_suffix == "swift":
+            raise RuntimeError("API down")
+
+    monkeypatch.setattr(backfill, "retrieve_trades_single_day", retrieve_trades_single_day)
+    return calls
+
+
+def test_plan_units():
+    units = plan_units(datetime(2021, 11, 15), datetime(2022, 1, 1), sources=["sepa", "swift"])
+
+    assert [unit.key for unit in units] == [
+        "sepa/2021-11",
+        "swift/2021-11",
+        "sepa/2021-12",
+        "swift/2021-12",
+        "sepa/2022-01",
+        "swift/2022-01",
+    ]
+    assert units[0].month == datetime(2021, 11, 1, tzinfo=timezone.utc)
+
+
+def test_run_backfill_resumes_and_records_failures(loads, tmp_path):
+    units = plan_units(datetime(2021, 1, 1), datetime(2021, 2, 1), sources=["sepa", "swift"])
+    state = BackfillState(str(tmp_path / "state.json"))
+    state.mark_done(units[0], seconds=1.0)
+
+    failed = run_backfill(units, state=state, workers=1)
+
+    assert loads == [
+        ("swift", "2021-01-01T00:00:00+00:00"),
+        ("sepa", "2021-02-01T00:00:00+00:00"),
+        ("swift", "2021-02-01T00:00:00+00:00"),
+    ]
+    assert failed == [BackfillUnit(source="swift", month=units[3].month)]
+    # The failed unit is left for the next run.
+    assert sorted(json.loads((tmp_path / "state.json").read_text())) == [
+        "sepa/2021-01",
+        "sepa/2021-02",
+        "swift/2021-01",
+    ]
+
+
+def test_main_dry_run(loads, tmp_path, capsys):
+    state = BackfillState(str(tmp_path / "state.json"))
+    state.mark_done(BackfillUnit(source="sepa", month=datetime(2021, 1, 1, tzinfo=timezone.utc)), seconds=1.0)
+
+    exit_code = main(["--start", "2021-01", "--end", "2021-01", "--dry-run", "--state", str(tmp_path / "state.json")])
+
+    assert exit_code == 0
+    assert capsys.readouterr().out.splitlines() == ["sepa/2021-01 done", "swift/2021-01 todo"]
+    assert loads == []
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from airflow_assessment.change_detection import diff_frames, fingerprint_frame
+
+
+@pytest.fixture
+def stored():
+    return pd.DataFrame({"currency": ["EUR", "USD", "GBP"], "usd_rate": [1.1, 1.0, 1.3], "eur_rate": [1.0, 0.9, None]})
+
+
+def test_fingerprint_frame_ignores_row_order(stored):
+    shuffled = stored.iloc[[2, 0, 1]]
+    assert fingerprint_frame(stored, ["currency"]) == fingerprint_frame(shuffled, ["currency"])
+
+
+def test_fingerprint_frame_detects_changes(stored):
+    changed = stored.assign(usd_rate=[1.1, 1.0, 1.4])
+    assert fingerprint_frame(stored, ["currency"]) != fingerprint_frame(changed, ["currency"])
+
+
+def test_diff_frames_without_changes(stored):
+    # Column order and null representation differ between the API and the database.
+    current = stored[["eur_rate", "usd_rate", "currency"]].astype(object)
+    current = current.astype({"eur_rate": float, "usd_rate": float})
+    assert diff_frames(current, stored.astype(object), ["currency"]).is_empty
+
+
+def test_diff_frames(stored):
+    current = pd.DataFrame(
+        {"currency": ["EUR", "USD", "JPY"], "usd_rate": [1.1, 1.05, 0.01], "eur_rate": [1.0, 0.9, 0.01]}
+    )
+    changes = diff_frames(current, stored, ["currency"])
+
+    assert changes.inserted["currency"].tolist() == ["JPY"]
+    assert changes.updated["currency"].tolist() == ["USD"]
+    assert changes.deleted["currency"].tolist() == ["GBP"]
+    assert str(changes) == "1 inserted, 1 updated, 1 deleted"
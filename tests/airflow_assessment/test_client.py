@@ -0,0 +1,121 @@
+import gzip
+import io
+
+import pytest
+import requests
+import urllib3
+from airflow_assessment.client import CdmApiClient, CdmApiError, RequestStats, get_cdm_client, parse_retry_after
+
+
+def make_response(status_code: int, body: bytes = b"[]", headers: dict | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def client():
+    return CdmApiClient(max_retries=2, backoff_factor=0)
+
+
+def patch_responses(monkeypatch, client, responses):
+    calls = []
+
+    def get(url, params=None, timeout=None):
+        calls.append(timeout)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(client.session, "get", get)
+    return calls
+
+
+def test_get_json_retries_server_errors_and_timeouts(monkeypatch, client):
+    responses = [make_response(503), requests.Timeout(), make_response(200, b'[{"currency": "EUR"}]')]
+    calls = patch_responses(monkeypatch, client, responses)
+
+    assert client.get_json("http://cdm/exchange-rates") == [{"currency": "EUR"}]
+    assert calls == [client.timeout] * 3
+    summary = client.stats.summary()
+    assert summary["requests"] == 3
+    assert summary["retries"] == 2
+    assert summary["bytes_decoded"] == len(b'[{"currency": "EUR"}]')
+
+
+def test_get_json_counts_the_compressed_bytes_on_the_wire(monkeypatch, client):
+    body = b'[{"currency": "EUR"}]' * 100
+    compressed = gzip.compress(body)
+    response = requests.Response()
+    response.status_code = 200
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(compressed), headers={"Content-Encoding": "gzip"}, status=200, preload_content=False
+    )
+    patch_responses(monkeypatch, client, [response])
+
+    client.get_bytes("http://cdm/exchange-rates")
+
+    summary = client.stats.summary()
+    assert summary["bytes_on_wire"] == len(compressed)
+    assert summary["bytes_decoded"] == len(body)
+
+
+def test_get_json_does_not_retry_client_errors(monkeypatch, client):
+    patch_responses(monkeypatch, client, [make_response(404)])
+    with pytest.raises(CdmApiError):
+        client.get_json("http://cdm/unknown")
+    assert client.stats.failures == 1
+
+
+def test_get_json_gives_up_after_max_retries(monkeypatch, client):
+    patch_responses(monkeypatch, client, [make_response(500)] * 3)
+    with pytest.raises(CdmApiError):
+        client.get_json("http://cdm/companies")
+    assert client.stats.retries == 2
+
+
+def test_get_json_retries_too_many_requests_and_backs_off(monkeypatch, client):
+    patch_responses(monkeypatch, client, [make_response(429, headers={"Retry-After": "0"}), make_response(200)])
+    controller = client.controller("http://cdm/transactions/sepa?limit=10")
+    for _ in range(6):
+        controller.on_success(latency=0.01, n_bytes=10)
+    page_size, concurrency = controller.page_size, controller.concurrency
+
+    assert client.get_json("http://cdm/transactions/sepa", params="limit=10") == []
+    assert client.stats.retries == 1
+    assert controller.page_size < page_size
+    assert controller.concurrency < concurrency
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_request_stats_summarize_since_a_snapshot():
+    stats = RequestStats()
+    stats.record(latency=0.2, bytes_on_wire=10, bytes_decoded=20)
+    snapshot = stats.snapshot()
+    for _ in range(1000):
+        stats.record(latency=0.02, bytes_on_wire=1, bytes_decoded=2)
+
+    summary = stats.summary(since=snapshot)
+    assert summary["requests"] == 1000
+    assert summary["bytes_on_wire"] == 1000
+    assert summary["latency_mean"] == pytest.approx(0.02)
+    assert summary["latency_p95"] == 0.025
+    assert stats.summary()["requests"] == 1001
+    # The latencies are bucketed, not kept one by one.
+    assert stats.latency.count == 1001 and len(stats.latency.counts) == len(stats.latency.buckets)
+
+
+def test_session_requests_compression(client):
+    assert "gzip" in client.session.headers["Accept-Encoding"]
+
+
+def test_get_cdm_client_is_shared():
+    assert get_cdm_client() is get_cdm_client()
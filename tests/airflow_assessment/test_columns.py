@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+from airflow_assessment.columns import ColumnBuffer, timestamps_to_series
+
+
+def test_timestamps_are_converted_from_datetimes_and_strings():
+    expected = pd.Series(pd.to_datetime(["2022-01-01T10:00:00.000001Z"], utc=True))
+
+    parsed = timestamps_to_series([datetime(2022, 1, 1, 10, 0, 0, 1, tzinfo=timezone.utc)])
+    from_strings = timestamps_to_series(["2022-01-01T10:00:00.000001Z"])
+
+    pd.testing.assert_series_equal(parsed, expected)
+    pd.testing.assert_series_equal(from_strings, expected)
+
+
+def test_column_buffer_builds_typed_columns():
+    buffer = ColumnBuffer()
+    buffer.extend([{"id": "1", "amount": 1.5, "currency": "EUR", "timestamp": "2022-01-01T10:00:00.000000Z"}])
+    buffer.extend([])
+    buffer.extend([{"id": "2", "amount": 2.0, "currency": "USD", "timestamp": "2022-01-01T11:00:00.000000Z", "x": 1}])
+
+    frame = buffer.to_frame()
+
+    assert len(buffer) == 2
+    assert frame["id"].tolist() == ["1", "2"]
+    assert str(frame["id"].dtype) == "string"
+    assert isinstance(frame["currency"].dtype, pd.CategoricalDtype)
+    assert str(frame["timestamp"].dtype) == "datetime64[ns, UTC]"
+    assert frame["amount"].tolist() == [1.5, 2.0]
+    # Columns that are missing from earlier pages are filled with None.
+    assert frame["x"].isna().tolist() == [True, False]
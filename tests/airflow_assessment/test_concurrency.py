@@ -0,0 +1,80 @@
+import threading
+
+from airflow_assessment.concurrency import ENDPOINT_LIMITS, AimdController, EndpointLimits
+
+LIMITS = EndpointLimits(
+    min_page_size=100,
+    max_page_size=1000,
+    initial_page_size=400,
+    page_size_step=100,
+    initial_concurrency=1,
+    max_concurrency=4,
+    target_latency=1.0,
+    max_page_bytes=10_000,
+    decrease_factor=0.5,
+)
+
+
+def test_fast_pages_increase_additively_up_to_the_ceilings():
+    controller = AimdController("/transactions/sepa", limits=LIMITS)
+    assert controller.summary() == {"page_size": 400, "concurrency": 1}
+
+    controller.on_success(latency=0.1, n_bytes=100)
+    assert controller.page_size == 500
+    assert controller.concurrency == 2
+
+    for _ in range(50):
+        controller.on_success(latency=0.1, n_bytes=100)
+    assert controller.summary() == {"page_size": 1000, "concurrency": 4}
+
+
+def test_slow_or_large_pages_decrease_the_page_size_only():
+    controller = AimdController("/transactions/sepa", limits=LIMITS)
+    for _ in range(10):
+        controller.on_success(latency=0.1, n_bytes=100)
+    concurrency = controller.concurrency
+
+    controller.on_success(latency=2.0, n_bytes=100)
+    assert controller.page_size == 500
+    controller.on_success(latency=0.1, n_bytes=20_000)
+    assert controller.page_size == 250
+    assert controller.concurrency == concurrency
+
+
+def test_overload_decreases_multiplicatively_down_to_the_floors():
+    controller = AimdController("/transactions/sepa", limits=LIMITS)
+    for _ in range(50):
+        controller.on_success(latency=0.1, n_bytes=100)
+
+    controller.on_overload()
+    assert controller.summary() == {"page_size": 500, "concurrency": 2}
+    for _ in range(10):
+        controller.on_overload()
+    assert controller.summary() == {"page_size": 100, "concurrency": 1}
+
+
+def test_endpoint_limits_apply_by_path():
+    assert AimdController("/transactions/swift").limits == ENDPOINT_LIMITS["/transactions/swift"]
+    assert AimdController("/transactions/sepa").limits == EndpointLimits()
+
+
+def test_slot_caps_requests_in_flight():
+    controller = AimdController("/transactions/sepa", limits=LIMITS)
+    controller.on_success(latency=0.1, n_bytes=100)
+    assert controller.concurrency == 2
+
+    peak, lock, release = [0], threading.Lock(), threading.Event()
+
+    def request():
+        with controller.slot():
+            with lock:
+                peak[0] = max(peak[0], controller.in_flight)
+            release.wait(timeout=0.05)
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert controller.in_flight == 0
@@ -0,0 +1,317 @@
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+import pytz
+from airflow.models import Connection
+from airflow_assessment import database
+from airflow_assessment.database import (
+    copy_to_database,
+    create_partitioned_transaction_table,
+    delete_rows_from_interval,
+    dispose_engines,
+    ensure_transaction_partitions,
+    frame_to_csv_buffer,
+    get_connection_with_airflow_conn_id,
+    get_engine_from_airflow_conn_id,
+    insert_from_staging,
+    partition_transaction_table,
+    qualified_table_name,
+    replace_interval_from_staging,
+    transaction_partition_for_interval,
+    transaction_partition_name,
+    write_to_database,
+)
+from airflow_assessment.models.alchemy import RateModel, TransactionModel
+from sqlalchemy.dialects import postgresql
+
+
+class FakeCursor:
+    def __init__(self, statements: list):
+        self.statements = statements
+
+    def copy_expert(self, statement, buffer):
+        self.statements.append((statement, buffer.read()))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, statements: list):
+        self.statements = statements
+        self.committed = False
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeEngine:
+    def __init__(self, results: dict | None = None):
+        self.statements = []
+        self.params = []
+        self.connections = []
+        # The results of queries, by a part of the statement.
+        self.results = results or {}
+
+    def raw_connection(self):
+        connection = FakeConnection(self.statements)
+        self.connections.append(connection)
+        return connection
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, statement, *args):
+        if hasattr(statement, "compile"):
+            statement = statement.compile(dialect=postgresql.dialect())
+        self.statements.append(str(statement))
+        self.params.append(args[0] if args else None)
+        result = next((value for key, value in self.results.items() if key in str(statement)), None)
+        return SimpleNamespace(
+            scalar=lambda: result, first=lambda: result, fetchall=lambda: result, rowcount=result or 0
+        )
+
+
+@pytest.fixture
+def rates():
+    return pd.DataFrame({"currency": ["EUR", "USD", None], "usd_rate": [1.1, 1.0, 2.0], "eur_rate": [1.0, 0.9, None]})
+
+
+def test_qualified_table_name():
+    assert qualified_table_name(RateModel) == '"rate"'
+
+
+def test_insert_from_staging():
+    assert insert_from_staging(RateModel, staging="s", columns=["currency"]) == (
+        'INSERT INTO "rate" ("currency") SELECT "currency" FROM s'
+    )
+    assert insert_from_staging(TransactionModel, staging="s", columns=["trade_id"], skip_duplicates=True) == (
+        'INSERT INTO "transaction" ("trade_id") SELECT "trade_id" FROM s ON CONFLICT DO NOTHING'
+    )
+
+
+def test_frame_to_csv_buffer(rates):
+    lines = frame_to_csv_buffer(rates).read().splitlines()
+    assert lines == ["EUR,1.1,1.0", "USD,1.0,0.9", "\\N,2.0,\\N"]
+
+
+def test_copy_to_database_chunks(rates):
+    engine = FakeEngine()
+    rows = copy_to_database(engine=engine, model=RateModel, data=rates, chunk_size=2)
+
+    assert rows == 3
+    assert len(engine.connections) == 1
+    assert engine.connections[0].committed
+    assert [statement for statement, _ in engine.statements] == [
+        """COPY "rate" ("currency", "usd_rate", "eur_rate") FROM STDIN WITH (FORMAT csv, NULL '\\N')"""
+    ] * 2
+    assert "".join(body for _, body in engine.statements).count("\n") == 3
+
+
+def test_copy_to_database_parallel(rates):
+    engine = FakeEngine()
+    rows = copy_to_database(engine=engine, model=RateModel, data=rates, chunk_size=1, n_connections=2)
+
+    assert rows == 3
+    assert len(engine.connections) == 2
+    assert all(connection.committed for connection in engine.connections)
+
+
+def test_write_to_database_copy_rejects_fail(rates):
+    with pytest.raises(ValueError):
+        write_to_database(engine=FakeEngine(), model=RateModel, data=rates, if_exists="fail", method="copy")
+
+
+@pytest.fixture
+def secrets(monkeypatch):
+    lookups = []
+
+    def get_connection_from_secrets(conn_id):
+        lookups.append(conn_id)
+        host = "db" if len(lookups) < 3 else "db-2"
+        return Connection(conn_id=conn_id, conn_type="postgres", host=host, login="user", schema="cdm", port=5432)
+
+    monkeypatch.setattr(database.Connection, "get_connection_from_secrets", get_connection_from_secrets)
+    dispose_engines()
+    yield lookups
+    dispose_engines()
+
+
+def test_get_engine_from_airflow_conn_id_is_cached(secrets):
+    engine = get_engine_from_airflow_conn_id(conn_id="postgres-details")
+
+    assert get_engine_from_airflow_conn_id(conn_id="postgres-details") is engine
+    assert get_connection_with_airflow_conn_id(conn_id="postgres-details").host == "db"
+    assert secrets == ["postgres-details"]
+    assert engine.pool.size() == database.DB_POOL_SIZE
+
+
+def test_get_engine_from_airflow_conn_id_expires(secrets):
+    engine = get_engine_from_airflow_conn_id(conn_id="postgres-details")
+
+    # The second lookup returns the same connection, so the engine is kept.
+    assert get_engine_from_airflow_conn_id(conn_id="postgres-details", ttl=0) is engine
+    # The third lookup returns another host, so the engine is replaced.
+    replaced = get_engine_from_airflow_conn_id(conn_id="postgres-details", ttl=0)
+    assert replaced is not engine
+    assert replaced.url.host == "db-2"
+    assert len(secrets) == 3
+
+
+def test_get_engine_from_airflow_conn_id_is_cached_per_options(secrets):
+    engine = get_engine_from_airflow_conn_id(conn_id="postgres-details")
+    small = get_engine_from_airflow_conn_id(conn_id="postgres-details", pool_size=1)
+
+    assert small is not engine
+    assert small.pool.size() == 1
+    assert get_engine_from_airflow_conn_id(conn_id="postgres-details", pool_size=1) is small
+
+
+def test_get_connection_with_airflow_conn_id_expires(secrets):
+    get_connection_with_airflow_conn_id(conn_id="postgres-details", ttl=0)
+    get_connection_with_airflow_conn_id(conn_id="postgres-details", ttl=0)
+
+    assert secrets == ["postgres-details", "postgres-details"]
+
+
+def test_transaction_partition_name():
+    assert transaction_partition_name(datetime(2022, 1, 15)) == "transaction_y2022m01"
+    assert transaction_partition_name(datetime(2022, 12, 1), source="swift") == "transaction_y2022m12_swift"
+    with pytest.raises(ValueError):
+        transaction_partition_name(datetime(2022, 1, 1), source="sepa'; DROP TABLE company; --")
+
+
+def test_transaction_partition_for_interval():
+    start = pytz.utc.localize(datetime(2022, 2, 1))
+    assert (
+        transaction_partition_for_interval(
+            start, pytz.utc.localize(datetime(2022, 2, 28, 23, 59, 59, 999999)), source="sepa"
+        )
+        == '"transaction_y2022m02_sepa"'
+    )
+    assert transaction_partition_for_interval(start, pytz.utc.localize(datetime(2022, 2, 2)), source="sepa") is None
+
+
+def test_create_partitioned_transaction_table(monkeypatch):
+    engine = FakeEngine()
+    existing = [{"name": name} for name in ["id", "trade_id", "payer", "receiver", "amount", "currency", "timestamp"]]
+    monkeypatch.setattr(
+        database, "inspect", lambda connection: SimpleNamespace(get_columns=lambda *args, **kw: existing)
+    )
+
+    added = create_partitioned_transaction_table(engine)
+
+    create_table = next(statement for statement in engine.statements if statement.startswith("CREATE TABLE"))
+    assert "PRIMARY KEY (id, timestamp, source)" in create_table
+    assert create_table.endswith("PARTITION BY RANGE (timestamp)")
+    assert "\"source\" VARCHAR" in create_table
+    assert any("USING brin" in statement for statement in engine.statements)
+    # An existing table gets the columns it is missing.
+    assert added[:2] == ["source", "eur_amount"]
+    assert 'ALTER TABLE "transaction" ADD COLUMN IF NOT EXISTS "eur_amount" FLOAT' in engine.statements
+
+
+@pytest.mark.parametrize("kind, n_partitions", [("p", 3), ("r", 0)])
+def test_ensure_transaction_partitions_skips_unpartitioned_tables(kind, n_partitions):
+    engine = FakeEngine(results={"relkind FROM pg_class": kind})
+    start = pytz.utc.localize(datetime(2022, 1, 1))
+
+    ensure_transaction_partitions(engine, start_date=start, end_date=start, sources=["sepa", "swift"])
+
+    assert len([statement for statement in engine.statements if "PARTITION OF" in statement]) == n_partitions
+
+
+@pytest.mark.parametrize("exists, truncated", [("transaction_y2022m01_sepa", True), (None, False)])
+def test_replace_interval_from_staging_truncates_existing_partitions_only(exists, truncated):
+    engine = FakeEngine(results={"SELECT to_regclass": exists})
+    start, end = pytz.utc.localize(datetime(2022, 1, 1)), pytz.utc.localize(datetime(2022, 1, 31, 23, 59))
+
+    replace_interval_from_staging(
+        engine,
+        TransactionModel,
+        staging="staging",
+        columns=["trade_id"],
+        start_date=start,
+        end_date=end,
+        timestamp_col="timestamp",
+        source="sepa",
+        partition='"transaction_y2022m01_sepa"',
+    )
+
+    assert any(statement.startswith("TRUNCATE") for statement in engine.statements) == truncated
+    assert any(statement.startswith("DELETE") for statement in engine.statements) != truncated
+
+
+def test_delete_rows_from_interval_binds_parameters():
+    engine = FakeEngine()
+    amsterdam = pytz.timezone("Europe/Amsterdam")
+    start, end = amsterdam.localize(datetime(2022, 1, 1, 1)), amsterdam.localize(datetime(2022, 1, 2, 1))
+
+    delete_rows_from_interval(engine, TransactionModel, start, end, timestamp_col="timestamp", source="sepa'--")
+
+    assert engine.statements == [
+        'DELETE FROM "transaction" WHERE "timestamp" BETWEEN %(start_date)s AND %(end_date)s AND source = %(source)s'
+    ]
+    # The naive timestamp column stores UTC, so the bounds are bound as naive UTC, whatever the session time zone.
+    assert engine.params == [
+        {"start_date": datetime(2022, 1, 1), "end_date": datetime(2022, 1, 2), "source": "sepa'--"}
+    ]
+
+
+def test_partition_transaction_table_moves_a_baseline_table(monkeypatch):
+    # The transaction table as the baseline created it, with an identity id and without a source.
+    baseline = [{"name": name} for name in ["id", "trade_id", "payer", "receiver", "amount", "currency", "timestamp"]]
+    columns = {"transaction_unpartitioned": baseline + [{"name": "source"}], "transaction": []}
+    monkeypatch.setattr(
+        database,
+        "inspect",
+        lambda connection: SimpleNamespace(get_columns=lambda name, **kw: columns[name]),
+    )
+    engine = FakeEngine(
+        results={
+            "relkind FROM pg_class": "r",
+            "FROM pg_index": [("transaction_pkey",)],
+            'min("timestamp")': (datetime(2021, 1, 5), datetime(2021, 2, 3)),
+            "DISTINCT COALESCE": [("legacy",)],
+            "INSERT INTO": 10,
+        }
+    )
+
+    assert partition_transaction_table(engine) == 10
+
+    statements = engine.statements
+    position = {
+        key: next(i for i, statement in enumerate(statements) if statement.startswith(key))
+        for key in [
+            'ALTER TABLE "transaction" RENAME TO "transaction_unpartitioned"',
+            'ALTER INDEX "transaction_pkey" RENAME TO "transaction_pkey_unpartitioned"',
+            'ALTER TABLE "transaction_unpartitioned" ALTER COLUMN "id" DROP IDENTITY',
+            'CREATE TABLE IF NOT EXISTS "transaction" (',
+            'CREATE TABLE IF NOT EXISTS "transaction_y2021m02_legacy"',
+            'INSERT INTO "transaction"',
+            "SELECT setval",
+            'DROP TABLE "transaction_unpartitioned"',
+        ]
+    }
+    assert list(position.values()) == sorted(position.values())
+    insert = statements[position['INSERT INTO "transaction"']]
+    assert '"source"' in insert and "COALESCE" in insert and '"eur_amount"' not in insert
+
+
+def test_partition_transaction_table_skips_partitioned_tables():
+    engine = FakeEngine(results={"relkind FROM pg_class": "p"})
+    assert partition_transaction_table(engine) == 0
+    assert not any("RENAME" in statement for statement in engine.statements)
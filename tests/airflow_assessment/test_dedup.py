@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from airflow_assessment.dedup import CONTENT_HASH_COL, SeenHashes, content_hashes, drop_duplicate_trades
+
+
+@pytest.fixture
+def trades():
+    return pd.DataFrame(
+        {
+            "trade_id": ["1", "2", "1", "3"],
+            "payer": ["NL01", "NL02", "NL01", "NL03"],
+            "receiver": ["DE01", "DE02", "DE01", "DE03"],
+            "amount": [1.0, 2.0, 1.0, 3.0],
+            "currency": ["EUR", "USD", "EUR", "EUR"],
+            "timestamp": pd.to_datetime(["2022-01-01", "2022-01-02", "2022-01-01", "2022-01-04"], utc=True),
+            "source": ["sepa"] * 4,
+        }
+    )
+
+
+def test_content_hashes_ignore_dtypes(trades):
+    typed = trades.astype(
+        {
+            "trade_id": "string[pyarrow]",
+            "currency": "category",
+            "timestamp": "datetime64[us, UTC]",
+            "source": "category",
+        }
+    )
+    assert content_hashes(typed).tolist() == content_hashes(trades).tolist()
+    assert content_hashes(trades).dtype == "int64"
+
+
+def test_content_hashes_include_timestamp(trades):
+    hashes = content_hashes(trades)
+    assert hashes[0] == hashes[2]
+    assert hashes.nunique() == 3
+    later = trades.assign(timestamp=trades["timestamp"] + pd.Timedelta(seconds=1))
+    assert content_hashes(later)[0] != hashes[0]
+
+
+def test_drop_duplicate_trades(trades):
+    deduplicated = drop_duplicate_trades(trades)
+    assert deduplicated["trade_id"].tolist() == ["1", "2", "3"]
+    assert deduplicated[CONTENT_HASH_COL].tolist() == content_hashes(trades).iloc[[0, 1, 3]].tolist()
+
+
+def test_drop_duplicate_trades_across_batches(trades):
+    seen = SeenHashes()
+    first = drop_duplicate_trades(trades.iloc[:2], seen=seen)
+    second = drop_duplicate_trades(trades.iloc[2:], seen=seen)
+    assert first["trade_id"].tolist() == ["1", "2"]
+    assert second["trade_id"].tolist() == ["3"]
+    assert len(seen) == 3
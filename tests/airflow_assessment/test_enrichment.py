@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+from airflow_assessment.enrichment import EnrichmentIndex, enrich_trades, refresh_enrichment
+
+
+def test_enrich_trades():
+    index = EnrichmentIndex.from_frames(
+        rates=pd.DataFrame({"currency": ["EUR", "USD"], "eur_rate": [1.0, 0.5]}),
+        companies=pd.DataFrame({"iban": ["NL01BANK", "DE02BANK"], "company_id": [1, 2]}),
+    )
+    trades = pd.DataFrame(
+        {
+            "payer": pd.array(["NL01BANK", "GB03BANK", "DE02BANK"], dtype="string[pyarrow]"),
+            "receiver": ["DE02BANK", "NL01BANK", "FR04BANK"],
+            "amount": [10.0, 20.0, 30.0],
+            "currency": pd.Categorical(["EUR", "USD", "JPY"]),
+        }
+    )
+
+    enriched = enrich_trades(trades, index)
+
+    assert enriched["eur_amount"].tolist()[:2] == [10.0, 10.0]
+    # A currency without a rate gets no EUR amount and an unknown IBAN no company.
+    assert pd.isna(enriched["eur_amount"].iloc[2])
+    assert enriched["payer_company_id"].tolist() == [1, pd.NA, 2]
+    assert enriched["receiver_company_id"].tolist() == [2, 1, pd.NA]
+    assert enriched["country_payer"].tolist() == ["NL", "GB", "DE"]
+    assert enriched["country_receiver"].tolist() == ["DE", "NL", "FR"]
+    assert "eur_amount" not in trades.columns
+
+
+class RecordingEngine:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return type("Result", (), {"fetchall": lambda result: self.rows})()
+
+
+def test_refresh_enrichment_for_currencies():
+    engine = RecordingEngine(rows=[(datetime(2022, 1, 1), "sepa")])
+
+    months = refresh_enrichment(engine, currencies=["USD"])
+
+    assert months == [(datetime(2022, 1, 1), "sepa")]
+    [(statement, params)] = engine.statements
+    assert params == {"currencies": ["USD"]}
+    # Only the transactions in the changed currencies whose EUR amount differs are rewritten.
+    assert "(t.currency = ANY(:currencies))" in statement
+    assert "t.eur_amount IS DISTINCT FROM" in statement
+    assert "RETURNING t.timestamp, t.source" in statement
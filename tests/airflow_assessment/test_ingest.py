@@ -0,0 +1,258 @@
+import json
+from datetime import datetime, timedelta
+from itertools import chain
+
+import pandas as pd
+import pytest
+import pytz
+from airflow_assessment import ingest, metrics
+from airflow_assessment.change_detection import ChangeSet
+from airflow_assessment.enrichment import EnrichmentIndex
+from airflow_assessment.ingest import (
+    API_TS_FORMAT,
+    get_transactions_from_api_interval,
+    ingest_rates,
+    ingest_transaction_window,
+    ingest_transactions_incremental,
+    plan_transaction_windows,
+    retrieve_trades_single_day,
+    split_interval,
+)
+from airflow_assessment.models.pydantic import SepaTransaction
+
+INDEX = EnrichmentIndex.from_frames(
+    rates=pd.DataFrame({"currency": ["EUR"], "eur_rate": [1.0]}),
+    companies=pd.DataFrame({"iban": ["NL01"], "company_id": [7]}),
+)
+START = pytz.utc.localize(datetime(2022, 1, 1))
+END = pytz.utc.localize(datetime(2022, 1, 3, 23, 59, 59, 999999))
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    rows = [
+        {
+            "id": str(i),
+            "payer": "NL01",
+            "receiver": "DE01",
+            "amount": float(i),
+            "currency": "EUR",
+            "timestamp": (START + timedelta(hours=i)).strftime(API_TS_FORMAT),
+        }
+        for i in range(0, 100)
+    ]
+
+    def get_bytes_from_url(url, params=None):
+        query = dict(part.split("=") for part in params.split("&"))
+        after = datetime.strptime(query["after-timestamp"], API_TS_FORMAT)
+        matching = [row for row in rows if datetime.strptime(row["timestamp"], API_TS_FORMAT) > after]
+        # The fake API caps pages at 7 rows, so every shard spans several pages.
+        return json.dumps(matching[: min(int(query["limit"]), 7)]).encode()
+
+    monkeypatch.setattr(ingest, "get_bytes_from_url", get_bytes_from_url)
+    return rows
+
+
+def test_split_interval():
+    shards = split_interval(START, END, timedelta(days=1))
+    assert len(shards) == 3
+    assert shards[0][0] == START
+    assert shards[-1][1] == END
+    assert all(left[1] == right[0] for left, right in zip(shards, shards[1:]))
+
+
+def test_split_interval_rejects_empty_width():
+    with pytest.raises(ValueError):
+        split_interval(START, END, timedelta(0))
+
+
+def test_sharded_fetch_matches_sequential(fake_api):
+    sequential = get_transactions_from_api_interval(START, END, "url", SepaTransaction)
+    sharded = get_transactions_from_api_interval(
+        START, END, "url", SepaTransaction, shard_width=timedelta(hours=5), max_workers=3
+    )
+    # The row at START itself is excluded by the after-timestamp cursor, rows after END are cut off.
+    assert sequential["id"].tolist() == [str(i) for i in range(1, 72)]
+    assert sharded["id"].tolist() == sequential["id"].tolist()
+
+
+def test_plan_transaction_windows():
+    windows = plan_transaction_windows("sepa", ts="2022-02-01T00:00:00+00:00", window_hours=100)
+
+    assert len(windows) == 7
+    assert windows[0]["window_start"] == "2022-02-01T00:00:00+00:00"
+    assert windows[0]["window_end"] == "2022-02-05T03:59:59.999999+00:00"
+    assert windows[1]["window_start"] == "2022-02-05T04:00:00+00:00"
+    assert windows[-1]["window_end"] == "2022-02-28T23:59:59.999999+00:00"
+    assert all(window["url_suffix"] == "sepa" for window in windows)
+
+
+def test_ingest_transaction_window_includes_its_first_row(fake_api, monkeypatch, tmp_path):
+    written = {}
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "ensure_transaction_partitions", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "get_enrichment_index", lambda engine: INDEX)
+    monkeypatch.setattr(ingest, "write_trades", lambda **kwargs: written.update(kwargs))
+
+    ingest_transaction_window(
+        "sepa",
+        window_start=(START + timedelta(hours=1)).isoformat(),
+        window_end=(START + timedelta(hours=3, microseconds=-1)).isoformat(),
+    )
+
+    assert written["trades"]["trade_id"].tolist() == ["1", "2"]
+    assert written["start_date"] == START + timedelta(hours=1)
+    assert written["end_ts"] == START + timedelta(hours=3, microseconds=-1)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_retrieve_trades_single_day_includes_the_first_row_of_the_month(fake_api, monkeypatch, tmp_path, stream):
+    written = []
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "ensure_transaction_partitions", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "get_enrichment_index", lambda engine: INDEX)
+    monkeypatch.setattr(ingest, "refresh_aggregates", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "write_trades", lambda **kwargs: written.extend(kwargs["trades"]["trade_id"]))
+    monkeypatch.setattr(ingest, "delete_rows_from_interval", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "copy_to_database", lambda **kwargs: written.extend(kwargs["data"]["trade_id"]))
+
+    retrieve_trades_single_day("sepa", ts=START.isoformat(), stream=stream, load_mode="append", lake=False)
+
+    assert written == [str(i) for i in range(100)]
+
+
+@pytest.fixture
+def watermarks(monkeypatch, tmp_path):
+    store, pages = {}, []
+
+    def append_with_watermark(engine, model, data, key, cursor, skip_duplicates=False):
+        pages.append(data["trade_id"].tolist())
+        store[key] = cursor
+        return len(data)
+
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "ensure_transaction_partitions", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "get_enrichment_index", lambda engine: INDEX)
+    monkeypatch.setattr(ingest, "refresh_aggregates", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "get_watermark", lambda engine, key: store.get(key))
+    monkeypatch.setattr(ingest, "delete_watermark", lambda engine, key: store.pop(key))
+    monkeypatch.setattr(ingest, "append_with_watermark", append_with_watermark)
+    return store, pages
+
+
+def test_ingest_transactions_incremental_resumes_from_watermark(fake_api, watermarks):
+    store, pages = watermarks
+    store["sepa"] = fake_api[89]["timestamp"]
+
+    ingest_transactions_incremental("sepa")
+
+    assert list(chain.from_iterable(pages)) == [str(i) for i in range(90, 100)]
+    # The cursor is committed with every page, the last one points at the last row.
+    assert [len(page) for page in pages] == [7, 3]
+    assert store["sepa"] == fake_api[99]["timestamp"]
+
+
+def test_ingest_transactions_incremental_skips_duplicated_rows(fake_api, watermarks):
+    store, pages = watermarks
+    store["sepa"] = fake_api[89]["timestamp"]
+    # Row 92 duplicates row 91 as a whole. Row 98 repeats it at a later timestamp, which is another transaction.
+    fake_api[92].update(fake_api[91])
+    fake_api[98].update({key: value for key, value in fake_api[91].items() if key != "timestamp"})
+
+    ingest_transactions_incremental("sepa")
+
+    assert list(chain.from_iterable(pages)) == ["90", "91", "93", "94", "95", "96", "97", "91", "99"]
+    assert store["sepa"] == fake_api[99]["timestamp"]
+
+
+def test_transaction_paths_use_api_url(fake_api, watermarks, monkeypatch):
+    store, _ = watermarks
+    store["sepa"] = fake_api[89]["timestamp"]
+    urls = set()
+    get_bytes_from_url = ingest.get_bytes_from_url
+    monkeypatch.setattr(
+        ingest, "get_bytes_from_url", lambda url, params=None: urls.add(url) or get_bytes_from_url(url, params)
+    )
+    monkeypatch.setattr(ingest, "delete_rows_from_interval", lambda *args, **kwargs: None)
+    window_start, window_end = START.isoformat(), (START + timedelta(hours=20, microseconds=-1)).isoformat()
+
+    ingest_transactions_incremental("sepa", api_url="http://fake")
+    ingest_transaction_window(
+        "sepa", window_start=window_start, window_end=window_end, load_mode="append", api_url="http://fake"
+    )
+
+    assert urls == {"http://fake/transactions/sepa"}
+
+
+def test_ingest_transaction_window_resumes_from_checkpoint(fake_api, watermarks, monkeypatch):
+    store, pages = watermarks
+    window_start, window_end = START.isoformat(), (START + timedelta(hours=20, microseconds=-1)).isoformat()
+    store[f"sepa@{window_start}"] = fake_api[9]["timestamp"]
+    monkeypatch.setattr(ingest, "delete_rows_from_interval", lambda *args, **kwargs: pytest.fail("deleted rows"))
+
+    ingest_transaction_window("sepa", window_start=window_start, window_end=window_end, load_mode="append")
+
+    assert list(chain.from_iterable(pages)) == [str(i) for i in range(10, 20)]
+    assert store == {}
+
+
+def test_ingest_rates_writes_the_lake_after_the_database(monkeypatch, tmp_path):
+    calls = []
+    rates = pd.DataFrame({"currency": ["EUR"], "usd_rate": [1.1], "eur_rate": [1.0]})
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "retrieve_rates_from_api", lambda **kwargs: rates)
+    monkeypatch.setattr(ingest, "upsert_table", lambda **kwargs: calls.append("database"))
+    monkeypatch.setattr(ingest, "refresh_enrichment", lambda **kwargs: calls.append("enrichment") or [])
+    monkeypatch.setattr(ingest, "refresh_aggregates", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "write_to_lake", lambda data, dataset: calls.append("lake"))
+
+    ingest_rates(detect_changes=False, lake=True)
+
+    assert calls == ["database", "enrichment", "lake"]
+
+
+def test_ingest_rates_refreshes_the_changed_currencies_and_months(monkeypatch, tmp_path):
+    refreshed, aggregated = [], []
+    rates = pd.DataFrame({"currency": ["EUR", "USD"], "usd_rate": [1.1, 1.0], "eur_rate": [1.0, 0.9]})
+    changes = ChangeSet(inserted=rates.iloc[1:], updated=rates.iloc[:0], deleted=pd.DataFrame({"currency": ["GBP"]}))
+    month = datetime(2022, 1, 1)
+
+    def refresh_enrichment(**kwargs):
+        refreshed.append(kwargs)
+        return [(month, "sepa"), (month, "swift")]
+
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "retrieve_rates_from_api", lambda **kwargs: rates)
+    monkeypatch.setattr(ingest, "sync_table", lambda **kwargs: changes)
+    monkeypatch.setattr(ingest, "refresh_enrichment", refresh_enrichment)
+    monkeypatch.setattr(ingest, "refresh_aggregates", lambda **kwargs: aggregated.append(kwargs))
+
+    ingest_rates(lake=False)
+
+    assert refreshed == [{"engine": None, "currencies": ["USD", "GBP"]}]
+    assert [(kwargs["start_date"], kwargs["end_date"], kwargs["source"]) for kwargs in aggregated] == [
+        (month, month, "sepa"),
+        (month, month, "swift"),
+    ]
+
+
+@pytest.mark.parametrize("window_hours, partition", [(31 * 24, '"transaction_y2022m01_sepa"'), (100, None)])
+def test_ingest_transaction_window_truncates_whole_month_partitions(
+    fake_api, monkeypatch, tmp_path, window_hours, partition
+):
+    replaced = []
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(ingest, "get_engine_from_airflow_conn_id", lambda conn_id: None)
+    monkeypatch.setattr(ingest, "ensure_transaction_partitions", lambda **kwargs: None)
+    monkeypatch.setattr(ingest, "get_enrichment_index", lambda engine: INDEX)
+    monkeypatch.setattr(ingest, "replace_interval", lambda **kwargs: replaced.append(kwargs["partition"]))
+
+    window = plan_transaction_windows("sepa", ts=START.isoformat(), window_hours=window_hours)[0]
+    ingest_transaction_window(**window, load_mode="staging")
+
+    assert replaced == [partition]
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import pytz
+from airflow_assessment.lake import (
+    files_for_interval,
+    lake_partition_writer,
+    partition_path,
+    read_manifest,
+    transaction_lake_partition,
+    write_to_lake,
+)
+
+
+@pytest.fixture
+def trades():
+    return pd.DataFrame(
+        {
+            "trade_id": ["a", "b", "c"],
+            "amount": [1.0, 2.0, 3.0],
+            "timestamp": pd.to_datetime(["2022-01-01T00:00:00Z", "2022-01-15T00:00:00Z", "2022-01-31T00:00:00Z"]),
+            "source": "sepa",
+        }
+    )
+
+
+def test_write_to_lake_partitions_and_manifest(tmp_path, trades):
+    partition = transaction_lake_partition(source="sepa", month=datetime(2022, 1, 15))
+    entry = write_to_lake(trades, "transaction", partition=partition, root=str(tmp_path), timestamp_col="timestamp")
+
+    path = partition_path("transaction", partition=partition, root=str(tmp_path))
+    assert path == tmp_path / "transaction" / "source=sepa" / "year=2022" / "month=01"
+    table = pq.read_table(path)
+    assert table.num_rows == 3
+    assert "source" not in table.column_names
+    assert entry["path"] == "source=sepa/year=2022/month=01"
+    assert read_manifest("transaction", root=str(tmp_path))["partitions"][entry["path"]]["files"] == [
+        {
+            "path": "part-00000.parquet",
+            "rows": 3,
+            "min_timestamp": "2022-01-01T00:00:00+00:00",
+            "max_timestamp": "2022-01-31T00:00:00+00:00",
+        }
+    ]
+
+
+def test_write_to_lake_replaces_partition(tmp_path, trades):
+    partition = transaction_lake_partition(source="sepa", month=datetime(2022, 1, 1))
+    write_to_lake(trades, "transaction", partition=partition, root=str(tmp_path))
+    write_to_lake(trades.head(1), "transaction", partition=partition, root=str(tmp_path))
+
+    path = partition_path("transaction", partition=partition, root=str(tmp_path))
+    assert pq.read_table(path).num_rows == 1
+    assert [p.name for p in path.parent.iterdir()] == ["month=01"]
+
+
+def test_lake_partition_writer_aborts_on_error(tmp_path, trades):
+    write_to_lake(trades, "rate", root=str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with lake_partition_writer("rate", root=str(tmp_path)) as writer:
+            writer.write(trades.head(1))
+            raise RuntimeError("load failed")
+
+    assert pq.read_table(partition_path("rate", root=str(tmp_path))).num_rows == 3
+    assert sorted(p.name for p in (tmp_path / "rate").iterdir()) == ["_manifest.json", "_manifest.json.lock", "data"]
+
+
+def test_files_for_interval(tmp_path, trades):
+    for month in (1, 2):
+        frame = trades.assign(timestamp=trades["timestamp"] + pd.DateOffset(months=month - 1))
+        partition = transaction_lake_partition(source="sepa", month=datetime(2022, month, 1))
+        write_to_lake(frame, "transaction", partition=partition, root=str(tmp_path), timestamp_col="timestamp")
+
+    files = files_for_interval(
+        "transaction",
+        start_date=pytz.utc.localize(datetime(2022, 2, 10)),
+        end_date=pytz.utc.localize(datetime(2022, 2, 20)),
+        root=str(tmp_path),
+        source="sepa",
+    )
+    assert [file.relative_to(tmp_path).as_posix() for file in files] == [
+        "transaction/source=sepa/year=2022/month=02/part-00000.parquet"
+    ]
+    assert (
+        files_for_interval(
+            "transaction",
+            start_date=pytz.utc.localize(datetime(2022, 2, 10)),
+            end_date=pytz.utc.localize(datetime(2022, 2, 20)),
+            root=str(tmp_path),
+            source="swift",
+        )
+        == []
+    )
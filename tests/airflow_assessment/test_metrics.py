@@ -0,0 +1,64 @@
+import pytest
+from airflow_assessment import metrics
+from airflow_assessment.metrics import IngestMetrics, get_metrics, instrumented
+
+
+class FakeTaskInstance:
+    dag_id = "create_summaries"
+    task_id = "ingest_daily_rates_sepa"
+
+    def __init__(self):
+        self.xcoms = {}
+
+    def xcom_push(self, key, value):
+        self.xcoms[key] = value
+
+
+def test_ingest_metrics_summary():
+    run = IngestMetrics(labels={"task_id": "ingest_rates"})
+    run.increment("pages_fetched")
+    run.increment("pages_fetched")
+    run.observe("http_request_seconds", 0.02)
+    run.observe("http_request_seconds", 0.2)
+    with run.timer("transform") as timing:
+        timing.rows = 10
+    run.add_stage("transform", 0.0, rows=5)
+
+    summary = run.summary()
+    assert summary["counters"] == {"pages_fetched": 2}
+    assert summary["stages"]["transform"]["rows"] == 15
+    assert summary["stages"]["transform"]["calls"] == 2
+    assert summary["histograms"]["http_request_seconds"]["count"] == 2
+    assert summary["histograms"]["http_request_seconds"]["p50"] == 0.025
+    assert summary["histograms"]["http_request_seconds"]["p95"] == 0.25
+
+
+def test_to_prometheus():
+    run = IngestMetrics(labels={"task_id": "ingest_rates", "source": "sepa"})
+    run.increment("rows_rejected", 3)
+    run.observe("http_request_seconds", 0.02)
+
+    lines = run.to_prometheus(prefix="cdm").splitlines()
+    assert 'cdm_rows_rejected{task_id="ingest_rates",source="sepa"} 3' in lines
+    assert 'cdm_http_request_seconds_bucket{task_id="ingest_rates",source="sepa",le="0.01"} 0' in lines
+    assert 'cdm_http_request_seconds_bucket{task_id="ingest_rates",source="sepa",le="+Inf"} 1' in lines
+    assert 'cdm_http_request_seconds_count{task_id="ingest_rates",source="sepa"} 1' in lines
+
+
+def test_instrumented_publishes_on_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TEXTFILE_DIR", str(tmp_path))
+
+    @instrumented
+    def task(url_suffix, **kwargs):
+        get_metrics().increment("pages_fetched")
+        raise RuntimeError("API down")
+
+    ti = FakeTaskInstance()
+    with pytest.raises(RuntimeError):
+        task(url_suffix="sepa", ti=ti)
+
+    assert ti.xcoms["ingest_metrics"]["counters"] == {"pages_fetched": 1, "task_failures": 1}
+    assert ti.xcoms["ingest_metrics"]["labels"]["source"] == "sepa"
+    textfile = tmp_path / "create_summaries__ingest_daily_rates_sepa__sepa.prom"
+    assert "cdm_ingest_task_failures" in textfile.read_text()
+    assert get_metrics().summary()["counters"] == {}
@@ -0,0 +1,50 @@
+import pytest
+from airflow_assessment.migrations import Migration, get_schema_version, migrate, schema_fingerprint
+from airflow_assessment.models.alchemy import prod_base
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+
+
+@pytest.fixture
+def applied():
+    return []
+
+
+def migrations(applied, n=2):
+    return [
+        Migration(version, f"m{version}", lambda engine, v=version: applied.append(v)) for version in range(1, n + 1)
+    ]
+
+
+def test_migrate_applies_pending_migrations_once(engine, applied):
+    assert migrate(engine, migrations=migrations(applied), sync=applied.append) == ["m1", "m2"]
+    assert migrate(engine, migrations=migrations(applied), sync=applied.append) == []
+    assert migrate(engine, migrations=migrations(applied, n=3), sync=applied.append) == ["m3"]
+
+    assert applied == [1, 2, 3]
+    assert get_schema_version(engine) == (3, schema_fingerprint(prod_base.metadata))
+
+
+def test_migrate_is_a_single_lookup_when_up_to_date(engine, applied):
+    migrate(engine, migrations=migrations(applied), sync=applied.append)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    migrate(engine, migrations=migrations(applied), sync=applied.append)
+
+    assert len(statements) == 1
+    assert statements[0].startswith("SELECT version, fingerprint FROM")
+
+
+def test_migrate_syncs_changed_models(engine, applied):
+    migrate(engine, migrations=migrations(applied), sync=applied.append)
+    metadata = MetaData()
+    Table("new_table", metadata, Column("id", Integer, primary_key=True))
+
+    assert migrate(engine, migrations=migrations(applied), sync=applied.append, metadata=metadata) == ["sync"]
+    assert applied == [1, 2, engine]
+    assert get_schema_version(engine) == (2, schema_fingerprint(metadata))
@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+from airflow_assessment.pipeline import run_pipeline
+
+
+def test_run_pipeline_consumes_in_order():
+    consumed = []
+    assert run_pipeline(producer=range(10), consumer=consumed.append, max_queue_size=2) == 10
+    assert consumed == list(range(10))
+
+
+def test_run_pipeline_bounds_the_queue():
+    produced = []
+    release = threading.Event()
+
+    def producer():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    def consumer(item):
+        # Block on the first item so the producer can only run ahead by the queue size.
+        if item == 0:
+            release.wait(timeout=0.5)
+            assert len(produced) <= 4
+
+    assert run_pipeline(producer=producer(), consumer=consumer, max_queue_size=2) == 10
+
+
+def test_run_pipeline_reraises_producer_errors():
+    def producer():
+        yield 1
+        raise RuntimeError("API down")
+
+    with pytest.raises(RuntimeError, match="API down"):
+        run_pipeline(producer=producer(), consumer=lambda item: None, max_queue_size=1)
+
+
+def test_run_pipeline_stops_producer_on_consumer_error():
+    def consumer(item):
+        raise ValueError("database down")
+
+    with pytest.raises(ValueError, match="database down"):
+        run_pipeline(producer=iter(range(1000)), consumer=consumer, max_queue_size=1)
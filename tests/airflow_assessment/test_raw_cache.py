@@ -0,0 +1,47 @@
+import pytest
+from airflow_assessment.client import CdmApiClient
+from airflow_assessment.raw_cache import RawCache, RawCacheMiss, request_key
+
+from tests.airflow_assessment.test_client import make_response, patch_responses
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RawCache(root=str(tmp_path / "raw"))
+
+
+def test_request_key_ignores_host_and_parameter_order():
+    key, endpoint, params = request_key("http://a:81/transactions/sepa", "limit=10&after-timestamp=x")
+    assert endpoint == "/transactions/sepa"
+    assert params == [["after-timestamp", "x"], ["limit", "10"]]
+    assert key == request_key("http://b/transactions/sepa", {"after-timestamp": "x", "limit": 10})[0]
+    assert key != request_key("http://b/transactions/swift", {"after-timestamp": "x", "limit": 10})[0]
+
+
+def test_cache_stores_identical_responses_once(cache):
+    cache.put("http://cdm/transactions/sepa", "limit=10&after-timestamp=1", b"[]")
+    cache.put("http://cdm/transactions/sepa", "limit=10&after-timestamp=2", b"[]")
+
+    assert cache.get("http://cdm/transactions/sepa", "limit=10&after-timestamp=2") == b"[]"
+    assert cache.get("http://cdm/transactions/sepa", "limit=10&after-timestamp=3") is None
+    assert len(list((cache.root / "objects").rglob("*.json.gz"))) == 1
+    assert len(list(cache.entries("/transactions/sepa"))) == 2
+
+
+def test_cache_serves_other_page_sizes_at_the_same_cursor(cache):
+    cache.put("http://cdm/transactions/sepa", "limit=10&after-timestamp=1", b"[1]")
+
+    assert cache.get("http://cdm/transactions/sepa", "limit=20&after-timestamp=1") == b"[1]"
+    assert cache.get("http://cdm/transactions/sepa", "limit=20&after-timestamp=2") is None
+
+
+def test_client_records_and_replays(monkeypatch, cache):
+    client = CdmApiClient(max_retries=0, cache=cache, cache_mode="record")
+    patch_responses(monkeypatch, client, [make_response(200, b'[{"currency": "EUR"}]')])
+    assert client.get_json("http://cdm/exchange-rates") == [{"currency": "EUR"}]
+
+    client.cache_mode = "replay"
+    patch_responses(monkeypatch, client, [])
+    assert client.get_json("http://cdm/exchange-rates") == [{"currency": "EUR"}]
+    with pytest.raises(RawCacheMiss):
+        client.get_json("http://cdm/companies")
@@ -0,0 +1,10 @@
+from airflow_assessment import ingest, tasks
+
+
+def test_lazy_task_runs_the_implementation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(ingest, "ingest_rates", lambda *args, **kwargs: calls.append((args, kwargs)) or "done")
+
+    assert tasks.ingest_rates(ts="2022-01-01T00:00:00+00:00") == "done"
+    assert calls == [((), {"ts": "2022-01-01T00:00:00+00:00"})]
+    assert tasks.ingest_rates.__name__ == "ingest_rates"
@@ -0,0 +1,36 @@
+import pandas as pd
+from airflow_assessment.transformations import parse_iban_lists, transform_companies
+
+
+def test_parse_iban_lists():
+    ibans = pd.Series(["['NL58EQEN7258967872']", "[]", '["DE45306993503114243904", "GB34HTSZ21460928267258"]'])
+
+    parsed = parse_iban_lists(ibans)
+
+    assert parsed.tolist() == ["NL58EQEN7258967872", "DE45306993503114243904", "GB34HTSZ21460928267258"]
+    assert parsed.index.tolist() == [0, 2, 2]
+
+
+def test_parse_iban_lists_does_not_evaluate():
+    assert parse_iban_lists(pd.Series(["__import__('os').system('true')"])).empty
+
+
+def test_transform_companies():
+    companies = pd.DataFrame(
+        {
+            "address": ["Street 1", "Street 2"],
+            "ibans": ["['NL58EQEN7258967872', 'DE45306993503114243904']", "['GB34HTSZ21460928267258']"],
+            "id": [1, 2],
+            "name": ["Royal Schagen", "Dupont"],
+        },
+        index=[10, 20],
+    )
+
+    transformed = transform_companies(companies)
+
+    assert transformed.columns.tolist() == ["address", "iban", "company_id", "name", "country"]
+    assert transformed[["iban", "company_id", "country"]].values.tolist() == [
+        ["NL58EQEN7258967872", 1, "NL"],
+        ["DE45306993503114243904", 1, "DE"],
+        ["GB34HTSZ21460928267258", 2, "GB"],
+    ]
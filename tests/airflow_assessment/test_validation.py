@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from airflow_assessment.models.pydantic import Rate, SepaTransaction
+from airflow_assessment.validation import select_rows_to_check, validate_batch, validate_json_batch
+
+
+@pytest.fixture
+def transactions():
+    return [
+        {
+            "id": "1",
+            "payer": "NL01",
+            "receiver": "DE01",
+            "amount": "10.5",
+            "currency": "EUR",
+            "timestamp": "2022-01-01T10:00:00.000000Z",
+        },
+        {"id": "2", "payer": "NL01", "receiver": "DE01", "amount": "ten", "currency": "EUR", "timestamp": "x"},
+        {"id": "3", "payer": "NL01", "amount": 1.0, "currency": None, "timestamp": "2022-01-01T11:00:00.000000Z"},
+    ]
+
+
+def test_validate_batch_full(transactions):
+    result = validate_batch(transactions, SepaTransaction, policy="full")
+
+    assert len(result.valid) == 1
+    assert result.valid[0]["amount"] == 10.5
+    assert result.valid[0]["timestamp"] == datetime(2022, 1, 1, 10, tzinfo=timezone.utc)
+    assert [row["payload"]["id"] for row in result.rejected] == ["2", "3"]
+    assert "amount" in result.rejected[0]["reason"]
+    assert "timestamp" in result.rejected[0]["reason"]
+    assert result.rejected[1]["reason"] == "receiver: Field required"
+
+
+def test_validate_batch_schema_only_checks_first_row(transactions):
+    result = validate_batch(transactions, SepaTransaction, policy="schema")
+
+    assert result.valid == transactions
+    assert result.rejected == []
+
+
+def test_validate_batch_all_valid():
+    rates = [{"currency": "EUR", "usd_rate": 1.1, "eur_rate": 1}]
+    result = validate_batch(rates, Rate)
+
+    assert result.valid == [{"currency": "EUR", "usd_rate": 1.1, "eur_rate": 1.0}]
+    assert result.rejected == []
+
+
+def test_select_rows_to_check():
+    assert select_rows_to_check(5, "full", 0.1) == [0, 1, 2, 3, 4]
+    assert select_rows_to_check(5, "schema", 0.1) == [0]
+    assert select_rows_to_check(0, "schema", 0.1) == []
+    assert len(select_rows_to_check(1000, "sampled", 0.01)) == 10
+    assert len(select_rows_to_check(10, "sampled", 0.01)) == 1
+    with pytest.raises(ValueError):
+        select_rows_to_check(5, "none", 0.1)
+
+
+def test_validate_json_batch_matches_validate_batch(transactions):
+    body = json.dumps(transactions[:1] * 3).encode()
+
+    batch = validate_json_batch(body, SepaTransaction, policy="full")
+
+    assert batch.valid == validate_batch(transactions[:1] * 3, SepaTransaction, policy="full").valid
+    assert batch.n_rows == 3
+    assert batch.rejected == []
+
+
+def test_validate_json_batch_reports_rejected_rows(transactions):
+    batch = validate_json_batch(json.dumps(transactions).encode(), SepaTransaction, policy="full")
+
+    assert [row["id"] for row in batch.valid] == ["1"]
+    assert [row["payload"]["id"] for row in batch.rejected] == ["2", "3"]
+    # The last row is the raw row, so paging can move past rejected rows.
+    assert batch.last_row == transactions[-1]
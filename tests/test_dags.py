@@ -0,0 +1,38 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+DAGS_FOLDER = Path(__file__).parents[1] / "dags"
+
+# Imports the Airflow modules the DAG files build on first, so only the imports of the DAG file itself are checked.
+PARSE_SCRIPT = """
+import json, sys
+sys.path.insert(0, {dags_folder!r})
+from airflow.decorators import dag
+from airflow.models.dagbag import DagBag
+from airflow.operators.python import PythonOperator
+
+before = set(sys.modules)
+dagbag = DagBag(dag_folder={path!r}, include_examples=False, safe_mode=False)
+print(json.dumps({{
+    "dags": sorted(dagbag.dags),
+    "errors": [str(error) for error in dagbag.import_errors.values()],
+    "new_modules": sorted(set(sys.modules) - before),
+}}))
+"""
+
+
+@pytest.mark.parametrize("dag_file", ["cdn_ingestion_dag.py", "cdn_incremental_dag.py"])
+def test_parsing_dag_files_does_not_import_heavy_modules(dag_file):
+    script = PARSE_SCRIPT.format(dags_folder=str(DAGS_FOLDER), path=str(DAGS_FOLDER / dag_file))
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    parsed = json.loads(result.stdout.strip().splitlines()[-1])
+
+    assert parsed["errors"] == []
+    assert len(parsed["dags"]) == 1
+    heavy = [name for name in parsed["new_modules"] if name.split(".")[0] in ("pandas", "sqlalchemy", "pyarrow")]
+    assert heavy == []
+    assert "airflow_assessment.ingest" not in parsed["new_modules"]